@@ -1,4 +1,5 @@
 from django.contrib import admin
+from utilities.paginators import EstimatedCountPaginator
 from .models import User, Wallet
 
 # Register your models here.
@@ -8,13 +9,20 @@ class CustomUserAdmin(admin.ModelAdmin):
     search_fields = ('email', 'firstname', 'lastname')
     list_filter = ('is_staff',)
     ordering = ('id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
 
 class WalletAdmin(admin.ModelAdmin):
-    list_display = ('user_email', 'balance', 'monnify_account_number', 'monnify_bank_name', 'bank_user_name', 'tier')
-    search_fields = ('user__email', 'user__firstname', 'user__lastname', 'monnify_account_number')
-    list_filter = ('user__firstname',)
-    ordering = ('user__email',)
+    list_display = ('user_email', 'balance', 'monnify_account_number', 'monnify_bank_name', 'bank_user_name', 'tier', 'provisioning_status')
+    list_select_related = ('user',)
+    search_fields = ('=user__email', '=monnify_account_number', 'user__firstname', 'user__lastname')
+    list_filter = ('tier', 'provisioning_status')
+    # Sorting every wallet by the joined email is a full sort; the column can still be sorted on demand
+    ordering = ('-id',)
+    raw_id_fields = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def user_email(self, obj):
         return obj.user.email
@@ -22,4 +30,4 @@ class WalletAdmin(admin.ModelAdmin):
     user_email.short_description = 'User Email'
     
 admin.site.register(User, CustomUserAdmin)
-admin.site.register(Wallet, WalletAdmin)
\ No newline at end of file
+admin.site.register(Wallet, WalletAdmin)
@@ -0,0 +1,134 @@
+import json
+import logging
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, transaction as db_transaction
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+# Columns authentication never needs; they are loaded lazily if something reads them
+DEFERRED_FIELDS = ('password', 'last_login')
+PRINCIPAL_FIELDS = [field for field in User._meta.concrete_fields if field.attname not in DEFERRED_FIELDS]
+
+
+def _key(user_id):
+    return f"principal:{user_id}"
+
+
+def get_principal(user_id):
+    """The cached user for `user_id`, with the password and last_login deferred, or None."""
+    try:
+        from auth_system.redis_client import redis
+        cached = redis.get(_key(user_id))
+    except Exception:
+        logger.warning("Could not read cached principal", exc_info=True)
+        return None
+    if not cached:
+        return None
+    values = json.loads(cached)
+    if any(field.attname not in values for field in PRINCIPAL_FIELDS):
+        # Cached before a User field was added; the caller reloads and re-caches it
+        return None
+    return User.from_db(
+        DEFAULT_DB_ALIAS,
+        [field.attname for field in PRINCIPAL_FIELDS],
+        [field.to_python(values[field.attname]) for field in PRINCIPAL_FIELDS],
+    )
+
+
+def put_principal(user):
+    values = {field.attname: field.value_from_object(user) for field in PRINCIPAL_FIELDS}
+    try:
+        from auth_system.redis_client import redis
+        redis.set(_key(user.pk), json.dumps(values, cls=DjangoJSONEncoder), ex=settings.AUTH_PRINCIPAL_CACHE["TTL"])
+    except Exception:
+        logger.warning("Could not cache principal", exc_info=True)
+
+
+def invalidate_principal(user_id):
+    """Drops the cached principal once the current transaction commits."""
+    if not settings.AUTH_PRINCIPAL_CACHE["ENABLED"]:
+        return
+
+    def delete():
+        try:
+            from auth_system.redis_client import redis
+            redis.delete(_key(user_id))
+        except Exception:
+            logger.warning("Could not clear cached principal for user %s", user_id, exc_info=True)
+    db_transaction.on_commit(delete)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that serves the user from a Redis-cached principal, keyed by user
+    id and dropped whenever the user is saved or deleted. On a miss the user is
+    loaded without the password hash. Tokens are still checked in full on every request.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Revocation is checked against the password hash, which is never cached
+            return super().get_user(validated_token)
+        user_id = self.user_id(validated_token)
+        user = None
+        if settings.AUTH_PRINCIPAL_CACHE["ENABLED"]:
+            user = get_principal(user_id)
+        if user is None:
+            user = self.load_user(user_id)
+            if settings.AUTH_PRINCIPAL_CACHE["ENABLED"]:
+                put_principal(user)
+        self.check_user(user)
+        return user
+
+    def user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def load_user(self, user_id):
+        try:
+            return self.get_queryset().get(**{api_settings.USER_ID_FIELD: user_id})
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+    def get_queryset(self):
+        return User.objects.defer(*DEFERRED_FIELDS)
+
+    def check_user(self, user):
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+
+class WalletJWTAuthentication(CachedJWTAuthentication):
+    """
+    For views that read request.user.wallet: loads the user and wallet in one joined
+    query instead of the user (or cached principal) followed by a wallet query.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            return super(CachedJWTAuthentication, self).get_user(validated_token)
+        user = self.load_user(self.user_id(validated_token))
+        self.check_user(user)
+        return user
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('wallet')
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    target_class = 'auth_system.authentication.CachedJWTAuthentication'
+
+
+class WalletJWTScheme(SimpleJWTScheme):
+    # The same bearer token; the schema needs a distinct name per authentication class
+    target_class = 'auth_system.authentication.WalletJWTAuthentication'
+    name = 'jwtWalletAuth'
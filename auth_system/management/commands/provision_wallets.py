@@ -0,0 +1,32 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from auth_system.provisioning import provision_pending, retry_failed
+
+
+class Command(BaseCommand):
+    help = "Creates Monnify reserved accounts for wallets still waiting for one."
+
+    def add_arguments(self, parser):
+        config = settings.WALLET_PROVISIONING
+        parser.add_argument("--concurrency", type=int, default=config["CONCURRENCY"])
+        parser.add_argument("--batch-size", type=int, default=config["BATCH_SIZE"])
+        parser.add_argument("--interval", type=float, default=config["POLL_INTERVAL"],
+                            help="Seconds to wait when no wallet is due.")
+        parser.add_argument("--once", action="store_true", help="Provision due wallets and exit.")
+        parser.add_argument("--retry-failed", action="store_true",
+                            help="Queue wallets that ran out of attempts again before starting.")
+
+    def handle(self, *args, **options):
+        if options["retry_failed"]:
+            self.stdout.write(f"Requeued {retry_failed()} failed wallet(s).")
+        with ThreadPoolExecutor(max_workers=options["concurrency"], thread_name_prefix="provisioning") as pool:
+            while True:
+                provisioned = provision_pending(limit=options["batch_size"], pool=pool)
+                if provisioned:
+                    self.stdout.write(f"Processed {provisioned} wallet(s).")
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
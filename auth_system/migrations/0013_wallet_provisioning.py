@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:31
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def mark_provisioned_wallets(apps, schema_editor):
+    """Wallets that already have a reserved account are active; the rest are queued for provisioning."""
+    Wallet = apps.get_model('auth_system', 'Wallet')
+    Wallet.objects.exclude(monnify_account_number__isnull=True).exclude(monnify_account_number='').update(
+        provisioning_status='active'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_system', '0012_user_bvn_user_nickname'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallet',
+            name='provisioning_attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='wallet',
+            name='provisioning_error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='wallet',
+            name='provisioning_next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='wallet',
+            name='provisioning_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('provisioning', 'Provisioning'), ('active', 'Active'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+        migrations.RunPython(mark_provisioned_wallets, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='wallet',
+            index=models.Index(condition=models.Q(('provisioning_status__in', ['pending', 'provisioning'])), fields=['provisioning_next_attempt_at'], name='wallet_provisioning_idx'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 # Create your models here.
 
 class CustomUserManager(BaseUserManager):
@@ -78,6 +79,13 @@ TIER_CHOICES = [
         ('tier 2', 'Tier 2'),
         ('tier 3', 'Tier 3'),
     ]
+
+PROVISIONING_STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('provisioning', 'Provisioning'),
+        ('active', 'Active'),
+        ('failed', 'Failed'),
+    ]
 class Wallet(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='wallet')
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
@@ -86,7 +94,24 @@ class Wallet(models.Model):
     bank_user_name = models.CharField(max_length=100, blank=True, null=True)
     tier = models.CharField(max_length=10, choices=TIER_CHOICES, default='Tier 1')
     accountreference = models.CharField(max_length=100, unique=True, blank=True, null=True)
-    
+    # The Monnify reserved account is created in the background after signup
+    provisioning_status = models.CharField(max_length=20, choices=PROVISIONING_STATUS_CHOICES, default='pending')
+    provisioning_attempts = models.PositiveIntegerField(default=0)
+    provisioning_next_attempt_at = models.DateTimeField(default=timezone.now)
+    provisioning_error = models.TextField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Workers only look at wallets still waiting for an account
+            models.Index(
+                fields=['provisioning_next_attempt_at'], name='wallet_provisioning_idx',
+                condition=models.Q(provisioning_status__in=['pending', 'provisioning']),
+            ),
+            # Admin changelist filters, in its newest-first order
+            models.Index(fields=['tier', '-id'], name='wallet_tier_id_idx'),
+            models.Index(fields=['provisioning_status', '-id'], name='wallet_prov_status_id_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.email} Wallet - ₦{self.balance}"
 
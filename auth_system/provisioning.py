@@ -0,0 +1,151 @@
+import hashlib
+import hmac
+import json
+import logging
+import random
+from datetime import timedelta
+import requests
+from django.conf import settings
+from django.db import close_old_connections, transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+from utilities.background import run_in_background
+from utilities.services import create_reserved_account, get_reserved_account
+from .models import Wallet
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_provisioning(wallet):
+    """
+    Queues a new wallet for its Monnify reserved account. The wallet is created
+    pending, so the provision_wallets worker picks it up even if this process
+    never gets to it.
+    """
+    if settings.WALLET_PROVISIONING["PROVISION_ON_COMMIT"]:
+        db_transaction.on_commit(lambda: run_in_background(provision_pending))
+
+
+def claim_wallets(limit):
+    """
+    Marks up to `limit` due wallets as provisioning and returns their ids. While a
+    wallet is provisioning, provisioning_next_attempt_at is its lease: a worker that
+    crashes mid-call leaves it to be claimed again once STALE_AFTER seconds pass.
+    """
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=settings.WALLET_PROVISIONING["STALE_AFTER"])
+    with db_transaction.atomic():
+        ids = list(
+            Wallet.objects.select_for_update(skip_locked=True)
+            .filter(provisioning_status__in=['pending', 'provisioning'], provisioning_next_attempt_at__lte=now)
+            .order_by('provisioning_next_attempt_at')
+            .values_list('id', flat=True)[:limit]
+        )
+        if ids:
+            Wallet.objects.filter(id__in=ids).update(
+                provisioning_status='provisioning',
+                provisioning_attempts=F('provisioning_attempts') + 1,
+                provisioning_next_attempt_at=lease_until,
+            )
+    return ids
+
+
+def provision_pending(limit=None, pool=None):
+    """Claims a batch of due wallets and provisions them, on `pool` if one is given."""
+    ids = claim_wallets(limit or settings.WALLET_PROVISIONING["BATCH_SIZE"])
+    if pool is not None:
+        list(pool.map(provision, ids))
+    else:
+        for wallet_id in ids:
+            provision(wallet_id)
+    return len(ids)
+
+
+def provision(wallet_id):
+    close_old_connections()
+    try:
+        wallet = Wallet.objects.select_related('user').get(pk=wallet_id)
+        try:
+            # A previous attempt may have created the account before failing on our side
+            details = get_reserved_account(wallet.user) if wallet.provisioning_attempts > 1 else None
+            if details is None:
+                details = create_reserved_account(wallet.user)
+        except Exception as e:
+            _retry_or_fail(wallet, str(e))
+            return
+        _activate(wallet, details)
+    except Exception:
+        logger.exception("Provisioning wallet %s failed", wallet_id)
+        Wallet.objects.filter(pk=wallet_id, provisioning_status='provisioning').update(
+            provisioning_status='pending', provisioning_next_attempt_at=backoff_until(1)
+        )
+    finally:
+        close_old_connections()
+
+
+def _activate(wallet, details):
+    wallet.monnify_account_number = details["accountNumber"]
+    wallet.monnify_bank_name = details["bankName"]
+    wallet.bank_user_name = details["customerName"]
+    wallet.accountreference = details["accountReference"]
+    wallet.provisioning_status = 'active'
+    wallet.provisioning_error = None
+    wallet.save(update_fields=[
+        'monnify_account_number', 'monnify_bank_name', 'bank_user_name', 'accountreference',
+        'provisioning_status', 'provisioning_error',
+    ])
+    notify(wallet)
+
+
+def _retry_or_fail(wallet, error):
+    if wallet.provisioning_attempts >= settings.WALLET_PROVISIONING["MAX_ATTEMPTS"]:
+        Wallet.objects.filter(pk=wallet.pk).update(provisioning_status='failed', provisioning_error=error)
+        wallet.provisioning_status = 'failed'
+        notify(wallet)
+        return
+    Wallet.objects.filter(pk=wallet.pk).update(
+        provisioning_status='pending',
+        provisioning_error=error,
+        provisioning_next_attempt_at=backoff_until(wallet.provisioning_attempts),
+    )
+
+
+def backoff_until(attempts):
+    config = settings.WALLET_PROVISIONING
+    delay = min(config["BACKOFF_MAX"], config["BACKOFF_BASE"] * (2 ** (attempts - 1)))
+    return timezone.now() + timedelta(seconds=delay + random.uniform(0, delay / 2))
+
+
+def retry_failed():
+    """Puts wallets whose provisioning gave up back in the queue. Returns how many."""
+    return Wallet.objects.filter(provisioning_status='failed').update(
+        provisioning_status='pending', provisioning_attempts=0, provisioning_next_attempt_at=timezone.now()
+    )
+
+
+def notify(wallet):
+    """
+    Posts the provisioning outcome to NOTIFY_URL, when one is configured. The body is
+    signed with NOTIFY_SECRET (HMAC-SHA512, hex) in the X-Provisioning-Signature header.
+    Delivery is best effort; clients can always poll the provisioning endpoint.
+    """
+    config = settings.WALLET_PROVISIONING
+    if not config["NOTIFY_URL"]:
+        return
+    body = json.dumps({
+        "event": "wallet.provisioned" if wallet.provisioning_status == 'active' else "wallet.provisioning_failed",
+        "user_id": wallet.user_id,
+        "wallet_id": wallet.pk,
+        "status": wallet.provisioning_status,
+        "account_number": wallet.monnify_account_number,
+        "bank_name": wallet.monnify_bank_name,
+    })
+    headers = {"Content-Type": "application/json"}
+    if config["NOTIFY_SECRET"]:
+        headers["X-Provisioning-Signature"] = hmac.new(
+            config["NOTIFY_SECRET"].encode(), body.encode(), hashlib.sha512
+        ).hexdigest()
+    try:
+        requests.post(config["NOTIFY_URL"], data=body, headers=headers, timeout=config["NOTIFY_TIMEOUT"])
+    except requests.RequestException:
+        logger.warning("Provisioning notification for wallet %s failed", wallet.pk, exc_info=True)
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import logging
+from django.conf import settings
+from django.db import transaction as db_transaction
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+logger = logging.getLogger(__name__)
+
+# Serialized payloads cached per user; invalidate() clears every kind at once
+KINDS = ("wallet", "profile")
+
+
+def _key(kind, user_id):
+    return f"readmodel:{kind}:{user_id}"
+
+
+def build(data):
+    """Wraps a serialized payload with the ETag it is served under."""
+    body = json.dumps(data, cls=JSONEncoder, sort_keys=True, separators=(",", ":"))
+    return {"etag": f'"{hashlib.sha1(body.encode()).hexdigest()}"', "data": json.loads(body)}
+
+
+def get(kind, user_id):
+    if not settings.READ_MODELS["ENABLED"]:
+        return None
+    try:
+        from auth_system.redis_client import redis
+        cached = redis.get(_key(kind, user_id))
+    except Exception:
+        logger.warning("Could not read %s read model", kind, exc_info=True)
+        return None
+    return json.loads(cached) if cached else None
+
+
+def put(kind, user_id, entry):
+    if not settings.READ_MODELS["ENABLED"]:
+        return
+    try:
+        from auth_system.redis_client import redis
+        redis.set(_key(kind, user_id), json.dumps(entry), ex=settings.READ_MODELS["TTL"])
+    except Exception:
+        logger.warning("Could not write %s read model", kind, exc_info=True)
+
+
+def invalidate(*user_ids):
+    """
+    Drops the cached payloads of the given users once the current transaction commits,
+    so a read that misses cannot cache the data from before the change.
+    """
+    keys = [_key(kind, user_id) for user_id in set(user_ids) for kind in KINDS]
+    if keys and settings.READ_MODELS["ENABLED"]:
+        db_transaction.on_commit(lambda: _delete(keys))
+
+
+def _delete(keys):
+    try:
+        from auth_system.redis_client import redis
+        redis.delete(*keys)
+    except Exception:
+        # Entries that could not be cleared expire after READ_MODELS["TTL"]
+        logger.warning("Could not clear read models for %s", keys, exc_info=True)
+
+
+def etag_matches(request, etag):
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in [tag.strip() for tag in header.split(",")]
+
+
+class CachedReadModelMixin:
+    """
+    Serves a RetrieveAPIView's payload for the requesting user from the read model cache,
+    with an ETag. A matching If-None-Match gets a 304 without loading the object.
+    Payloads are only cached once is_cacheable() holds for the object.
+    """
+    read_model = None
+
+    def is_cacheable(self, instance):
+        return True
+
+    def retrieve(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return super().retrieve(request, *args, **kwargs)
+        entry = get(self.read_model, request.user.pk)
+        if entry is None:
+            instance = self.get_object()
+            entry = build(self.get_serializer(instance).data)
+            if self.is_cacheable(instance):
+                put(self.read_model, request.user.pk, entry)
+
+        if etag_matches(request, entry["etag"]):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(entry["data"])
+        response["ETag"] = entry["etag"]
+        # Clients may keep the payload but must revalidate it on every poll
+        response["Cache-Control"] = "private, no-cache"
+        return response
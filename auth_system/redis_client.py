@@ -1,8 +1,187 @@
-from upstash_redis import Redis
+import logging
+import threading
+import time
+import redis as redis_py
+from upstash_redis import Redis as UpstashRedis
 from django.conf import settings
 
-# Redis client with Upstash configuration
-redis = Redis(
-    url=settings.UPSTASH_REDIS_REST_URL,
-    token=settings.UPSTASH_REDIS_REST_TOKEN,
-)
+logger = logging.getLogger(__name__)
+
+# Commands that change a value relative to what is stored. If one fails after it was sent
+# it may already have been applied, so it is never repeated over the fallback.
+NON_IDEMPOTENT_PREFIXES = ("eval", "incr", "decr")
+
+
+def not_sent(exc):
+    """
+    True when the pool failed before the command left this process: the connection
+    could not be opened, or no pooled connection became free. A timeout or a dropped
+    connection after that point says nothing about whether Redis applied the command.
+    """
+    if not isinstance(exc, redis_py.ConnectionError):
+        return False
+    message = str(exc)
+    return "connecting to" in message or "No connection available" in message
+
+
+class NativeRedis(redis_py.Redis):
+    """
+    redis-py client over a RESP connection pool, with eval() taking keys= and args= like
+    the Upstash client does. Scripts are loaded once and then run by SHA.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._scripts = {}
+
+    def eval(self, script, keys=None, args=None):
+        runner = self._scripts.get(script)
+        if runner is None:
+            runner = self._scripts.setdefault(script, self.register_script(script))
+        return runner(keys=keys or [], args=args or [])
+
+
+class RedisClient:
+    """
+    Sends commands to the configured backend and records per-command latency for stats().
+    When the native pool cannot connect and an Upstash fallback is configured, the
+    command is sent over REST instead. Both should point at the same database, so the
+    fallback only changes the transport. Scripts and INCR/DECR are never sent twice:
+    their errors are raised so callers such as the limit counters fail closed.
+    """
+
+    def __init__(self, backend, fallback=None):
+        self.backend = backend
+        self.fallback = fallback
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        command = getattr(self.backend, name)
+        if not callable(command):
+            return command
+
+        def call(*args, **kwargs):
+            return self._call(name, *args, **kwargs)
+        return call
+
+    def _call(self, name, *args, **kwargs):
+        started = time.monotonic()
+        try:
+            result = getattr(self.backend, name)(*args, **kwargs)
+        except Exception as exc:
+            self._record(name, started, error=True)
+            if self.fallback is None or not not_sent(exc) or name.lower().startswith(NON_IDEMPOTENT_PREFIXES):
+                raise
+            logger.warning("Redis pool unreachable, sending %s over Upstash REST", name.upper())
+            return self._call_fallback(name, *args, **kwargs)
+        self._record(name, started)
+        return result
+
+    def _call_fallback(self, name, *args, **kwargs):
+        started = time.monotonic()
+        try:
+            result = getattr(self.fallback, name)(*args, **kwargs)
+        except Exception:
+            self._record(f"{name} (fallback)", started, error=True)
+            raise
+        self._record(f"{name} (fallback)", started)
+        return result
+
+    def pipeline(self, *args, **kwargs):
+        """A backend pipeline whose execute() is recorded as one PIPELINE command."""
+        return TimedPipeline(self.backend.pipeline(*args, **kwargs), self._record)
+
+    def _record(self, name, started, error=False):
+        elapsed_ms = (time.monotonic() - started) * 1000
+        key = name.upper()
+        with self._stats_lock:
+            entry = self._stats.setdefault(key, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["count"] += 1
+            entry["errors"] += int(error)
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+        logger.debug("Redis %s took %.1fms", key, elapsed_ms)
+
+    def stats(self):
+        """Returns a copy of the per-command latency counters."""
+        with self._stats_lock:
+            return {
+                key: {**entry, "avg_ms": entry["total_ms"] / entry["count"] if entry["count"] else 0.0}
+                for key, entry in self._stats.items()
+            }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats = {}
+
+
+class TimedPipeline:
+    """Queues commands on the wrapped pipeline and times the round trip in execute()."""
+
+    def __init__(self, pipeline, record):
+        self._pipeline = pipeline
+        self._record = record
+
+    def __getattr__(self, name):
+        attribute = getattr(self._pipeline, name)
+        if not callable(attribute):
+            return attribute
+
+        def queue(*args, **kwargs):
+            result = attribute(*args, **kwargs)
+            # Queued commands return the pipeline itself so calls can be chained
+            return self if result is self._pipeline else result
+        return queue
+
+    def execute(self):
+        started = time.monotonic()
+        try:
+            result = self._pipeline.execute()
+        except Exception:
+            self._record("pipeline", started, error=True)
+            raise
+        self._record("pipeline", started)
+        return result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        reset = getattr(self._pipeline, "reset", None)
+        if reset is not None:
+            reset()
+
+
+def upstash_client():
+    return UpstashRedis(
+        url=settings.UPSTASH_REDIS_REST_URL,
+        token=settings.UPSTASH_REDIS_REST_TOKEN,
+    )
+
+
+def native_client(config):
+    pool = redis_py.BlockingConnectionPool.from_url(
+        config["URL"],
+        max_connections=config["MAX_CONNECTIONS"],
+        timeout=config["POOL_TIMEOUT"],
+        socket_connect_timeout=config["CONNECT_TIMEOUT"],
+        socket_timeout=config["SOCKET_TIMEOUT"],
+        health_check_interval=config["HEALTH_CHECK_INTERVAL"],
+        decode_responses=True,
+    )
+    return NativeRedis(connection_pool=pool)
+
+
+def build_client():
+    config = settings.REDIS
+    if config["BACKEND"] == "native" and config["URL"]:
+        fallback = upstash_client() if config["UPSTASH_FALLBACK"] and settings.UPSTASH_REDIS_REST_URL else None
+        return RedisClient(native_client(config), fallback=fallback)
+    if config["BACKEND"] == "native":
+        logger.warning("REDIS_BACKEND is native but REDIS_URL is not set; using Upstash REST")
+    return RedisClient(upstash_client())
+
+
+# Shared Redis client, native pool or Upstash REST depending on settings.REDIS
+redis = build_client()
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from utilities.cloudinary_helper import upload_to_cloudinary
+from django.db import transaction as db_transaction
+from operations.uploads import spool_upload
+from utilities.image_processing import preprocess_image
 from datetime import date
 from .models import Wallet
 
@@ -51,23 +53,26 @@ class UserSerializer(serializers.ModelSerializer):
         return value
     
     def create(self, validated_data):
-        image_file = validated_data.get('image', None)
-        if image_file:
-            image_url = upload_to_cloudinary(image_file, folder_name="fintechapp_user_images")
-            validated_data['image'] = image_url
-        customuser = CustomUser.objects.create_user(
-            email=validated_data['email'],
-            password=validated_data['password'],
-            firstname=validated_data.get('firstname').title(),
-            lastname=validated_data.get('lastname').title(),
-            phone_number=validated_data.get('phone_number'),
-            image=validated_data.get('image'),
-            date_of_birth=validated_data.get('date_of_birth'),
-        )
-
-        from .models import Wallet
-        if not hasattr(customuser, 'wallet'):
-            Wallet.objects.create(user=customuser)
+        image_file = validated_data.pop('image', None)
+        with db_transaction.atomic():
+            customuser = CustomUser.objects.create_user(
+                email=validated_data['email'],
+                password=validated_data['password'],
+                firstname=validated_data.get('firstname').title(),
+                lastname=validated_data.get('lastname').title(),
+                phone_number=validated_data.get('phone_number'),
+                date_of_birth=validated_data.get('date_of_birth'),
+            )
+
+            from .models import Wallet
+            if not hasattr(customuser, 'wallet'):
+                Wallet.objects.create(user=customuser)
+            # The image URL is set once the upload finishes
+            if image_file:
+                spool_upload(
+                    image_file, 'user', customuser.pk, 'image',
+                    folder="fintechapp_user_images", processor=preprocess_image,
+                )
         return customuser
 
     def get_wallet_balance(self, obj):
@@ -87,6 +92,7 @@ class UserSerializer(serializers.ModelSerializer):
                 "bank_user_name": wallet.bank_user_name if wallet else None,
                 "account_reference": wallet.accountreference if wallet else None,
                 "tier": wallet.tier if wallet else None,
+                "provisioning_status": wallet.provisioning_status,
                 "wallet_balance": "{:.2f}".format(wallet.balance) if wallet else "0.00"
             }
             return rep
@@ -108,14 +114,16 @@ class UserUpdateSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         image_file = validated_data.get('image')
-        if image_file:
-            from utilities.cloudinary_helper import upload_to_cloudinary
-            image_url = upload_to_cloudinary(image_file, folder_name="fintechapp_user_images")
-            instance.image = image_url
 
         instance.nickname = validated_data.get('nickname', instance.nickname)
         instance.phone_number = validated_data.get('phone_number', instance.phone_number)
         instance.save()
+        # The current image stays until the new one is uploaded
+        if image_file:
+            spool_upload(
+                image_file, 'user', instance.pk, 'image',
+                folder="fintechapp_user_images", processor=preprocess_image,
+            )
         return instance
 
     
@@ -165,6 +173,17 @@ class WalletSerializer(serializers.ModelSerializer):
     class Meta:
         model = Wallet
         fields = [
-            "id", "user", "balance", "monnify_account_number", "monnify_bank_name", "bank_user_name", "tier", "accountreference"
+            "id", "user", "balance", "monnify_account_number", "monnify_bank_name", "bank_user_name", "tier", "accountreference",
+            "provisioning_status"
         ]
-        read_only_fields = ["id", "user", "balance", "monnify_account_number", "monnify_bank_name", "bank_user_name", "tier", "accountreference"]
+        read_only_fields = ["id", "user", "balance", "monnify_account_number", "monnify_bank_name", "bank_user_name", "tier", "accountreference", "provisioning_status"]
+
+class WalletProvisioningSerializer(serializers.ModelSerializer):
+    status = serializers.CharField(source="provisioning_status")
+    attempts = serializers.IntegerField(source="provisioning_attempts")
+    error = serializers.CharField(source="provisioning_error", allow_null=True)
+
+    class Meta:
+        model = Wallet
+        fields = ["status", "attempts", "error", "monnify_account_number", "monnify_bank_name", "bank_user_name"]
+        read_only_fields = fields
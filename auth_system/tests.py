@@ -1,3 +1,434 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+from unittest import mock
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from redis import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+from rest_framework.test import APIClient
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.tokens import AccessToken
+from . import read_models
+from .authentication import CachedJWTAuthentication
+from .models import User, Wallet
+from .provisioning import provision_pending, retry_failed
+from .redis_client import NativeRedis, RedisClient
+from fintech_api.testing import QueryBudgetMixin
+from operations.limits import LimitsUnavailable, consume
+from operations.models import PendingUpload
 
-# Create your tests here.
+
+def reserved_account(user):
+    return {
+        "accountNumber": f"70{user.pk:08d}",
+        "bankName": "Moniepoint",
+        "customerName": f"{user.firstname} {user.lastname}",
+        "accountReference": f"budget-{user.pk}",
+    }
+
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class AuthQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Each endpoint in auth_system/urls.py, held to its QUERY_BUDGETS entry."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="ada@example.com", firstname="Ada", lastname="Obi", password="pass12345", phone_number="08000000001"
+        )
+        with mock.patch("auth_system.provisioning.create_reserved_account", side_effect=reserved_account):
+            provision_pending()
+
+    def setUp(self):
+        patcher = mock.patch("utilities.services.redis")
+        self.redis = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def test_every_url_has_a_budget(self):
+        self.assertBudgetsCover("auth_system.urls")
+
+    def test_login(self):
+        with self.assertQueryBudget("token_obtain_pair"):
+            response = APIClient().post(reverse("token_obtain_pair"), {
+                "email": "ada@example.com", "password": "pass12345"
+            }, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    # Rotation records outstanding tokens through rest_framework_simplejwt.token_blacklist,
+    # which is not in INSTALLED_APPS, so refresh is measured without it
+    @mock.patch.object(jwt_serializers.api_settings, "ROTATE_REFRESH_TOKENS", False)
+    def test_refresh(self):
+        refresh = APIClient().post(reverse("token_obtain_pair"), {
+            "email": "ada@example.com", "password": "pass12345"
+        }, format="json").data["refresh"]
+        with self.assertQueryBudget("token_refresh"):
+            response = APIClient().post(reverse("token_refresh"), {
+                "refresh": refresh
+            }, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_register(self):
+        with self.assertQueryBudget("register"):
+            response = APIClient().post(reverse("register"), {
+                "firstname": "Bola", "lastname": "Eze", "email": "bola@example.com", "password": "pass12345",
+                "phone_number": "08000000002", "date_of_birth": "1995-05-05"
+            }, format="json")
+        self.assertEqual(response.status_code, 201)
+
+    def test_password_reset_code(self):
+        with self.assertQueryBudget("email_reset_code"):
+            response = APIClient().post(reverse("email_reset_code"), {"email": "ada@example.com"}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_password_reset_confirm(self):
+        self.redis.get.return_value = "12345"
+        with self.assertQueryBudget("password_reset"):
+            response = APIClient().post(reverse("password_reset"), {
+                "email": "ada@example.com", "code": "12345", "new_password": "newpass123", "confirm_password": "newpass123"
+            }, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_update(self):
+        with self.assertQueryBudget("profile-update"):
+            response = self.client.patch(reverse("profile-update"), {"nickname": "ada"}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile(self):
+        with self.assertQueryBudget("user-profile"):
+            response = self.client.get(reverse("user-profile"))
+        self.assertEqual(response.data["email"], "ada@example.com")
+
+    def test_wallet(self):
+        with self.assertQueryBudget("user_wallet_details"):
+            response = self.client.get(reverse("user_wallet_details"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_wallet_provisioning(self):
+        with self.assertQueryBudget("wallet-provisioning"):
+            response = self.client.get(reverse("wallet-provisioning"))
+        self.assertEqual(response.data["status"], "active")
+
+
+@override_settings(WALLET_PROVISIONING={**settings.WALLET_PROVISIONING, "MAX_ATTEMPTS": 2, "NOTIFY_URL": None})
+class WalletProvisioningTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="ada@example.com", firstname="Ada", lastname="Obi", password="pass12345", phone_number="08000000001"
+        )
+
+    def wallet(self):
+        return Wallet.objects.get(user=self.user)
+
+    def make_due(self):
+        Wallet.objects.filter(user=self.user).update(provisioning_next_attempt_at=timezone.now())
+
+    def test_signup_leaves_wallet_pending(self):
+        self.assertEqual(self.wallet().provisioning_status, "pending")
+        self.assertIsNone(self.wallet().monnify_account_number)
+
+    def test_provisioning_fills_in_the_account(self):
+        with mock.patch("auth_system.provisioning.create_reserved_account", side_effect=reserved_account):
+            self.assertEqual(provision_pending(), 1)
+        wallet = self.wallet()
+        self.assertEqual(wallet.provisioning_status, "active")
+        self.assertEqual(wallet.monnify_account_number, f"70{self.user.pk:08d}")
+        self.assertEqual(provision_pending(), 0)
+
+    def test_failures_back_off_then_give_up(self):
+        with mock.patch("auth_system.provisioning.create_reserved_account", side_effect=Exception("Monnify down")):
+            provision_pending()
+            wallet = self.wallet()
+            self.assertEqual((wallet.provisioning_status, wallet.provisioning_error), ("pending", "Monnify down"))
+            self.assertGreater(wallet.provisioning_next_attempt_at, timezone.now())
+            self.assertEqual(provision_pending(), 0)
+
+            self.make_due()
+            with mock.patch("auth_system.provisioning.get_reserved_account", return_value=None):
+                provision_pending()
+        self.assertEqual(self.wallet().provisioning_status, "failed")
+
+        self.assertEqual(retry_failed(), 1)
+        self.assertEqual(self.wallet().provisioning_status, "pending")
+
+    def test_retry_reuses_an_account_created_by_a_lost_attempt(self):
+        Wallet.objects.filter(user=self.user).update(provisioning_attempts=1)
+        with mock.patch("auth_system.provisioning.get_reserved_account", side_effect=reserved_account), \
+                mock.patch("auth_system.provisioning.create_reserved_account") as create:
+            provision_pending()
+        create.assert_not_called()
+        self.assertEqual(self.wallet().provisioning_status, "active")
+
+
+class AvatarPreprocessingTests(TestCase):
+
+    def setUp(self):
+        spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool_dir, ignore_errors=True)
+        settings_override = override_settings(
+            UPLOAD_SPOOL={**settings.UPLOAD_SPOOL, "DIR": spool_dir, "UPLOAD_ON_COMMIT": False},
+            IMAGE_PROCESSING={"MAX_DIMENSION": 512, "FORMAT": "WEBP", "QUALITY": 80},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def photo(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise to display
+        exif[0x010F] = "PhoneMaker"
+        buffer = io.BytesIO()
+        Image.new("RGB", (3000, 2000), (200, 30, 30)).save(buffer, format="JPEG", quality=95, exif=exif)
+        return SimpleUploadedFile("photo.JPG", buffer.getvalue(), content_type="image/jpeg")
+
+    def test_avatar_is_downscaled_and_stripped_before_spooling(self):
+        response = APIClient().post(reverse("register"), {
+            "firstname": "Bola", "lastname": "Eze", "email": "bola@example.com", "password": "pass12345",
+            "phone_number": "08000000002", "date_of_birth": "1995-05-05", "image": self.photo(),
+        }, format="multipart")
+        self.assertEqual(response.status_code, 201)
+
+        upload = PendingUpload.objects.get(target="user", field="image")
+        self.assertEqual(upload.filename, "photo.webp")
+        self.assertTrue(upload.path.endswith(".webp"))
+        with Image.open(upload.path) as spooled:
+            self.assertEqual(spooled.format, "WEBP")
+            # Rotated upright by the orientation tag, then fitted into 512x512
+            self.assertEqual(spooled.size, (341, 512))
+            self.assertFalse(spooled.getexif())
+
+
+class DictRedis:
+    """Just enough of the Redis client for the read model cache."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+
+class ReadModelCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="ada@example.com", firstname="Ada", lastname="Obi", password="pass12345", phone_number="08000000001"
+        )
+        with mock.patch("auth_system.provisioning.create_reserved_account", side_effect=reserved_account):
+            provision_pending()
+
+    def setUp(self):
+        self.redis = DictRedis()
+        patcher = mock.patch("auth_system.redis_client.redis", self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def test_wallet_is_served_from_cache_with_etag(self):
+        first = self.client.get(reverse("user_wallet_details"))
+        self.assertEqual(first.status_code, 200)
+        self.assertIn(f"readmodel:wallet:{self.user.pk}", self.redis.data)
+
+        # Only the user lookup by the JWT authentication is left
+        with self.assertNumQueries(1):
+            second = self.client.get(reverse("user_wallet_details"))
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second["ETag"], first["ETag"])
+
+        with self.assertNumQueries(1):
+            unchanged = self.client.get(reverse("user_wallet_details"), HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(unchanged.status_code, 304)
+
+    def test_balance_change_invalidates_wallet_and_profile(self):
+        first = self.client.get(reverse("user_wallet_details"))
+        self.client.get(reverse("user-profile"))
+        self.assertEqual(len(self.redis.data), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with db_transaction.atomic():
+                Wallet.objects.filter(user=self.user).update(balance=500)
+                read_models.invalidate(self.user.pk)
+        self.assertEqual(self.redis.data, {})
+
+        response = self.client.get(reverse("user_wallet_details"), HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["balance"], "500.00")
+        self.assertNotEqual(response["ETag"], first["ETag"])
+
+    def test_saving_the_wallet_invalidates(self):
+        self.client.get(reverse("user_wallet_details"))
+        wallet = Wallet.objects.get(user=self.user)
+        wallet.tier = "Tier 2"
+        with self.captureOnCommitCallbacks(execute=True):
+            wallet.save()
+        self.assertEqual(self.client.get(reverse("user_wallet_details")).json()["tier"], "Tier 2")
+
+    def test_wallets_still_provisioning_are_not_cached(self):
+        Wallet.objects.filter(user=self.user).update(provisioning_status="pending")
+        self.assertEqual(self.client.get(reverse("user_wallet_details")).status_code, 200)
+        self.assertEqual(self.redis.data, {})
+
+
+@override_settings(AUTH_PRINCIPAL_CACHE={**settings.AUTH_PRINCIPAL_CACHE, "ENABLED": True})
+class CachedJWTAuthenticationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="ada@example.com", firstname="Ada", lastname="Obi", password="pass12345", phone_number="08000000001"
+        )
+
+    def setUp(self):
+        self.redis = DictRedis()
+        patcher = mock.patch("auth_system.redis_client.redis", self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def authenticate(self):
+        request = mock.Mock(META={"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.user)}"})
+        return CachedJWTAuthentication().authenticate(request)[0]
+
+    def test_principal_is_cached_without_the_password(self):
+        with self.assertNumQueries(1):
+            self.authenticate()
+        self.assertNotIn("password", self.redis.data[f"principal:{self.user.pk}"])
+
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+        self.assertEqual((user.pk, user.email, user.date_of_birth), (self.user.pk, self.user.email, None))
+        self.assertEqual(user.get_deferred_fields(), {"password", "last_login"})
+
+    def test_principal_cached_before_a_field_was_added_is_reloaded(self):
+        self.authenticate()
+        key = f"principal:{self.user.pk}"
+        values = json.loads(self.redis.data[key])
+        del values["nickname"]
+        self.redis.data[key] = json.dumps(values)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate().pk, self.user.pk)
+        self.assertIn("nickname", json.loads(self.redis.data[key]))
+
+    def test_saving_the_user_drops_the_principal(self):
+        self.authenticate()
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.redis.data, {})
+        self.assertEqual(self.client.get(reverse("user-transactions")).status_code, 401)
+
+    def test_saving_a_cached_principal_keeps_the_password(self):
+        self.authenticate()
+        user = self.authenticate()
+        user.nickname = "ada"
+        user.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.nickname, "ada")
+        self.assertTrue(self.user.check_password("pass12345"))
+
+    def test_wallet_views_join_the_wallet(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("wallet-provisioning"))
+        self.assertEqual(response.status_code, 200)
+
+
+class RedisClientTests(TestCase):
+    def test_records_latency_per_command(self):
+        backend = mock.Mock()
+        backend.get.return_value = "1"
+        backend.delete.side_effect = ValueError("bad key")
+        client = RedisClient(backend)
+
+        self.assertEqual(client.get("a"), "1")
+        client.get("b")
+        with self.assertRaises(ValueError):
+            client.delete("a")
+
+        stats = client.stats()
+        self.assertEqual(stats["GET"]["count"], 2)
+        self.assertEqual(stats["GET"]["errors"], 0)
+        self.assertEqual(stats["DELETE"]["errors"], 1)
+
+    def test_falls_back_to_upstash_when_pool_is_unreachable(self):
+        backend, fallback = mock.Mock(), mock.Mock()
+        backend.set.side_effect = RedisConnectionError("Error 111 connecting to redis:6379. Connection refused.")
+        fallback.set.return_value = True
+        client = RedisClient(backend, fallback=fallback)
+
+        self.assertTrue(client.set("reset:a@example.com", "12345", ex=600))
+        fallback.set.assert_called_once_with("reset:a@example.com", "12345", ex=600)
+        self.assertEqual(client.stats()["SET"]["errors"], 1)
+        self.assertEqual(client.stats()["SET (FALLBACK)"]["count"], 1)
+
+    def test_connection_errors_propagate_without_fallback(self):
+        backend = mock.Mock()
+        backend.get.side_effect = RedisConnectionError("Error 111 connecting to redis:6379. Connection refused.")
+        with self.assertRaises(RedisConnectionError):
+            RedisClient(backend).get("a")
+
+    def test_errors_after_the_command_was_sent_do_not_fall_back(self):
+        backend, fallback = mock.Mock(), mock.Mock()
+        client = RedisClient(backend, fallback=fallback)
+        for error in (RedisTimeoutError("Timeout reading from socket"), RedisConnectionError("Connection closed by server.")):
+            backend.set.side_effect = error
+            with self.assertRaises(type(error)):
+                client.set("a", "1")
+        fallback.set.assert_not_called()
+
+    def test_scripts_and_counters_never_fall_back(self):
+        backend, fallback = mock.Mock(), mock.Mock()
+        client = RedisClient(backend, fallback=fallback)
+        for name in ("eval", "incrby", "decr"):
+            getattr(backend, name).side_effect = RedisConnectionError("Error 111 connecting to redis:6379. Connection refused.")
+            with self.assertRaises(RedisConnectionError):
+                getattr(client, name)("limits:key", 1)
+            getattr(fallback, name).assert_not_called()
+
+    @override_settings(LIMIT_COUNTERS={**settings.LIMIT_COUNTERS, "BACKEND": "redis"})
+    def test_limit_counters_fail_closed_when_the_pool_times_out(self):
+        backend, fallback = mock.Mock(), mock.Mock()
+        backend.get.return_value = "0"
+        backend.eval.side_effect = RedisTimeoutError("Timeout reading from socket")
+        with mock.patch("auth_system.redis_client.redis", RedisClient(backend, fallback=fallback)), \
+                self.assertRaises(LimitsUnavailable), self.assertLogs("operations.limits", "WARNING"):
+            consume(1, "outflow", 100, 1000)
+        fallback.eval.assert_not_called()
+
+    def test_native_eval_takes_upstash_keys_and_args(self):
+        client = NativeRedis()
+        script = mock.Mock(return_value=3)
+        with mock.patch.object(client, "register_script", return_value=script) as register:
+            self.assertEqual(client.eval("return 1", keys=["k"], args=[1, 2]), 3)
+            client.eval("return 1", keys=["k"])
+        register.assert_called_once_with("return 1")
+        script.assert_called_with(keys=["k"], args=[])
+
+    def test_pipeline_execute_is_timed(self):
+        backend = mock.Mock()
+        pipeline = backend.pipeline.return_value
+        pipeline.set.return_value = pipeline
+        pipeline.execute.return_value = [True, 2]
+        client = RedisClient(backend)
+
+        with client.pipeline() as queued:
+            self.assertIs(queued.set("x", 1), queued)
+            self.assertEqual(queued.execute(), [True, 2])
+        self.assertEqual(client.stats()["PIPELINE"]["count"], 1)
@@ -12,4 +12,5 @@ urlpatterns = [
     path('profile/update/', views.UserUpdateView.as_view(), name='profile-update'),
     path('profile/', views.UserProfileView.as_view(), name='user-profile'),
     path('user/wallet/', views.WalletView.as_view(), name="user_wallet_details"),
+    path('user/wallet/provisioning/', views.WalletProvisioningView.as_view(), name="wallet-provisioning"),
 ]
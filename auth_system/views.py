@@ -1,12 +1,14 @@
 from rest_framework import generics, status, permissions
 from rest_framework.views import APIView
 from .models import User as CustomUser, Wallet
-from .serializers import UserSerializer, PasswordResetSerializer, PasswordResetConfirmSerializer, UserUpdateSerializer, WalletSerializer, ErrorResponseSerializer
+from .serializers import UserSerializer, PasswordResetSerializer, PasswordResetConfirmSerializer, UserUpdateSerializer, WalletSerializer, ErrorResponseSerializer, WalletProvisioningSerializer
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from utilities import services
 from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiExample
 from rest_framework.permissions import IsAuthenticated
+from .authentication import WalletJWTAuthentication
+from .read_models import CachedReadModelMixin
 
 # Permissions
 class IsOwnerOrAdmin(permissions.BasePermission):
@@ -330,12 +332,17 @@ class UserUpdateView(generics.UpdateAPIView):
 )
 
 # UserProfile View Endpoint
-class UserProfileView(generics.RetrieveAPIView):
+class UserProfileView(CachedReadModelMixin, generics.RetrieveAPIView):
     serializer_class = UserSerializer
     permission_classes = [IsOwnerOrAdmin]
+    read_model = "profile"
 
     def get_object(self):
         return self.request.user
+
+    def is_cacheable(self, instance):
+        wallet = getattr(instance, 'wallet', None)
+        return wallet is not None and wallet.provisioning_status == 'active'
     
 @extend_schema(
     summary="Get wallet details",
@@ -363,10 +370,50 @@ class UserProfileView(generics.RetrieveAPIView):
 )
 
 # WalletView Endpoint
-class WalletView(generics.RetrieveAPIView):
+class WalletView(CachedReadModelMixin, generics.RetrieveAPIView):
     queryset = Wallet
     serializer_class = WalletSerializer
     permission_classes = [IsAuthenticated]
+    read_model = "wallet"
+
+    def get_object(self):
+        return self.request.user.wallet
+
+    def is_cacheable(self, instance):
+        # Account details are still being filled in until provisioning finishes
+        return instance.provisioning_status == 'active'
+
+@extend_schema(
+    summary="Get wallet provisioning status",
+    description=(
+        "The reserved account is created in the background after signup. Poll this until "
+        "`status` is `active` (account details are filled in) or `failed`."
+    ),
+    responses={
+        status.HTTP_200_OK: OpenApiResponse(
+            response=WalletProvisioningSerializer,
+            description="Provisioning status.",
+            examples=[OpenApiExample(
+                "Provisioned",
+                value={
+                    "status": "active",
+                    "attempts": 1,
+                    "error": None,
+                    "monnify_account_number": "1234567890",
+                    "monnify_bank_name": "Moniepoint Microfinance Bank",
+                    "bank_user_name": "John Doe"
+                },
+                summary="Active"
+            )]
+        ),
+    },
+)
+
+# Wallet Provisioning Status Endpoint
+class WalletProvisioningView(generics.RetrieveAPIView):
+    serializer_class = WalletProvisioningSerializer
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [WalletJWTAuthentication]
 
     def get_object(self):
         return self.request.user.wallet
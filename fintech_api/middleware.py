@@ -0,0 +1,80 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger("fintech_api.queries")
+
+
+class QueryRecorder:
+    """Database execute wrapper that counts and times every query run through it."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.signatures = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            # sql still has its placeholders here, so repeats of one statement share a signature
+            self.signatures[sql] += 1
+
+    def duplicates(self, threshold):
+        return [(sql, count) for sql, count in self.signatures.most_common() if count >= threshold]
+
+
+class QueryCountMiddleware:
+    """
+    Records the query count, database time and repeated statements of each request,
+    and reports them in a Server-Timing header and one JSON log line per request.
+    A statement repeated DUPLICATE_THRESHOLD times or more is logged as a warning,
+    since that is usually an N+1 loop.
+
+    Opt-in through QUERY_INSIGHTS["ENABLED"]. Queries run while a streaming
+    response is consumed happen after this returns and are not counted.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSIGHTS["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = settings.QUERY_INSIGHTS["DUPLICATE_THRESHOLD"]
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        duplicates = recorder.duplicates(self.threshold)
+        response["Server-Timing"] = ", ".join([
+            f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"',
+            f'dup;desc="{len(duplicates)} repeated"',
+            f"total;dur={total * 1000:.1f}",
+        ])
+
+        match = request.resolver_match
+        stats = {
+            "view": match.view_name if match else None,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": recorder.count,
+            "db_ms": round(recorder.duration * 1000, 1),
+            "total_ms": round(total * 1000, 1),
+            "duplicates": [{"sql": sql[:300], "count": count} for sql, count in duplicates],
+        }
+        logger.log(logging.WARNING if duplicates else logging.INFO, json.dumps(stats))
+        return response
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv
 from datetime import timedelta
 import cloudinary
@@ -23,6 +24,21 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 UPSTASH_REDIS_REST_URL = os.getenv("UPSTASH_REDIS_REST_URL")
 UPSTASH_REDIS_REST_TOKEN = os.getenv("UPSTASH_REDIS_REST_TOKEN")
 
+# Redis backend: "upstash" sends every command over the Upstash REST API, "native" uses a
+# RESP connection pool on REDIS_URL (e.g. the rediss:// endpoint of the same Upstash database).
+# With UPSTASH_FALLBACK, commands the pool could not send because it could not connect are
+# sent over REST instead. Scripts and INCR/DECR never fall back.
+REDIS = {
+    "BACKEND": os.getenv("REDIS_BACKEND", "upstash"),
+    "URL": os.getenv("REDIS_URL"),
+    "MAX_CONNECTIONS": int(os.getenv("REDIS_MAX_CONNECTIONS", 50)),
+    "POOL_TIMEOUT": float(os.getenv("REDIS_POOL_TIMEOUT", 5)),
+    "CONNECT_TIMEOUT": float(os.getenv("REDIS_CONNECT_TIMEOUT", 2)),
+    "SOCKET_TIMEOUT": float(os.getenv("REDIS_SOCKET_TIMEOUT", 2)),
+    "HEALTH_CHECK_INTERVAL": int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30)),
+    "UPSTASH_FALLBACK": os.getenv("REDIS_UPSTASH_FALLBACK", "true").lower() == "true",
+}
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -57,6 +73,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "fintech_api.middleware.QueryCountMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -164,7 +181,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'auth_system.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
@@ -184,6 +201,14 @@ TIER_RULES = {
 }
 
 
+# Users authenticated by JWT are cached in Redis per user id and dropped when the user is
+# saved or deleted. Off by default on the Upstash REST backend, where a cache read costs
+# more than the query it saves
+AUTH_PRINCIPAL_CACHE = {
+    "ENABLED": os.getenv("AUTH_PRINCIPAL_CACHE_ENABLED", str(REDIS["BACKEND"] == "native")).lower() == "true",
+    "TTL": int(os.getenv("AUTH_PRINCIPAL_CACHE_TTL", 300)),
+}
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(hours=1),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
@@ -217,4 +242,153 @@ SPECTACULAR_SETTINGS = {
 MONNIFY_API_KEY = os.getenv("MONNIFY_API_KEY")
 MONNIFY_SECRET_KEY = os.getenv("MONNIFY_SECRET_KEY")
 MONNIFY_CONTRACT_CODE = os.getenv("MONNIFY_CONTRACT_CODE")
-MONNIFY_BASE_URL = os.getenv("MONNIFY_BASE_URL")
\ No newline at end of file
+MONNIFY_BASE_URL = os.getenv("MONNIFY_BASE_URL")
+# Seconds before expiry at which the cached Monnify token is refreshed
+MONNIFY_TOKEN_REFRESH_MARGIN = int(os.getenv("MONNIFY_TOKEN_REFRESH_MARGIN", 120))
+# Share the Monnify token between workers through Redis
+MONNIFY_TOKEN_SHARED_CACHE = os.getenv("MONNIFY_TOKEN_SHARED_CACHE", "false").lower() == "true"
+
+# Size of the shared thread pool used for off-request work
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", 4))
+
+# Shared Monnify HTTP client: connection pool, timeouts (seconds) and retry backoff
+MONNIFY_HTTP = {
+    "POOL_CONNECTIONS": int(os.getenv("MONNIFY_HTTP_POOL_CONNECTIONS", 4)),
+    "POOL_MAXSIZE": int(os.getenv("MONNIFY_HTTP_POOL_MAXSIZE", 20)),
+    "CONNECT_TIMEOUT": float(os.getenv("MONNIFY_HTTP_CONNECT_TIMEOUT", 3.05)),
+    "READ_TIMEOUT": float(os.getenv("MONNIFY_HTTP_READ_TIMEOUT", 20)),
+    "MAX_RETRIES": int(os.getenv("MONNIFY_HTTP_MAX_RETRIES", 2)),
+    "BACKOFF_BASE": float(os.getenv("MONNIFY_HTTP_BACKOFF_BASE", 0.2)),
+    "BACKOFF_MAX": float(os.getenv("MONNIFY_HTTP_BACKOFF_MAX", 2)),
+}
+
+# Cached Monnify bank list: served fresh for TTL seconds, then stale-while-revalidate up to STALE_TTL
+BANK_DIRECTORY = {
+    "TTL": int(os.getenv("BANK_DIRECTORY_TTL", 6 * 60 * 60)),
+    "STALE_TTL": int(os.getenv("BANK_DIRECTORY_STALE_TTL", 7 * 24 * 60 * 60)),
+}
+
+# Resolved beneficiary names, keyed by (bank_code, account_number); TTLs in seconds
+BENEFICIARY_CACHE = {
+    "TTL": int(os.getenv("BENEFICIARY_CACHE_TTL", 24 * 60 * 60)),
+    "NEGATIVE_TTL": int(os.getenv("BENEFICIARY_CACHE_NEGATIVE_TTL", 10 * 60)),
+    "LOCAL_TTL": int(os.getenv("BENEFICIARY_CACHE_LOCAL_TTL", 5 * 60)),
+    "LOCAL_MAX_ENTRIES": int(os.getenv("BENEFICIARY_CACHE_LOCAL_MAX_ENTRIES", 10000)),
+}
+
+# External transfer outbox: dispatch concurrency, retry limits and backoff (seconds)
+TRANSFER_OUTBOX = {
+    "CONCURRENCY": int(os.getenv("TRANSFER_OUTBOX_CONCURRENCY", 4)),
+    "BATCH_SIZE": int(os.getenv("TRANSFER_OUTBOX_BATCH_SIZE", 20)),
+    "MAX_ATTEMPTS": int(os.getenv("TRANSFER_OUTBOX_MAX_ATTEMPTS", 5)),
+    "BACKOFF_BASE": float(os.getenv("TRANSFER_OUTBOX_BACKOFF_BASE", 2)),
+    "BACKOFF_MAX": float(os.getenv("TRANSFER_OUTBOX_BACKOFF_MAX", 300)),
+    "STALE_AFTER": int(os.getenv("TRANSFER_OUTBOX_STALE_AFTER", 120)),
+    "POLL_INTERVAL": float(os.getenv("TRANSFER_OUTBOX_POLL_INTERVAL", 1)),
+    # Also dispatch from the web process as soon as the debit commits
+    "DISPATCH_ON_COMMIT": os.getenv("TRANSFER_OUTBOX_DISPATCH_ON_COMMIT", "true").lower() == "true",
+}
+
+# Batch payouts: legs accepted per request. External legs are sent in one Monnify
+# bulk disbursement by the run_transfer_outbox worker, with TRANSFER_OUTBOX retries
+PAYOUT_BATCH = {
+    "MAX_ITEMS": int(os.getenv("PAYOUT_BATCH_MAX_ITEMS", 100)),
+    # Threads resolving external banks and account names, shared by all batch requests
+    "RESOLVE_CONCURRENCY": int(os.getenv("PAYOUT_BATCH_RESOLVE_CONCURRENCY", 4)),
+}
+
+# Monnify webhooks are stored in WebhookEvent and applied by the process_webhook_events command
+WEBHOOK_INBOX = {
+    "CONCURRENCY": int(os.getenv("WEBHOOK_INBOX_CONCURRENCY", 4)),
+    "BATCH_SIZE": int(os.getenv("WEBHOOK_INBOX_BATCH_SIZE", 100)),
+    "MAX_ATTEMPTS": int(os.getenv("WEBHOOK_INBOX_MAX_ATTEMPTS", 5)),
+    "STALE_AFTER": int(os.getenv("WEBHOOK_INBOX_STALE_AFTER", 120)),
+    "POLL_INTERVAL": float(os.getenv("WEBHOOK_INBOX_POLL_INTERVAL", 1)),
+    # "batch" settles each claimed batch of funding events together, "single" one by one
+    "SETTLEMENT_MODE": os.getenv("WEBHOOK_INBOX_SETTLEMENT_MODE", "batch"),
+    # Also apply events from the web process right after they are stored
+    "PROCESS_ON_COMMIT": os.getenv("WEBHOOK_INBOX_PROCESS_ON_COMMIT", "true").lower() == "true",
+}
+
+# Daily inflow/outflow counters: "redis" keeps them in atomic Redis keys reconciled to
+# DailyLimitTracker by the reconcile_limit_counters command, "database" uses the tracker directly
+LIMIT_COUNTERS = {
+    "BACKEND": os.getenv("LIMIT_COUNTERS_BACKEND", "redis"),
+    "RECONCILE_BATCH": int(os.getenv("LIMIT_COUNTERS_RECONCILE_BATCH", 500)),
+    "RECONCILE_GRACE": int(os.getenv("LIMIT_COUNTERS_RECONCILE_GRACE", 6 * 60 * 60)),
+}
+
+# Admin changelists on large tables: unfiltered lists use the planner's row estimate above
+# ESTIMATE_ABOVE rows, filtered lists are counted up to MAX_COUNT
+ADMIN_PAGINATION = {
+    "ESTIMATE_ABOVE": int(os.getenv("ADMIN_PAGINATION_ESTIMATE_ABOVE", 100000)),
+    "MAX_COUNT": int(os.getenv("ADMIN_PAGINATION_MAX_COUNT", 10000)),
+}
+
+# Daily volume rollups behind the admin dashboard. Each day's totals are spread over
+# SHARDS rows to keep concurrent settlements off a single hot row
+VOLUME_ROLLUPS = {
+    "SHARDS": int(os.getenv("VOLUME_ROLLUPS_SHARDS", 8)),
+    "DASHBOARD_DAYS": int(os.getenv("VOLUME_ROLLUPS_DASHBOARD_DAYS", 30)),
+}
+
+# Serialized wallet/profile payloads cached per user and served with ETags. Entries are
+# dropped whenever a balance or profile changes; TTL (seconds) only bounds how long one
+# can outlive a missed invalidation
+READ_MODELS = {
+    "ENABLED": os.getenv("READ_MODELS_ENABLED", "true").lower() == "true",
+    "TTL": int(os.getenv("READ_MODELS_TTL", 120)),
+}
+
+# Monnify reserved accounts are created after signup commits, by the web process
+# and by the provision_wallets worker, with retries and backoff
+WALLET_PROVISIONING = {
+    "CONCURRENCY": int(os.getenv("WALLET_PROVISIONING_CONCURRENCY", 4)),
+    "BATCH_SIZE": int(os.getenv("WALLET_PROVISIONING_BATCH_SIZE", 20)),
+    "MAX_ATTEMPTS": int(os.getenv("WALLET_PROVISIONING_MAX_ATTEMPTS", 8)),
+    "BACKOFF_BASE": float(os.getenv("WALLET_PROVISIONING_BACKOFF_BASE", 5)),
+    "BACKOFF_MAX": float(os.getenv("WALLET_PROVISIONING_BACKOFF_MAX", 900)),
+    "STALE_AFTER": int(os.getenv("WALLET_PROVISIONING_STALE_AFTER", 120)),
+    "POLL_INTERVAL": float(os.getenv("WALLET_PROVISIONING_POLL_INTERVAL", 2)),
+    "PROVISION_ON_COMMIT": os.getenv("WALLET_PROVISIONING_ON_COMMIT", "true").lower() == "true",
+    # Optional endpoint told when a wallet is provisioned or gives up
+    "NOTIFY_URL": os.getenv("WALLET_PROVISIONING_NOTIFY_URL"),
+    "NOTIFY_SECRET": os.getenv("WALLET_PROVISIONING_NOTIFY_SECRET"),
+    "NOTIFY_TIMEOUT": float(os.getenv("WALLET_PROVISIONING_NOTIFY_TIMEOUT", 5)),
+}
+
+# KYC documents and avatars are written to DIR during the request and pushed to
+# Cloudinary in CHUNK_SIZE pieces by the web process on commit and by the
+# process_uploads worker. DIR must be shared by the web process and the worker.
+UPLOAD_SPOOL = {
+    "DIR": os.getenv("UPLOAD_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "fintech_uploads")),
+    "CHUNK_SIZE": int(os.getenv("UPLOAD_SPOOL_CHUNK_SIZE", 6 * 1024 * 1024)),
+    # Threads sending the middle chunks of one file, shared by all uploads
+    "CHUNK_CONCURRENCY": int(os.getenv("UPLOAD_SPOOL_CHUNK_CONCURRENCY", 4)),
+    "CONCURRENCY": int(os.getenv("UPLOAD_SPOOL_CONCURRENCY", 4)),
+    "BATCH_SIZE": int(os.getenv("UPLOAD_SPOOL_BATCH_SIZE", 10)),
+    "MAX_ATTEMPTS": int(os.getenv("UPLOAD_SPOOL_MAX_ATTEMPTS", 5)),
+    "BACKOFF_BASE": float(os.getenv("UPLOAD_SPOOL_BACKOFF_BASE", 5)),
+    "BACKOFF_MAX": float(os.getenv("UPLOAD_SPOOL_BACKOFF_MAX", 600)),
+    "STALE_AFTER": int(os.getenv("UPLOAD_SPOOL_STALE_AFTER", 600)),
+    "POLL_INTERVAL": float(os.getenv("UPLOAD_SPOOL_POLL_INTERVAL", 2)),
+    "UPLOAD_ON_COMMIT": os.getenv("UPLOAD_SPOOL_UPLOAD_ON_COMMIT", "true").lower() == "true",
+}
+
+# Avatars are downscaled, stripped of EXIF and re-encoded before they are spooled
+IMAGE_PROCESSING = {
+    "MAX_DIMENSION": int(os.getenv("IMAGE_PROCESSING_MAX_DIMENSION", 1024)),
+    "FORMAT": os.getenv("IMAGE_PROCESSING_FORMAT", "WEBP"),
+    "QUALITY": int(os.getenv("IMAGE_PROCESSING_QUALITY", 80)),
+}
+
+# Per-request query count, DB time and repeated statements, as Server-Timing headers
+# and "fintech_api.queries" log lines. Off by default.
+QUERY_INSIGHTS = {
+    "ENABLED": os.getenv("QUERY_INSIGHTS_ENABLED", "false").lower() == "true",
+    # A statement run this many times in one request is reported as a likely N+1
+    "DUPLICATE_THRESHOLD": int(os.getenv("QUERY_INSIGHTS_DUPLICATE_THRESHOLD", 3)),
+}
+
+# Rows fetched per round trip when streaming statement exports
+STATEMENT_EXPORT_CHUNK_SIZE = int(os.getenv("STATEMENT_EXPORT_CHUNK_SIZE", 2000))
@@ -0,0 +1,72 @@
+from contextlib import contextmanager
+from importlib import import_module
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver
+
+# Most queries each named endpoint may run for one request on its main path,
+# authentication included, on the first transfer of the day (which creates the
+# daily limit rows). Raising a budget should come with a reason in review.
+QUERY_BUDGETS = {
+    # operations/urls.py
+    "send-money": 27,
+    "name-enquiry": 2,
+    "payout-batch": 29,
+    "payout-batch-status": 4,
+    "payout-batch-otp": 4,
+    "transfer-status": 3,
+    "request-tier-upgrade": 8,
+    "review-tier-upgrade": 8,
+    "list-upgrade-requests": 3,
+    "monnify-webhook": 2,
+    "fund-wallet": 4,
+    "monnify-out-transfer-webhook": 2,
+    "otp-verification-for-external-transfer": 3,
+    "user-transactions": 3,
+    "transaction-statement": 6,
+    "wallet-balance-at": 5,
+    # auth_system/urls.py
+    "token_obtain_pair": 2,
+    "token_refresh": 2,
+    "register": 15,
+    "email_reset_code": 3,
+    "password_reset": 3,
+    "profile-update": 3,
+    "user-profile": 3,
+    "user_wallet_details": 3,
+    "wallet-provisioning": 2,
+}
+
+
+def url_names(urlconf):
+    """Names of every pattern in a urlconf module (or its dotted path), including nested includes."""
+    if isinstance(urlconf, str):
+        urlconf = import_module(urlconf)
+    patterns = getattr(urlconf, "urlpatterns", urlconf)
+    names = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names |= url_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+class QueryBudgetMixin:
+    """TestCase mixin for holding endpoints to their QUERY_BUDGETS entry."""
+
+    @contextmanager
+    def assertQueryBudget(self, url_name):
+        budget = QUERY_BUDGETS[url_name]
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > budget:
+            queries = "\n".join(
+                f"{number}. {query['sql']}" for number, query in enumerate(context.captured_queries, start=1)
+            )
+            self.fail(f"'{url_name}' ran {executed} queries, its budget is {budget}:\n{queries}")
+
+    def assertBudgetsCover(self, urlconf):
+        missing = url_names(urlconf) - set(QUERY_BUDGETS)
+        self.assertFalse(missing, f"No query budget for: {', '.join(sorted(missing))}")
@@ -1,11 +1,79 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import Transaction
+from django.template.response import TemplateResponse
+from utilities.paginators import EstimatedCountPaginator
+from . import rollups
+from .models import DailyVolumeRollup, TierUpgradeRequest, Transaction
 
 # Register your models here.
 class TransactionAdmin(admin.ModelAdmin):
-    list_display = ('user', 'amount', 'status', 'transaction_reference', 'created_at')
-    search_fields = ('sender__email', 'recipient__email', 'transaction_reference')
+    list_display = ('user', 'transaction_type', 'transfer_type', 'amount', 'status', 'transaction_reference', 'created_at')
+    list_select_related = ('user',)
+    # Exact matches only, so searches use the unique indexes instead of scanning the table
+    search_fields = ('=transaction_reference', '=user__email')
     list_filter = ('status', 'created_at')
-    ordering = ('sender__id',)
+    ordering = ('-created_at', '-id')
+    raw_id_fields = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
-admin.site.register(Transaction, TransactionAdmin)
\ No newline at end of file
+
+class TierUpgradeRequestAdmin(admin.ModelAdmin):
+    list_display = ('user', 'current_tier', 'requested_tier', 'id_type', 'status', 'submitted_at', 'reviewed_at')
+    list_select_related = ('user',)
+    search_fields = ('=user__email', '=bvn')
+    list_filter = ('status', 'requested_tier')
+    ordering = ('-submitted_at',)
+    raw_id_fields = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class DailyVolumeRollupAdmin(admin.ModelAdmin):
+    """
+    Read-only dashboard of daily volumes, fee revenue, status counts and the tier
+    distribution. It reads only the rollup tables, so its cost grows with the number
+    of days shown, not with the number of transactions.
+    """
+    change_list_template = 'admin/operations/dailyvolumerollup/dashboard.html'
+    max_days = 366
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        try:
+            days = int(request.GET.get('days', settings.VOLUME_ROLLUPS["DASHBOARD_DAYS"]))
+        except ValueError:
+            days = settings.VOLUME_ROLLUPS["DASHBOARD_DAYS"]
+        days = max(1, min(days, self.max_days))
+
+        volumes = rollups.daily_volumes(days)
+        totals = {
+            column: sum(row[column] for row in volumes)
+            for column in ("inflow", "outflow", "internal", "fees", "success", "failed")
+        }
+        tier_date, tiers = rollups.tier_distribution()
+        context = {
+            **self.admin_site.each_context(request),
+            "title": "Daily volumes",
+            "opts": self.model._meta,
+            "days": days,
+            "max_days": self.max_days,
+            "volumes": volumes,
+            "totals": totals,
+            "tier_date": tier_date,
+            "tiers": tiers,
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, self.change_list_template, context)
+
+admin.site.register(Transaction, TransactionAdmin)
+admin.site.register(TierUpgradeRequest, TierUpgradeRequestAdmin)
+admin.site.register(DailyVolumeRollup, DailyVolumeRollupAdmin)
@@ -0,0 +1,92 @@
+from decimal import Decimal
+from django.db import transaction as db_transaction
+from django.db.models import Sum
+from django.utils import timezone
+from auth_system import read_models
+from auth_system.models import Wallet
+from .models import LedgerEntry, LedgerJournal
+
+
+class UnbalancedJournal(ValueError):
+    """Raised when a journal's entries do not sum to zero."""
+
+
+def wallet_entry(wallet_id, amount):
+    return LedgerEntry(account='wallet', wallet_id=wallet_id, amount=amount)
+
+
+def system_entry(account, amount):
+    return LedgerEntry(account=account, amount=amount)
+
+
+def wallet_ids_for_users(user_ids):
+    """Maps user ids to wallet ids in one query, for postings that only know the user."""
+    return dict(Wallet.objects.filter(user_id__in=user_ids).values_list('user_id', 'pk'))
+
+
+def post_journal(reference, kind, entries):
+    return post_journals([(reference, kind, entries)])[0]
+
+
+def post_journals(journals):
+    """
+    Appends (reference, kind, entries) journals to the ledger with two inserts in
+    total. Must run inside the atomic block that changes the wallet balances, so the
+    ledger and the balances it explains commit together. Wallet.balance remains the
+    projection that reads use; rebuild_wallet_balances recomputes it from here.
+    """
+    now = timezone.now()
+    rows, all_entries = [], []
+    for reference, kind, entries in journals:
+        if sum((entry.amount for entry in entries), Decimal("0.00")) != 0:
+            raise UnbalancedJournal(f"Journal {kind} {reference} does not balance.")
+        rows.append(LedgerJournal(reference=reference, kind=kind, created_at=now))
+    with db_transaction.atomic():
+        LedgerJournal.objects.bulk_create(rows)
+        for journal, (_, _, entries) in zip(rows, journals):
+            for entry in entries:
+                entry.journal = journal
+                entry.created_at = now
+            all_entries += entries
+        LedgerEntry.objects.bulk_create(all_entries)
+    return rows
+
+
+def wallet_balances(wallet_ids=None, at=None):
+    """Sums wallet entries per wallet, optionally only those up to `at`."""
+    entries = LedgerEntry.objects.filter(account='wallet')
+    if wallet_ids is not None:
+        entries = entries.filter(wallet_id__in=wallet_ids)
+    if at is not None:
+        entries = entries.filter(created_at__lte=at)
+    return dict(entries.values('wallet_id').annotate(total=Sum('amount')).values_list('wallet_id', 'total'))
+
+
+def rebuild_balances(batch_size=500, dry_run=False):
+    """
+    Recomputes Wallet.balance from the ledger, batch_size wallets at a time. Each
+    batch is locked first, so postings in flight either finish before the sums are
+    read or apply their F() update on top of the rebuilt value. Returns
+    (wallet_id, stored, ledger) for every wallet that had drifted.
+    """
+    drifted = []
+    last_pk = 0
+    while True:
+        with db_transaction.atomic():
+            wallets = list(
+                Wallet.objects.select_for_update().filter(pk__gt=last_pk).order_by('pk')[:batch_size]
+            )
+            if not wallets:
+                return drifted
+            last_pk = wallets[-1].pk
+            totals = wallet_balances([wallet.pk for wallet in wallets])
+            changed = []
+            for wallet in wallets:
+                total = totals.get(wallet.pk, Decimal("0.00"))
+                if wallet.balance != total:
+                    drifted.append((wallet.pk, wallet.balance, total))
+                    wallet.balance = total
+                    changed.append(wallet)
+            if changed and not dry_run:
+                Wallet.objects.bulk_update(changed, ['balance'])
+                read_models.invalidate(*(wallet.user_id for wallet in changed))
@@ -0,0 +1,252 @@
+import logging
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .models import DailyLimitTracker
+
+logger = logging.getLogger(__name__)
+
+DIRECTIONS = {"inflow": "daily_inflow", "outflow": "daily_outflow"}
+
+
+class LimitsUnavailable(Exception):
+    """
+    Raised when the Redis counters cannot be reached. Limits fail closed: the database
+    tracker only holds what reconcile() last copied, so checking against it would let
+    users go over their caps, and counting into it would be overwritten by the next
+    reconcile.
+    """
+
+# Counters hold kobo so INCRBY stays exact. Returns the new total, -1 when the
+# key has not been seeded for the day yet, or -2 when the cap would be exceeded.
+CONSUME_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if not current then
+    return -1
+end
+local amount = tonumber(ARGV[1])
+if tonumber(current) + amount > tonumber(ARGV[2]) then
+    return -2
+end
+local total = redis.call('INCRBY', KEYS[1], amount)
+redis.call('SADD', KEYS[2], ARGV[3])
+redis.call('EXPIREAT', KEYS[2], ARGV[4])
+return total
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local total = redis.call('DECRBY', KEYS[1], ARGV[1])
+if total < 0 then
+    redis.call('SET', KEYS[1], 0, 'KEEPTTL')
+end
+redis.call('SADD', KEYS[2], ARGV[2])
+redis.call('EXPIREAT', KEYS[2], ARGV[3])
+return 1
+"""
+
+
+def _today():
+    return timezone.now().date()
+
+
+def _to_kobo(amount):
+    return int((Decimal(amount) * 100).quantize(Decimal("1")))
+
+
+def _from_kobo(value):
+    return Decimal(int(value or 0)) / 100
+
+
+def _counter_key(user_id, direction, day):
+    return f"limits:{day.isoformat()}:{user_id}:{direction}"
+
+
+def _dirty_key(day):
+    return f"limits:dirty:{day.isoformat()}"
+
+
+def _expires_at(day):
+    """
+    Counters stop being used at midnight, when the date in the key rolls over. The
+    key itself is kept for RECONCILE_GRACE seconds more so the last reconcile of
+    the day can still read it.
+    """
+    midnight = datetime.combine(day + timedelta(days=1), dt_time.min, tzinfo=dt_timezone.utc)
+    return int(midnight.timestamp()) + settings.LIMIT_COUNTERS["RECONCILE_GRACE"]
+
+
+def _use_redis():
+    return settings.LIMIT_COUNTERS["BACKEND"] == "redis"
+
+
+def consume(user_id, direction, amount, cap):
+    """
+    Atomically adds amount to the user's inflow/outflow for today if the total stays
+    within cap. Returns True when the amount was counted, False when over the cap.
+    Raises LimitsUnavailable when the Redis counters cannot be reached.
+    """
+    if not _use_redis():
+        return _consume_database(user_id, direction, amount, cap)
+    try:
+        return _consume_redis(user_id, direction, amount, cap)
+    except Exception as exc:
+        logger.warning("Redis limit counter unavailable, rejecting movement", exc_info=True)
+        raise LimitsUnavailable() from exc
+
+
+def release(user_id, direction, amount, day=None):
+    """
+    Gives back an amount counted by consume(), e.g. when a transfer fails or is refunded.
+    If the Redis counter cannot be reached the amount stays counted until the day ends;
+    it is never taken off the database tracker, which did not count it.
+    """
+    day = day or _today()
+    if _use_redis():
+        try:
+            from auth_system.redis_client import redis
+            redis.eval(
+                RELEASE_SCRIPT,
+                keys=[_counter_key(user_id, direction, day), _dirty_key(day)],
+                args=[str(_to_kobo(amount)), str(user_id), str(_expires_at(day))],
+            )
+        except Exception:
+            logger.error(
+                "Could not release %s %s for user %s on %s", direction, amount, user_id, day, exc_info=True
+            )
+        return
+    field = DIRECTIONS[direction]
+    DailyLimitTracker.objects.filter(user_id=user_id, date=day).update(
+        **{field: Greatest(F(field) - amount, Value(Decimal("0.00")))}
+    )
+
+
+def current(user_id, direction):
+    """
+    Returns the amount already counted for the user today. Raises LimitsUnavailable
+    when the Redis counters cannot be reached.
+    """
+    day = _today()
+    if _use_redis():
+        try:
+            from auth_system.redis_client import redis
+            value = redis.get(_counter_key(user_id, direction, day))
+            if value is not None:
+                return _from_kobo(value)
+            return _seed_from_database(user_id, direction, day)
+        except Exception as exc:
+            logger.warning("Redis limit counter unavailable", exc_info=True)
+            raise LimitsUnavailable() from exc
+    tracker = DailyLimitTracker.objects.filter(user_id=user_id, date=day).values(DIRECTIONS[direction]).first()
+    return tracker[DIRECTIONS[direction]] if tracker else Decimal("0.00")
+
+
+def _consume_redis(user_id, direction, amount, cap):
+    from auth_system.redis_client import redis
+
+    day = _today()
+    keys = [_counter_key(user_id, direction, day), _dirty_key(day)]
+    args = [str(_to_kobo(amount)), str(_to_kobo(cap)), str(user_id), str(_expires_at(day))]
+    result = int(redis.eval(CONSUME_SCRIPT, keys=keys, args=args))
+    if result == -1:
+        _seed_from_database(user_id, direction, day)
+        result = int(redis.eval(CONSUME_SCRIPT, keys=keys, args=args))
+    return result >= 0
+
+
+def _seed_from_database(user_id, direction, day):
+    """Starts today's counter from whatever the database already has, once per user per day."""
+    from auth_system.redis_client import redis
+
+    tracker = DailyLimitTracker.objects.filter(user_id=user_id, date=day).values(DIRECTIONS[direction]).first()
+    amount = tracker[DIRECTIONS[direction]] if tracker else Decimal("0.00")
+    redis.set(_counter_key(user_id, direction, day), _to_kobo(amount), nx=True, exat=_expires_at(day))
+    return amount
+
+
+def _consume_database(user_id, direction, amount, cap):
+    """
+    Database backend: a conditional UPDATE against DailyLimitTracker. The tracker
+    row is only created or reset on the user's first movement of the day.
+    """
+    field = DIRECTIONS[direction]
+    today = _today()
+    trackers = DailyLimitTracker.objects.filter(user_id=user_id)
+    within_cap = {"date": today, f"{field}__lte": Decimal(cap) - amount}
+    if trackers.filter(**within_cap).update(**{field: F(field) + amount}):
+        return True
+
+    _, created = DailyLimitTracker.objects.get_or_create(user_id=user_id, defaults={"date": today})
+    if not created:
+        trackers.exclude(date=today).update(date=today, daily_inflow=0, daily_outflow=0)
+    return bool(trackers.filter(**within_cap).update(**{field: F(field) + amount}))
+
+
+class LimitReservation:
+    """
+    Tracks amounts consumed from Redis while a database transaction is open, so they
+    can be released if that transaction rolls back. With the database backend the
+    consumption is part of the transaction itself and needs no compensation.
+    """
+
+    def __init__(self):
+        self._held = []
+
+    def consume(self, user_id, direction, amount, cap):
+        counted = consume(user_id, direction, amount, cap)
+        if counted and _use_redis():
+            self._held.append((user_id, direction, amount, _today()))
+        return counted
+
+    def release_all(self):
+        while self._held:
+            user_id, direction, amount, day = self._held.pop()
+            release(user_id, direction, amount, day=day)
+
+
+def reconcile(day=None, batch_size=None):
+    """
+    Copies Redis counters for users touched on `day` into DailyLimitTracker.
+    Returns the number of users written. With the Redis backend nothing else counts
+    into the tracker, so the counters are the whole day's total.
+    """
+    from auth_system.redis_client import redis
+
+    day = day or _today()
+    batch_size = batch_size or settings.LIMIT_COUNTERS["RECONCILE_BATCH"]
+    written = 0
+    while True:
+        user_ids = redis.spop(_dirty_key(day), batch_size)
+        if not user_ids:
+            return written
+        user_ids = [int(user_id) for user_id in user_ids]
+        keys = []
+        for user_id in user_ids:
+            keys += [_counter_key(user_id, "inflow", day), _counter_key(user_id, "outflow", day)]
+        values = redis.mget(*keys)
+        existing = {tracker.user_id: tracker for tracker in DailyLimitTracker.objects.filter(user_id__in=user_ids)}
+        trackers = []
+        for i, user_id in enumerate(user_ids):
+            row = existing.get(user_id)
+            if row and row.date > day:
+                continue
+            same_day = row is not None and row.date == day
+            inflow, outflow = values[i * 2], values[i * 2 + 1]
+            trackers.append(DailyLimitTracker(
+                user_id=user_id,
+                date=day,
+                daily_inflow=_from_kobo(inflow) if inflow is not None else (row.daily_inflow if same_day else 0),
+                daily_outflow=_from_kobo(outflow) if outflow is not None else (row.daily_outflow if same_day else 0),
+            ))
+        DailyLimitTracker.objects.bulk_create(
+            trackers,
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=["date", "daily_inflow", "daily_outflow"],
+        )
+        written += len(trackers)
@@ -0,0 +1,52 @@
+import json
+from django.core.management.base import BaseCommand
+from utilities.benchmark import FlowRunner
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests a running API through the register, fund, transfer and history flows "
+        "and reports p50/p95/p99 latency and throughput per endpoint. Run it against a "
+        "server whose MONNIFY_BASE_URL points at `manage.py fake_monnify`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000/api/")
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--concurrency", type=int, default=10)
+        parser.add_argument("--transfers", type=int, default=3, help="Transfers sent by each user.")
+        parser.add_argument("--fund-amount", type=int, default=5000)
+        parser.add_argument("--transfer-amount", type=int, default=100)
+        parser.add_argument("--external-ratio", type=float, default=0.2,
+                            help="Fraction of transfers sent to another bank.")
+        parser.add_argument("--settle-timeout", type=float, default=30,
+                            help="Seconds to wait for a funding webhook to credit the wallet.")
+        parser.add_argument("--json", dest="json_path", help="Also write the report to this file.")
+
+    def handle(self, *args, **options):
+        runner = FlowRunner(
+            options["base_url"],
+            users=options["users"],
+            concurrency=options["concurrency"],
+            transfers=options["transfers"],
+            fund_amount=options["fund_amount"],
+            transfer_amount=options["transfer_amount"],
+            external_ratio=options["external_ratio"],
+            settle_timeout=options["settle_timeout"],
+        )
+        report = runner.run()
+
+        self.stdout.write(
+            f"{'endpoint':<24}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}"
+            f"{'p99 ms':>10}{'max ms':>10}{'req/s':>8}"
+        )
+        for row in report["endpoints"]:
+            self.stdout.write(
+                f"{row['endpoint']:<24}{row['count']:>7}{row['errors']:>8}{row['p50_ms']:>10}"
+                f"{row['p95_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}{row['rps']:>8}"
+            )
+        self.stdout.write(f"Finished in {report['elapsed_s']}s")
+
+        if options["json_path"]:
+            with open(options["json_path"], "w") as f:
+                json.dump(report, f, indent=2)
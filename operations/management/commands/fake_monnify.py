@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from utilities.fake_monnify import FakeMonnify, make_server
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs a local stand-in for the Monnify API for load tests. "
+        "Point MONNIFY_BASE_URL at it, e.g. http://127.0.0.1:8900/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8900)
+        parser.add_argument("--latency", type=float, default=50, help="Mean latency per call, in ms.")
+        parser.add_argument("--jitter", type=float, default=20, help="Standard deviation of the latency, in ms.")
+        parser.add_argument("--failure-rate", type=float, default=0.0,
+                            help="Fraction of calls answered with a 503.")
+        parser.add_argument("--disbursement-failure-rate", type=float, default=0.0,
+                            help="Fraction of disbursements that settle as FAILED.")
+        parser.add_argument("--webhook-url", default="http://127.0.0.1:8000/api/",
+                            help="API root the funding and disbursement webhooks are posted under.")
+        parser.add_argument("--webhook-delay", type=float, default=0.5,
+                            help="Seconds between a payment or disbursement and its webhook.")
+        parser.add_argument("--no-webhooks", action="store_true")
+        parser.add_argument("--require-otp", action="store_true",
+                            help="Hold disbursements in PENDING_AUTHORIZATION until their OTP is validated.")
+        parser.add_argument("--seed", type=int, help="Seed for reproducible latency and failures.")
+
+    def handle(self, *args, **options):
+        monnify = FakeMonnify(
+            latency=options["latency"] / 1000,
+            jitter=options["jitter"] / 1000,
+            failure_rate=options["failure_rate"],
+            disbursement_failure_rate=options["disbursement_failure_rate"],
+            webhook_url=None if options["no_webhooks"] else options["webhook_url"],
+            webhook_delay=options["webhook_delay"],
+            require_otp=options["require_otp"],
+            seed=options["seed"],
+        )
+        server = make_server(monnify, options["host"], options["port"])
+        self.stdout.write(f"Fake Monnify listening on http://{options['host']}:{options['port']}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            monnify.close()
+            for path, count in sorted(monnify.calls.items()):
+                self.stdout.write(f"{count:>8} {path}")
@@ -0,0 +1,32 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from operations.uploads import process_pending, purge_orphans
+
+
+class Command(BaseCommand):
+    help = "Pushes spooled KYC documents and avatars to Cloudinary and writes their URLs back."
+
+    def add_arguments(self, parser):
+        config = settings.UPLOAD_SPOOL
+        parser.add_argument("--concurrency", type=int, default=config["CONCURRENCY"],
+                            help="Files uploaded at once.")
+        parser.add_argument("--batch-size", type=int, default=config["BATCH_SIZE"])
+        parser.add_argument("--interval", type=float, default=config["POLL_INTERVAL"],
+                            help="Seconds to wait when nothing is due.")
+        parser.add_argument("--once", action="store_true", help="Upload due files and exit.")
+
+    def handle(self, *args, **options):
+        purged = purge_orphans()
+        if purged:
+            self.stdout.write(f"Removed {purged} orphaned spool file(s).")
+        with ThreadPoolExecutor(max_workers=options["concurrency"], thread_name_prefix="uploads") as pool:
+            while True:
+                uploaded = process_pending(limit=options["batch_size"], pool=pool)
+                if uploaded:
+                    self.stdout.write(f"Processed {uploaded} upload(s).")
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
@@ -0,0 +1,28 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from operations.webhooks import process_pending
+
+
+class Command(BaseCommand):
+    help = "Applies stored Monnify webhook events to transactions and wallets."
+
+    def add_arguments(self, parser):
+        config = settings.WEBHOOK_INBOX
+        parser.add_argument("--concurrency", type=int, default=config["CONCURRENCY"])
+        parser.add_argument("--batch-size", type=int, default=config["BATCH_SIZE"])
+        parser.add_argument("--interval", type=float, default=config["POLL_INTERVAL"],
+                            help="Seconds to wait when the inbox is empty.")
+        parser.add_argument("--once", action="store_true", help="Drain pending events and exit.")
+
+    def handle(self, *args, **options):
+        with ThreadPoolExecutor(max_workers=options["concurrency"], thread_name_prefix="webhooks") as pool:
+            while True:
+                processed = process_pending(limit=options["batch_size"], pool=pool)
+                if processed:
+                    self.stdout.write(f"Processed {processed} webhook event(s).")
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from operations.ledger import rebuild_balances
+
+
+class Command(BaseCommand):
+    help = "Recomputes wallet balances from the ledger and reports any that had drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true", help="Report drift without changing balances.")
+
+    def handle(self, *args, **options):
+        drifted = rebuild_balances(batch_size=options["batch_size"], dry_run=options["dry_run"])
+        for wallet_id, stored, ledger in drifted:
+            self.stdout.write(f"Wallet {wallet_id}: stored {stored}, ledger {ledger}")
+        verb = "would be corrected" if options["dry_run"] else "corrected"
+        self.stdout.write(self.style.SUCCESS(f"{len(drifted)} wallet balance(s) {verb}."))
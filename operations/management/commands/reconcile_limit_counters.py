@@ -0,0 +1,16 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from operations.limits import reconcile
+
+
+class Command(BaseCommand):
+    help = "Copies the Redis daily inflow/outflow counters into DailyLimitTracker."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", type=date.fromisoformat, default=None,
+                            help="Day to reconcile (YYYY-MM-DD). Defaults to today.")
+        parser.add_argument("--batch-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        written = reconcile(day=options["date"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {written} user(s)."))
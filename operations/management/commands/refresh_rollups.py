@@ -0,0 +1,31 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from operations.rollups import rebuild_day, snapshot_tiers
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes today's tier distribution for the admin dashboard. With --rebuild, also "
+        "recomputes daily volume rollups from the transactions, for backfills and repairs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true",
+                            help="Recompute volume rollups for the days ending at --date.")
+        parser.add_argument("--date", type=date.fromisoformat, default=None,
+                            help="Last day to rebuild (YYYY-MM-DD). Defaults to yesterday.")
+        parser.add_argument("--days", type=int, default=1,
+                            help="Number of days ending at --date to rebuild, oldest first.")
+
+    def handle(self, *args, **options):
+        tiers = snapshot_tiers()
+        self.stdout.write(self.style.SUCCESS(f"Wrote the distribution of {tiers} tier(s)."))
+        if not options["rebuild"]:
+            return
+
+        last = options["date"] or timezone.now().date() - timedelta(days=1)
+        for offset in range(options["days"] - 1, -1, -1):
+            day = last - timedelta(days=offset)
+            written = rebuild_day(day)
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} volume rollup row(s) for {day}."))
@@ -0,0 +1,30 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from operations.outbox import dispatch_pending
+from operations.payouts import dispatch_pending_batches
+
+
+class Command(BaseCommand):
+    help = "Dispatches queued external transfers and payout batches to Monnify."
+
+    def add_arguments(self, parser):
+        config = settings.TRANSFER_OUTBOX
+        parser.add_argument("--concurrency", type=int, default=config["CONCURRENCY"])
+        parser.add_argument("--batch-size", type=int, default=config["BATCH_SIZE"])
+        parser.add_argument("--interval", type=float, default=config["POLL_INTERVAL"],
+                            help="Seconds to wait when the outbox is empty.")
+        parser.add_argument("--once", action="store_true", help="Drain due entries and exit.")
+
+    def handle(self, *args, **options):
+        with ThreadPoolExecutor(max_workers=options["concurrency"], thread_name_prefix="outbox") as pool:
+            while True:
+                dispatched = dispatch_pending(limit=options["batch_size"], pool=pool)
+                batches = dispatch_pending_batches(limit=options["batch_size"], pool=pool)
+                if dispatched or batches:
+                    self.stdout.write(f"Dispatched {dispatched} transfer(s) and {batches} payout batch(es).")
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
@@ -0,0 +1,22 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from operations.snapshots import snapshot_balances
+
+
+class Command(BaseCommand):
+    help = "Writes each wallet's closing balance for a day from the ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", type=date.fromisoformat, default=None,
+                            help="Day to snapshot (YYYY-MM-DD). Defaults to yesterday.")
+        parser.add_argument("--days", type=int, default=1,
+                            help="Number of days ending at --date to snapshot, oldest first, for backfills.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        last = options["date"] or timezone.now().date() - timedelta(days=1)
+        for offset in range(options["days"] - 1, -1, -1):
+            day = last - timedelta(days=offset)
+            written = snapshot_balances(day, batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"Snapshotted {written} wallet(s) for {day}."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+from utilities.bank_directory import bank_directory
+
+
+class Command(BaseCommand):
+    help = "Fetches the Monnify bank list and stores it in the shared bank directory cache."
+
+    def handle(self, *args, **options):
+        try:
+            banks = bank_directory.refresh()
+        except Exception as e:
+            raise CommandError(f"Could not warm bank directory: {e}")
+        self.stdout.write(self.style.SUCCESS(f"Cached {len(banks)} banks."))
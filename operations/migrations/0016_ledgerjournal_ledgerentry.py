@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:19
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_system', '0012_user_bvn_user_nickname'),
+        ('operations', '0015_payoutbatch_payoutitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerJournal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.CharField(max_length=100)),
+                ('kind', models.CharField(choices=[('opening', 'Opening Balance'), ('transfer', 'Internal Transfer'), ('funding', 'Wallet Funding'), ('external_debit', 'External Transfer Debit'), ('external_settled', 'External Transfer Settled'), ('external_refund', 'External Transfer Refund'), ('payout_batch', 'Payout Batch')], max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('reference', 'kind'), name='ledger_journal_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(choices=[('wallet', 'Wallet'), ('funding', 'Funding'), ('transit', 'Transit'), ('payout', 'Payout'), ('opening', 'Opening')], default='wallet', max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('wallet', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='auth_system.wallet')),
+                ('journal', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='operations.ledgerjournal')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['wallet', 'created_at'], name='ledger_wallet_created_idx')],
+            },
+        ),
+    ]
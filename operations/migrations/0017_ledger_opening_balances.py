@@ -0,0 +1,51 @@
+from decimal import Decimal
+from django.db import migrations
+from django.db.models import Sum
+
+
+def post_opening_balances(apps, schema_editor):
+    """
+    Seeds the ledger with one opening journal: every wallet's current balance, plus
+    external transfers already debited but not yet settled, against the opening account.
+    """
+    Wallet = apps.get_model('auth_system', 'Wallet')
+    Transaction = apps.get_model('operations', 'Transaction')
+    LedgerJournal = apps.get_model('operations', 'LedgerJournal')
+    LedgerEntry = apps.get_model('operations', 'LedgerEntry')
+
+    entries = [
+        LedgerEntry(account='wallet', wallet_id=wallet_id, amount=balance)
+        for wallet_id, balance in Wallet.objects.exclude(balance=0).values_list('pk', 'balance').iterator()
+    ]
+    in_transit = Transaction.objects.filter(
+        transaction_type='Debit', transfer_type='external', status='pending'
+    ).aggregate(total=Sum('amount'))['total']
+    if in_transit:
+        entries.append(LedgerEntry(account='transit', amount=in_transit))
+    if not entries:
+        return
+
+    journal = LedgerJournal.objects.create(reference='opening', kind='opening')
+    entries.append(LedgerEntry(account='opening', amount=-sum((entry.amount for entry in entries), Decimal('0.00'))))
+    for entry in entries:
+        entry.journal = journal
+        entry.created_at = journal.created_at
+    LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+def remove_opening_balances(apps, schema_editor):
+    LedgerJournal = apps.get_model('operations', 'LedgerJournal')
+    LedgerEntry = apps.get_model('operations', 'LedgerEntry')
+    LedgerEntry.objects.filter(journal__kind='opening').delete()
+    LedgerJournal.objects.filter(kind='opening').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0016_ledgerjournal_ledgerentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(post_opening_balances, remove_opening_balances),
+    ]
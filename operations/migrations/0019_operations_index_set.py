@@ -0,0 +1,67 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0018_walletbalancesnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='payoutbatch',
+            name='payout_status_next_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transferoutbox',
+            name='outbox_status_next_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='webhookevent',
+            name='webhook_status_id_idx',
+        ),
+        migrations.AddIndex(
+            model_name='payoutbatch',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['next_attempt_at'], name='payout_pending_next_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payoutbatch',
+            index=models.Index(condition=models.Q(('status', 'dispatching')), fields=['updated_at'], name='payout_dispatching_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tierupgraderequest',
+            index=models.Index(fields=['user', 'status'], name='tier_req_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tierupgraderequest',
+            index=models.Index(fields=['bvn'], name='tier_req_bvn_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'transaction_type', '-created_at', '-id'], name='txn_user_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['created_at'], name='txn_pending_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transferoutbox',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['next_attempt_at'], name='outbox_pending_next_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transferoutbox',
+            index=models.Index(condition=models.Q(('status', 'dispatching')), fields=['updated_at'], name='outbox_dispatching_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='webhookevent',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['id'], name='webhook_pending_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='webhookevent',
+            index=models.Index(condition=models.Q(('status', 'processing')), fields=['claimed_at'], name='webhook_processing_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0019_operations_index_set'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target', models.CharField(choices=[('user', 'User'), ('tier_upgrade', 'Tier Upgrade Request')], max_length=20)),
+                ('target_id', models.PositiveBigIntegerField()),
+                ('field', models.CharField(max_length=50)),
+                ('folder', models.CharField(max_length=100)),
+                ('path', models.CharField(max_length=500)),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.PositiveBigIntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('uploading', 'Uploading'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('url', models.URLField(blank=True, max_length=1000, null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['next_attempt_at'], name='upload_pending_next_idx'), models.Index(condition=models.Q(('status', 'uploading')), fields=['updated_at'], name='upload_uploading_idx'), models.Index(fields=['target', 'target_id'], name='upload_target_idx')],
+            },
+        ),
+    ]
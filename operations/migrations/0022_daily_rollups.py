@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0021_admin_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTierRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('tier', models.CharField(max_length=10)),
+                ('wallets', models.PositiveIntegerField(default=0)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('created_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'tier'), name='tier_rollup_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyVolumeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('transaction_type', models.CharField(choices=[('Deposit', 'Deposit'), ('Debit', 'Debit'), ('Credit', 'Credit')], max_length=10)),
+                ('transfer_type', models.CharField(max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('success', 'Success'), ('failed', 'Failed')], max_length=10)),
+                ('shard', models.PositiveSmallIntegerField(default=0)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('fees', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'daily volumes',
+                'constraints': [models.UniqueConstraint(fields=('date', 'transaction_type', 'transfer_type', 'status', 'shard'), name='volume_rollup_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0022_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payoutbatch',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('dispatching', 'Dispatching'), ('awaiting_otp', 'Awaiting OTP'), ('sent', 'Sent'), ('completed', 'Completed'), ('partially_failed', 'Partially Failed'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+    ]
@@ -1,5 +1,5 @@
 from django.db import models
-from auth_system.models import User
+from auth_system.models import User, Wallet
 from django.conf import settings
 from django.utils import timezone
 
@@ -49,6 +49,19 @@ class Transaction(models.Model):
     transaction_reference = models.CharField(max_length=100, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Backs keyset pagination of a user's history on (created_at, id)
+            models.Index(fields=['user', '-created_at', '-id'], name='txn_user_created_id_idx'),
+            # History filtered by type keeps the same keyset order
+            models.Index(fields=['user', 'transaction_type', '-created_at', '-id'], name='txn_user_type_created_idx'),
+            # Only pending rows are swept for stuck transfers, and they are a small slice of the table
+            models.Index(fields=['created_at'], name='txn_pending_created_idx', condition=models.Q(status='pending')),
+            # Admin changelist: newest first, optionally narrowed by status
+            models.Index(fields=['-created_at', '-id'], name='txn_created_id_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='txn_status_created_idx'),
+        ]
+
 
 
 class TierUpgradeRequest(models.Model):
@@ -63,6 +76,14 @@ class TierUpgradeRequest(models.Model):
     id_document = models.URLField(max_length=1000, null=True, blank=True)
     utility_bill = models.URLField(max_length=1000, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'status'], name='tier_req_user_status_idx'),
+            models.Index(fields=['bvn'], name='tier_req_bvn_idx'),
+            # Review queue: requests in a status, newest first
+            models.Index(fields=['status', '-submitted_at'], name='tier_req_status_submitted_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.email} - {self.current_tier} ➜ {self.requested_tier} ({self.status})"
 
@@ -79,3 +100,276 @@ class DailyLimitTracker(models.Model):
             self.daily_outflow = 0
             self.date = timezone.now().date()
             self.save()
+
+
+class TransferOutbox(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('dispatching', 'Dispatching'),
+        ('awaiting_otp', 'Awaiting OTP'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, related_name='outbox')
+    bank_code = models.CharField(max_length=10)
+    bank_name = models.CharField(max_length=255)
+    destination_account_number = models.CharField(max_length=15)
+    narration = models.TextField(blank=True, null=True)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    monnify_status = models.CharField(max_length=50, blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Workers only look at due and stale entries, so finished ones stay out of the indexes
+            models.Index(fields=['next_attempt_at'], name='outbox_pending_next_idx', condition=models.Q(status='pending')),
+            models.Index(fields=['updated_at'], name='outbox_dispatching_idx', condition=models.Q(status='dispatching')),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction.transaction_reference} ({self.status})"
+
+
+class WebhookEvent(models.Model):
+    SOURCE_CHOICES = [
+        ('funding', 'Funding'),
+        ('disbursement', 'Disbursement'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('processed', 'Processed'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    ]
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    event_type = models.CharField(max_length=50)
+    reference = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    result = models.CharField(max_length=255, blank=True, null=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Monnify redelivers the same event until it is acked; keep only the first copy
+            models.UniqueConstraint(fields=['source', 'reference', 'event_type'], name='webhook_event_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['id'], name='webhook_pending_id_idx', condition=models.Q(status='pending')),
+            models.Index(fields=['claimed_at'], name='webhook_processing_idx', condition=models.Q(status='processing')),
+        ]
+
+    def __str__(self):
+        return f"{self.source} {self.event_type} {self.reference} ({self.status})"
+
+
+class PayoutBatch(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('dispatching', 'Dispatching'),
+        ('awaiting_otp', 'Awaiting OTP'),
+        ('sent', 'Sent'),
+        ('completed', 'Completed'),
+        ('partially_failed', 'Partially Failed'),
+        ('failed', 'Failed'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='payout_batches')
+    reference = models.CharField(max_length=100, unique=True)
+    description = models.TextField(blank=True, null=True)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2)
+    item_count = models.PositiveIntegerField()
+    # Dispatch state of the external legs; batches with only internal legs complete at once
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    monnify_status = models.CharField(max_length=50, blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_at'], name='payout_pending_next_idx', condition=models.Q(status='pending')),
+            models.Index(fields=['updated_at'], name='payout_dispatching_idx', condition=models.Q(status='dispatching')),
+        ]
+
+    def __str__(self):
+        return f"{self.reference} ({self.status})"
+
+
+class PayoutItem(models.Model):
+    batch = models.ForeignKey(PayoutBatch, on_delete=models.CASCADE, related_name='items')
+    # The sender's debit for this leg; its status is the item's result
+    transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, related_name='payout_item')
+    bank_code = models.CharField(max_length=10, blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.batch.reference}: {self.transaction.transaction_reference}"
+
+
+class LedgerJournal(models.Model):
+    """One balanced posting. The ledger is append-only: corrections are new journals."""
+    KIND_CHOICES = [
+        ('opening', 'Opening Balance'),
+        ('transfer', 'Internal Transfer'),
+        ('funding', 'Wallet Funding'),
+        ('external_debit', 'External Transfer Debit'),
+        ('external_settled', 'External Transfer Settled'),
+        ('external_refund', 'External Transfer Refund'),
+        ('payout_batch', 'Payout Batch'),
+    ]
+    reference = models.CharField(max_length=100)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            # A movement is posted once, however many times its webhook or retry runs
+            models.UniqueConstraint(fields=['reference', 'kind'], name='ledger_journal_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.reference}"
+
+
+class LedgerEntry(models.Model):
+    """
+    One side of a journal. Wallet entries carry the wallet; the other accounts are
+    system accounts: money received from Monnify (funding), external transfers
+    debited but not yet confirmed (transit), money paid out to other banks (payout)
+    and balances that predate the ledger (opening).
+    """
+    ACCOUNT_CHOICES = [
+        ('wallet', 'Wallet'),
+        ('funding', 'Funding'),
+        ('transit', 'Transit'),
+        ('payout', 'Payout'),
+        ('opening', 'Opening'),
+    ]
+    journal = models.ForeignKey(LedgerJournal, on_delete=models.PROTECT, related_name='entries')
+    account = models.CharField(max_length=10, choices=ACCOUNT_CHOICES, default='wallet')
+    wallet = models.ForeignKey(Wallet, on_delete=models.PROTECT, related_name='ledger_entries', null=True, blank=True)
+    # Positive amounts increase the account, negative amounts decrease it
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Backs balance rebuilds and point-in-time balances per wallet
+            models.Index(fields=['wallet', 'created_at'], name='ledger_wallet_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.account} {self.wallet_id or ''} {self.amount}"
+
+
+class WalletBalanceSnapshot(models.Model):
+    """A wallet's closing balance for a day: every ledger entry before the next midnight."""
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='balance_snapshots')
+    date = models.DateField()
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+    created_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['wallet', 'date'], name='wallet_snapshot_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.wallet_id} {self.date}: {self.balance}"
+
+
+class PendingUpload(models.Model):
+    """
+    A file spooled to local disk during a request, waiting to be pushed to Cloudinary.
+    Once uploaded, its URL is written to `field` of the target row.
+    """
+    TARGET_CHOICES = [
+        ('user', 'User'),
+        ('tier_upgrade', 'Tier Upgrade Request'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('uploading', 'Uploading'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    target = models.CharField(max_length=20, choices=TARGET_CHOICES)
+    target_id = models.PositiveBigIntegerField()
+    field = models.CharField(max_length=50)
+    folder = models.CharField(max_length=100)
+    path = models.CharField(max_length=500)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    url = models.URLField(max_length=1000, blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_at'], name='upload_pending_next_idx', condition=models.Q(status='pending')),
+            models.Index(fields=['updated_at'], name='upload_uploading_idx', condition=models.Q(status='uploading')),
+            models.Index(fields=['target', 'target_id'], name='upload_target_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.target} {self.target_id} {self.field} ({self.status})"
+
+
+class DailyVolumeRollup(models.Model):
+    """
+    Counts and totals of settled transactions per day (of created_at), type, transfer
+    type and final status, added to as transactions reach success or failed. Each key
+    is spread over VOLUME_ROLLUPS["SHARDS"] rows so concurrent transfers rarely wait
+    on the same row; readers sum the shards.
+    """
+    date = models.DateField()
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    transfer_type = models.CharField(max_length=20)
+    status = models.CharField(max_length=10, choices=Transaction.STATUS_CHOICES)
+    shard = models.PositiveSmallIntegerField(default=0)
+    count = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    fees = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            # Leads with date, so dashboard ranges are index range scans
+            models.UniqueConstraint(
+                fields=['date', 'transaction_type', 'transfer_type', 'status', 'shard'], name='volume_rollup_unique'
+            ),
+        ]
+        verbose_name_plural = "daily volumes"
+
+    def __str__(self):
+        return f"{self.date} {self.transaction_type}/{self.transfer_type} {self.status}: {self.count}"
+
+
+class DailyTierRollup(models.Model):
+    """How many wallets were on each tier, and what they held, when the day's rollup last ran."""
+    date = models.DateField()
+    tier = models.CharField(max_length=10)
+    wallets = models.PositiveIntegerField(default=0)
+    balance = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'tier'], name='tier_rollup_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.tier}: {self.wallets}"
@@ -0,0 +1,180 @@
+import logging
+import random
+from datetime import timedelta
+import requests
+from django.conf import settings
+from django.db import close_old_connections, transaction as db_transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from utilities.background import run_in_background
+from utilities.monnify_helper import initiate_transfer, get_transfer_status
+from .models import TransferOutbox
+from .transfers import fail_external_transfer
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_external_transfer(transaction, bank_code, bank_name, destination, narration):
+    """
+    Records an external transfer for dispatch to Monnify. Must be called inside the
+    atomic block that debits the wallet, so the debit and the outbox row commit together.
+    """
+    entry = TransferOutbox.objects.create(
+        transaction=transaction,
+        bank_code=bank_code,
+        bank_name=bank_name,
+        destination_account_number=destination,
+        narration=narration,
+        amount=transaction.amount,
+    )
+    if settings.TRANSFER_OUTBOX["DISPATCH_ON_COMMIT"]:
+        db_transaction.on_commit(lambda: run_in_background(dispatch_pending))
+    return entry
+
+
+def claim_batch(limit):
+    """
+    Marks up to `limit` due entries as dispatching and returns their ids. Rows are
+    claimed with SKIP LOCKED so several workers can drain the outbox at once; entries
+    left dispatching by a crashed worker are picked up again after STALE_AFTER seconds.
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=settings.TRANSFER_OUTBOX["STALE_AFTER"])
+    with db_transaction.atomic():
+        ids = list(
+            TransferOutbox.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status='pending', next_attempt_at__lte=now)
+                | Q(status='dispatching', updated_at__lt=stale_before)
+            )
+            .order_by('next_attempt_at')
+            .values_list('id', flat=True)[:limit]
+        )
+        if ids:
+            TransferOutbox.objects.filter(id__in=ids).update(
+                status='dispatching', attempts=F('attempts') + 1, updated_at=now
+            )
+    return ids
+
+
+def dispatch_pending(limit=None, pool=None):
+    """Claims a batch of due entries and sends them, on `pool` if one is given."""
+    ids = claim_batch(limit or settings.TRANSFER_OUTBOX["BATCH_SIZE"])
+    if pool is not None:
+        list(pool.map(dispatch, ids))
+    else:
+        for entry_id in ids:
+            dispatch(entry_id)
+    return len(ids)
+
+
+def dispatch(entry_id):
+    close_old_connections()
+    entry = None
+    try:
+        entry = TransferOutbox.objects.select_related('transaction').get(pk=entry_id)
+        reference = entry.transaction.transaction_reference
+
+        # A previous attempt may have reached Monnify before failing on our side
+        if entry.attempts > 1 and _already_submitted(entry, reference):
+            return
+
+        try:
+            response = initiate_transfer(
+                amount=entry.amount,
+                reference=reference,
+                bank_name=entry.bank_name,
+                description=entry.narration,
+                destination=entry.destination_account_number,
+                bank_code=entry.bank_code,
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            _retry_or_fail(entry, str(e))
+            return
+
+        _handle_response(entry, response)
+    except Exception as e:
+        logger.exception("Dispatching outbox entry %s failed", entry_id)
+        if entry is not None:
+            _retry_after_error(entry, str(e))
+    finally:
+        close_old_connections()
+
+
+def _already_submitted(entry, reference):
+    try:
+        response = get_transfer_status(reference)
+    except (requests.ConnectionError, requests.Timeout):
+        return False
+    data = response_json(response)
+    if response.status_code != 200 or not data.get("requestSuccessful"):
+        return False
+    body = data.get("responseBody") or {}
+    _mark(entry, _status_for(body.get("status")), monnify_status=body.get("status"))
+    return True
+
+
+def _handle_response(entry, response):
+    data = response_json(response)
+    body = data.get("responseBody") or {}
+    if response.status_code == 200 and data.get("requestSuccessful"):
+        _mark(entry, _status_for(body.get("status")), monnify_status=body.get("status"))
+    elif response.status_code >= 500 or response.status_code == 429:
+        _retry_or_fail(entry, response.text)
+    else:
+        _fail(entry, data.get("responseMessage") or response.text)
+
+
+def response_json(response):
+    try:
+        return response.json()
+    except ValueError:
+        return {}
+
+
+def _status_for(monnify_status):
+    # Once Monnify has accepted the transfer, the final outcome arrives by webhook
+    if monnify_status == "PENDING_AUTHORIZATION":
+        return 'awaiting_otp'
+    return 'sent'
+
+
+def _mark(entry, status, **fields):
+    TransferOutbox.objects.filter(pk=entry.pk).update(
+        status=status, updated_at=timezone.now(), **fields
+    )
+
+
+def backoff_until(attempts):
+    config = settings.TRANSFER_OUTBOX
+    delay = min(config["BACKOFF_MAX"], config["BACKOFF_BASE"] * (2 ** (attempts - 1)))
+    return timezone.now() + timedelta(seconds=delay + random.uniform(0, delay / 2))
+
+
+def _retry_or_fail(entry, error):
+    if entry.attempts >= settings.TRANSFER_OUTBOX["MAX_ATTEMPTS"]:
+        if not _already_submitted(entry, entry.transaction.transaction_reference):
+            _fail(entry, error)
+        return
+    _mark(entry, 'pending', last_error=error, next_attempt_at=backoff_until(entry.attempts))
+
+
+def _retry_after_error(entry, error):
+    """
+    Counts an unexpected error as a failed attempt, so it backs off and is failed
+    once MAX_ATTEMPTS is reached. An entry that already left dispatching was sent or
+    failed before the error and is left alone; if recording the attempt fails too,
+    stale recovery claims the entry again.
+    """
+    if not TransferOutbox.objects.filter(pk=entry.pk, status='dispatching').exists():
+        return
+    try:
+        _retry_or_fail(entry, error)
+    except Exception:
+        logger.exception("Recording the failed dispatch of outbox entry %s failed", entry.pk)
+
+
+def _fail(entry, error):
+    """Marks the transfer failed and returns the debited amount to the sender."""
+    fail_external_transfer(entry.transaction)
+    _mark(entry, 'failed', last_error=error)
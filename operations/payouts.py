@@ -0,0 +1,379 @@
+import logging
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from django.conf import settings
+from django.db import close_old_connections, transaction as db_transaction
+from django.db.models import Case, DecimalField, F, Q, Value, When
+from django.utils import timezone
+from auth_system import read_models
+from auth_system.models import Wallet
+from utilities.background import run_in_background
+from utilities.monnify_helper import get_bank_code, initiate_bulk_transfer, get_bulk_transfer_status
+from . import rollups
+from .ledger import post_journal, system_entry, wallet_entry
+from .limits import LimitReservation
+from .models import PayoutBatch, PayoutItem, Transaction
+from .outbox import backoff_until, response_json
+from .transfers import TransferError, debit_wallet, fail_external_transfer, lock_wallets
+
+logger = logging.getLogger(__name__)
+
+# Beneficiary lookups get their own bounded pool: the request waits on them, and a
+# large batch must not hold the shared background pool that runs on-commit jobs
+resolver = ThreadPoolExecutor(
+    max_workers=settings.PAYOUT_BATCH["RESOLVE_CONCURRENCY"],
+    thread_name_prefix="payout-resolve",
+)
+
+
+class PayoutItemsError(TransferError):
+    """Raised when some legs of a batch are invalid. `errors` maps item position to message."""
+
+    def __init__(self, errors):
+        super().__init__("Some payout items are invalid.")
+        self.errors = errors
+
+
+def resolve_items(sender, items):
+    """
+    Validates every leg in one pass and returns them with recipient details added.
+    Internal recipients come from one query; external banks and account names are
+    resolved concurrently from the bank directory and beneficiary cache, on the
+    dedicated `resolver` pool.
+    """
+    internal_accounts = {item["recipient_account_number"] for item in items if item["transfer_type"] == "internal"}
+    wallets = {
+        wallet.monnify_account_number: wallet
+        for wallet in Wallet.objects.select_related('user').filter(monnify_account_number__in=internal_accounts)
+    }
+    external = [item for item in items if item["transfer_type"] == "external"]
+
+    def lookup(item):
+        try:
+            return get_bank_code(item["bank_name"], item["recipient_account_number"])
+        except Exception:
+            logger.warning("Resolving bank %r for a payout leg failed", item["bank_name"], exc_info=True)
+            return None
+    # A single leg is looked up in the request thread, saving the hop to the pool
+    banks = iter(list(resolver.map(lookup, external)) if len(external) > 1 else [lookup(item) for item in external])
+
+    errors, legs = {}, []
+    for index, item in enumerate(items):
+        leg = dict(item, index=index)
+        if item["transfer_type"] == "internal":
+            wallet = wallets.get(item["recipient_account_number"])
+            if wallet is None:
+                errors[index] = "Recipient account number not found."
+            elif wallet.user_id == sender.id:
+                errors[index] = "Cannot send money to yourself."
+            else:
+                leg["recipient_wallet"] = wallet
+        else:
+            resolved = next(banks)
+            if resolved is None:
+                errors[index] = "Could not verify the recipient account. Please try again."
+            elif not resolved[0]:
+                errors[index] = f"Bank code for '{item['bank_name']}' not found."
+            else:
+                bank_code, bank_title, recipient_name = resolved
+                leg.update(bank_code=bank_code, bank_title=bank_title, recipient_name=recipient_name)
+        legs.append(leg)
+    if errors:
+        raise PayoutItemsError(errors)
+    return legs
+
+
+def create_payout_batch(sender, items, description=""):
+    """
+    Applies a batch of transfers from one sender. Every leg is validated before
+    anything is written; then, in one database transaction, the sender wallet is
+    locked and debited once for the total, internal recipients are credited in one
+    UPDATE, and all Transaction rows and a single ledger journal are written.
+    External legs are sent to Monnify together by dispatch_batch once this commits.
+    """
+    sender_wallet = sender.wallet
+    rules = settings.TIER_RULES.get(sender_wallet.tier.lower())
+    if not rules:
+        raise TransferError(f"No rules defined for tier '{sender_wallet.tier.lower()}'")
+
+    legs = resolve_items(sender, items)
+    total = sum((leg["amount"] for leg in legs), Decimal("0.00"))
+    if sender_wallet.balance < total:
+        raise TransferError("Insufficient funds.")
+
+    # Internal credits per recipient wallet, with the legs that make them up
+    credits, recipients, legs_by_wallet = {}, {}, {}
+    for leg in legs:
+        wallet = leg.get("recipient_wallet")
+        if wallet is not None:
+            credits[wallet.pk] = credits.get(wallet.pk, Decimal("0.00")) + leg["amount"]
+            recipients[wallet.pk] = wallet
+            legs_by_wallet.setdefault(wallet.pk, []).append(leg["index"])
+
+    reservation = LimitReservation()
+    try:
+        with db_transaction.atomic():
+            if not reservation.consume(sender.id, "outflow", total, rules["daily_outflow"]):
+                raise TransferError("Daily outflow limit exceeded.")
+
+            recipient_rules = {}
+            for wallet_id, amount in credits.items():
+                wallet = recipients[wallet_id]
+                recipient_rules[wallet_id] = settings.TIER_RULES.get(wallet.tier.lower())
+                if not recipient_rules[wallet_id]:
+                    raise TransferError(f"No rules defined for tier '{wallet.tier.lower()}'")
+                if not reservation.consume(wallet.user_id, "inflow", amount, recipient_rules[wallet_id]["daily_inflow"]):
+                    raise PayoutItemsError(dict.fromkeys(legs_by_wallet[wallet_id], "recipient's daily Inflow limit exceeded."))
+
+            locked = lock_wallets(sender_wallet.pk, *credits)
+            debit_wallet(sender_wallet.pk, total)
+            if credits:
+                # The wallets are locked, so the balance caps can be checked here and
+                # every recipient credited in a single statement
+                for wallet_id, amount in credits.items():
+                    if locked[wallet_id].balance + amount > Decimal(recipient_rules[wallet_id]["max_balance"]):
+                        raise PayoutItemsError(dict.fromkeys(legs_by_wallet[wallet_id], "Recipient's wallet balance limit exceeded."))
+                Wallet.objects.filter(pk__in=credits).update(balance=F('balance') + Case(
+                    *[When(pk=wallet_id, then=Value(amount)) for wallet_id, amount in credits.items()],
+                    output_field=DecimalField(max_digits=12, decimal_places=2),
+                ))
+
+            has_external = any(leg["transfer_type"] == "external" for leg in legs)
+            batch = PayoutBatch.objects.create(
+                user=sender,
+                reference=f"{sender.id}_b{uuid.uuid4().hex[:10]}",
+                description=description,
+                total_amount=total,
+                item_count=len(legs),
+                status='pending' if has_external else 'completed',
+            )
+            debits, rows = _build_transactions(sender, sender_wallet, batch, legs)
+            Transaction.objects.bulk_create(rows)
+            in_transit = sum((leg["amount"] for leg in legs if leg["transfer_type"] == "external"), Decimal("0.00"))
+            post_journal(batch.reference, 'payout_batch', [
+                wallet_entry(sender_wallet.pk, -total),
+                *[wallet_entry(wallet_id, amount) for wallet_id, amount in credits.items()],
+                *([system_entry('transit', in_transit)] if in_transit else []),
+            ])
+            # External legs are still pending and are added when Monnify settles them
+            rollups.record(rows)
+            read_models.invalidate(sender.id, *(wallet.user_id for wallet in recipients.values()))
+            PayoutItem.objects.bulk_create([
+                PayoutItem(batch=batch, transaction=debit, bank_code=leg.get("bank_code"))
+                for leg, debit in zip(legs, debits)
+            ])
+
+            if has_external and settings.TRANSFER_OUTBOX["DISPATCH_ON_COMMIT"]:
+                db_transaction.on_commit(lambda: run_in_background(dispatch_pending_batches))
+    except Exception:
+        reservation.release_all()
+        raise
+    return batch
+
+
+def _build_transactions(sender, sender_wallet, batch, legs):
+    """Returns the sender's debit for each leg, and every row to insert."""
+    sender_name = f"{sender.firstname} {sender.lastname}"
+    debits, rows = [], []
+    for leg in legs:
+        reference = f"{batch.reference}_{leg['index']}"
+        description = leg.get("description") or batch.description
+        wallet = leg.get("recipient_wallet")
+        if wallet is not None:
+            recipient_name = f"{wallet.user.firstname} {wallet.user.lastname}"
+            debit = Transaction(
+                user=sender, sender_name=sender_name, recipient_name=recipient_name,
+                transfer_type='internal', amount=leg["amount"], status='success',
+                destination_account_number=leg["recipient_account_number"],
+                bank_name="Monniepoint", description=description,
+                transaction_reference=reference + "_debit", transaction_type="Debit"
+            )
+            rows += [debit, Transaction(
+                user=wallet.user, sender_name=sender_name, recipient_name=recipient_name,
+                transfer_type='internal', amount=leg["amount"], status='success',
+                bank_name="Monniepoint", description=description,
+                transaction_reference=reference + "_credit", transaction_type="Credit"
+            )]
+        else:
+            debit = Transaction(
+                user=sender, sender_name=sender_name,
+                recipient_name=leg["recipient_name"].title() if leg["recipient_name"] else leg["bank_title"],
+                transfer_type='external', amount=leg["amount"], status='pending',
+                source_account_number=sender_wallet.monnify_account_number,
+                destination_account_number=leg["recipient_account_number"],
+                bank_name=leg["bank_title"], description=description,
+                transaction_reference=reference
+            )
+            rows.append(debit)
+        debits.append(debit)
+    return debits, rows
+
+
+def claim_batches(limit):
+    """Same claiming rules as the transfer outbox, for batches with external legs."""
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=settings.TRANSFER_OUTBOX["STALE_AFTER"])
+    with db_transaction.atomic():
+        ids = list(
+            PayoutBatch.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status='pending', next_attempt_at__lte=now)
+                | Q(status='dispatching', updated_at__lt=stale_before)
+            )
+            .order_by('next_attempt_at')
+            .values_list('id', flat=True)[:limit]
+        )
+        if ids:
+            PayoutBatch.objects.filter(id__in=ids).update(
+                status='dispatching', attempts=F('attempts') + 1, updated_at=now
+            )
+    return ids
+
+
+def dispatch_pending_batches(limit=None, pool=None):
+    """Claims due payout batches and submits them, on `pool` if one is given."""
+    ids = claim_batches(limit or settings.TRANSFER_OUTBOX["BATCH_SIZE"])
+    if pool is not None:
+        list(pool.map(dispatch_batch, ids))
+    else:
+        for batch_id in ids:
+            dispatch_batch(batch_id)
+    return len(ids)
+
+
+def dispatch_batch(batch_id):
+    close_old_connections()
+    batch = None
+    try:
+        batch = PayoutBatch.objects.get(pk=batch_id)
+
+        # A previous attempt may have reached Monnify before failing on our side
+        if batch.attempts > 1 and _already_submitted(batch):
+            return
+
+        items = _external_items(batch)
+        transfers = [
+            {
+                "amount": item.transaction.amount,
+                "reference": item.transaction.transaction_reference,
+                "narration": item.transaction.description or "Payout",
+                "bank_code": item.bank_code,
+                "destination": item.transaction.destination_account_number,
+            }
+            for item in items
+        ]
+        try:
+            response = initiate_bulk_transfer(
+                reference=batch.reference,
+                title=f"Payout {batch.reference}",
+                narration=batch.description or "Payout",
+                transfers=transfers,
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            _retry_or_fail(batch, items, str(e))
+            return
+
+        data = response_json(response)
+        body = data.get("responseBody") or {}
+        if response.status_code == 200 and data.get("requestSuccessful"):
+            _mark(batch, _status_for(body.get("batchStatus")), monnify_status=body.get("batchStatus"))
+            settle_batch(batch.pk)
+        elif response.status_code >= 500 or response.status_code == 429:
+            _retry_or_fail(batch, items, response.text)
+        else:
+            _fail(batch, items, data.get("responseMessage") or response.text)
+    except Exception as e:
+        logger.exception("Dispatching payout batch %s failed", batch_id)
+        if batch is not None:
+            _retry_after_error(batch, str(e))
+    finally:
+        close_old_connections()
+
+
+def _external_items(batch):
+    return list(
+        PayoutItem.objects.filter(batch=batch, transaction__transfer_type='external').select_related('transaction')
+    )
+
+
+def _already_submitted(batch):
+    try:
+        response = get_bulk_transfer_status(batch.reference)
+    except (requests.ConnectionError, requests.Timeout):
+        return False
+    data = response_json(response)
+    if response.status_code != 200 or not data.get("requestSuccessful"):
+        return False
+    body = data.get("responseBody") or {}
+    _mark(batch, _status_for(body.get("batchStatus")), monnify_status=body.get("batchStatus"))
+    settle_batch(batch.pk)
+    return True
+
+
+def _status_for(monnify_status):
+    # Per-leg outcomes arrive as disbursement webhooks for each leg's reference
+    if monnify_status == "PENDING_AUTHORIZATION":
+        return 'awaiting_otp'
+    return 'sent'
+
+
+def leg_settled(transaction):
+    """Called once an external transfer has succeeded or failed, in case it was a payout leg."""
+    batch_id = PayoutItem.objects.filter(transaction=transaction).values_list('batch_id', flat=True).first()
+    if batch_id is not None:
+        settle_batch(batch_id)
+
+
+def settle_batch(batch_id):
+    """
+    Moves a submitted batch to completed, partially_failed or failed once none of
+    its external legs is still pending. Each leg runs this after its own outcome
+    commits, so whichever leg settles last sees every outcome.
+    """
+    statuses = set(
+        Transaction.objects.filter(payout_item__batch_id=batch_id, transfer_type='external')
+        .values_list('status', flat=True)
+    )
+    if not statuses or 'pending' in statuses:
+        return
+    if statuses == {'success'}:
+        status = 'completed'
+    elif 'success' in statuses:
+        status = 'partially_failed'
+    else:
+        status = 'failed'
+    PayoutBatch.objects.filter(pk=batch_id, status__in=['awaiting_otp', 'sent']).update(
+        status=status, updated_at=timezone.now()
+    )
+
+
+def _mark(batch, status, **fields):
+    PayoutBatch.objects.filter(pk=batch.pk).update(status=status, updated_at=timezone.now(), **fields)
+
+
+def _retry_or_fail(batch, items, error):
+    if batch.attempts >= settings.TRANSFER_OUTBOX["MAX_ATTEMPTS"]:
+        if not _already_submitted(batch):
+            _fail(batch, items, error)
+        return
+    _mark(batch, 'pending', last_error=error, next_attempt_at=backoff_until(batch.attempts))
+
+
+def _retry_after_error(batch, error):
+    """The outbox's _retry_after_error for a whole batch."""
+    if not PayoutBatch.objects.filter(pk=batch.pk, status='dispatching').exists():
+        return
+    try:
+        _retry_or_fail(batch, _external_items(batch), error)
+    except Exception:
+        logger.exception("Recording the failed dispatch of payout batch %s failed", batch.pk)
+
+
+def _fail(batch, items, error):
+    """Fails every external leg, refunding the sender and giving back its outflow."""
+    for item in items:
+        fail_external_transfer(item.transaction)
+    _mark(batch, 'failed', last_error=error)
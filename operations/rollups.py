@@ -0,0 +1,133 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import connection, transaction as db_transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from auth_system.models import Wallet
+from .models import DailyTierRollup, DailyVolumeRollup, Transaction
+from .snapshots import day_end
+
+FINAL_STATUSES = ('success', 'failed')
+
+KEY_FIELDS = ('date', 'transaction_type', 'transfer_type', 'status', 'shard')
+TOTAL_FIELDS = ('count', 'amount', 'fees')
+
+
+def _key(transaction):
+    return (transaction.created_at.date(), transaction.transaction_type, transaction.transfer_type, transaction.status)
+
+
+def record(transactions):
+    """
+    Adds transactions that have reached a final status to their day's rollup, in a
+    single INSERT ... ON CONFLICT DO UPDATE that increments the totals. Call it in
+    the database transaction that settles them, after the wallets are locked, so the
+    rollup commits or rolls back with the balances.
+    """
+    totals = {}
+    for transaction in transactions:
+        if transaction.status not in FINAL_STATUSES:
+            continue
+        count, amount, fees = totals.get(_key(transaction), (0, Decimal("0.00"), Decimal("0.00")))
+        totals[_key(transaction)] = (
+            count + 1, amount + Decimal(transaction.amount), fees + Decimal(transaction.fee or 0)
+        )
+    if not totals:
+        return
+
+    shard = random.randrange(settings.VOLUME_ROLLUPS["SHARDS"])
+    quote = connection.ops.quote_name
+    table = quote(DailyVolumeRollup._meta.db_table)
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s)"] * len(totals))
+    params = []
+    # Rows go in key order, so two settlements touching the same rows lock them in the same order
+    for key, values in sorted(totals.items()):
+        params.extend([*key, shard, *values])
+    increments = ", ".join(f"{quote(field)} = {table}.{quote(field)} + EXCLUDED.{quote(field)}" for field in TOTAL_FIELDS)
+    sql = (
+        f"INSERT INTO {table} ({', '.join(quote(field) for field in KEY_FIELDS + TOTAL_FIELDS)}) "
+        f"VALUES {placeholders} "
+        f"ON CONFLICT ({', '.join(quote(field) for field in KEY_FIELDS)}) DO UPDATE SET {increments}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def rebuild_day(day):
+    """
+    Recomputes a day's volume rollup from its transactions, for backfills and repairs.
+    Meant for days that are over; settlements of that day's pending transactions
+    still add to the rebuilt rows afterwards. Returns the number of rows written.
+    """
+    start = day_end(day - timedelta(days=1))
+    groups = (
+        Transaction.objects.filter(created_at__gte=start, created_at__lt=day_end(day), status__in=FINAL_STATUSES)
+        .values('transaction_type', 'transfer_type', 'status')
+        .annotate(count=Count('id'), amount=Sum('amount'), fees=Sum('fee'))
+        .order_by()
+    )
+    rows = [DailyVolumeRollup(date=day, shard=0, **group) for group in groups]
+    with db_transaction.atomic():
+        DailyVolumeRollup.objects.filter(date=day).delete()
+        DailyVolumeRollup.objects.bulk_create(rows)
+    return len(rows)
+
+
+def snapshot_tiers(day=None):
+    """Writes the current number of wallets and their balance per tier under `day` (today by default)."""
+    day = day or timezone.now().date()
+    rows = [
+        DailyTierRollup(date=day, tier=group['tier'].lower(), wallets=group['wallets'], balance=group['balance'] or 0)
+        for group in Wallet.objects.values('tier').annotate(wallets=Count('id'), balance=Sum('balance')).order_by()
+    ]
+    DailyTierRollup.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['date', 'tier'], update_fields=['wallets', 'balance', 'created_at'],
+    )
+    DailyTierRollup.objects.filter(date=day).exclude(tier__in=[row.tier for row in rows]).delete()
+    return len(rows)
+
+
+def daily_volumes(days):
+    """
+    One row per day for the last `days` days, newest first, read only from the rollups:
+    money in (deposits), money out (external transfers), internal volume, fee revenue
+    and transaction counts per final status.
+    """
+    since = timezone.now().date() - timedelta(days=days - 1)
+    groups = (
+        DailyVolumeRollup.objects.filter(date__gte=since)
+        .values('date', 'transaction_type', 'transfer_type', 'status')
+        .annotate(count=Sum('count'), amount=Sum('amount'), fees=Sum('fees'))
+        .order_by()
+    )
+    zero = Decimal("0.00")
+    by_day = {
+        since + timedelta(days=offset): {
+            "inflow": zero, "outflow": zero, "internal": zero, "fees": zero, "success": 0, "failed": 0,
+        }
+        for offset in range(days)
+    }
+    for group in groups:
+        row = by_day[group['date']]
+        row[group['status']] += group['count']
+        if group['status'] != 'success':
+            continue
+        if group['transaction_type'] == 'Deposit':
+            row["inflow"] += group['amount']
+        elif group['transaction_type'] == 'Debit' and group['transfer_type'] == 'external':
+            row["outflow"] += group['amount']
+            row["fees"] += group['fees']
+        elif group['transaction_type'] == 'Debit':
+            # Each internal transfer is a Debit and a Credit row; the Debit alone is its volume
+            row["internal"] += group['amount']
+    return [{"date": day, **row} for day, row in sorted(by_day.items(), reverse=True)]
+
+
+def tier_distribution():
+    """Wallets per tier from the latest tier rollup, with the date it was taken."""
+    latest = DailyTierRollup.objects.order_by('-date').values_list('date', flat=True).first()
+    if latest is None:
+        return None, []
+    return latest, list(DailyTierRollup.objects.filter(date=latest).order_by('tier').values('tier', 'wallets', 'balance'))
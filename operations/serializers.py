@@ -1,9 +1,11 @@
 from rest_framework import serializers
 from auth_system.models import Wallet
 from .models import TierUpgradeRequest, Transaction
-from utilities.cloudinary_helper import upload_to_cloudinary
+from django.db import transaction as db_transaction
+from .uploads import spool_upload
 from django.contrib.auth import get_user_model
 from decimal import Decimal
+from django.conf import settings
 User = get_user_model()
 
 # Serializer for Transfer Operation
@@ -51,6 +53,16 @@ class TransferSerializer(serializers.Serializer):
 
         return data
     
+# Serializer for Beneficiary Name Enquiry
+class NameEnquirySerializer(serializers.Serializer):
+    bank_name = serializers.CharField()
+    account_number = serializers.CharField(min_length=10, max_length=10)
+
+    def validate_account_number(self, value):
+        if not value.isdigit():
+            raise serializers.ValidationError("Account number must be 10 digits.")
+        return value
+
 # Serializer for Tier Upgrade Requests
 class TierUpgradeSerializer(serializers.ModelSerializer):
     id_document_file = serializers.FileField(write_only=True, required=False)
@@ -122,12 +134,14 @@ class TierUpgradeSerializer(serializers.ModelSerializer):
         id_document_file = validated_data.pop('id_document_file', None)
         utility_bill_file = validated_data.pop('utility_bill_file', None)
 
-        if id_document_file:
-            validated_data['id_document'] = upload_to_cloudinary(id_document_file, folder_name="tier3_ids")
-        if utility_bill_file:
-            validated_data['utility_bill'] = upload_to_cloudinary(utility_bill_file, folder_name="tier3_utility_bills")
-
-        return TierUpgradeRequest.objects.create(user=user, **validated_data)
+        # Documents are uploaded after the request commits; their URLs are filled in then
+        with db_transaction.atomic():
+            upgrade_request = TierUpgradeRequest.objects.create(user=user, **validated_data)
+            if id_document_file:
+                spool_upload(id_document_file, 'tier_upgrade', upgrade_request.pk, 'id_document', folder="tier3_ids")
+            if utility_bill_file:
+                spool_upload(utility_bill_file, 'tier_upgrade', upgrade_request.pk, 'utility_bill', folder="tier3_utility_bills")
+        return upgrade_request
     
 
 # Serializer for Funding Wallet
@@ -166,6 +180,12 @@ class MonnifySendWebhookSerializer(serializers.Serializer):
     eventType = serializers.CharField()
     eventData = serializers.DictField()
 
+    def validate(self, data):
+        # Events are stored once per reference, so one without a reference cannot be kept apart
+        if not data.get("eventData", {}).get("reference"):
+            raise serializers.ValidationError("Missing fields in eventData: ['reference']")
+        return data
+
 # Serializer for Tier Approval Action
 class TierApprovalActionSerializer(serializers.Serializer):
     action = serializers.ChoiceField(choices=['approve', 'reject'])
@@ -181,3 +201,74 @@ class TransactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Transaction
         fields = '__all__'
+
+    def __init__(self, *args, **kwargs):
+        # Optional subset of fields to render, e.g. fields=['id', 'amount']
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+# Serializer for Transaction History Filters
+class TransactionHistoryQuerySerializer(serializers.Serializer):
+    transaction_type = serializers.ChoiceField(choices=Transaction.TRANSACTION_TYPES, required=False)
+    status = serializers.ChoiceField(choices=Transaction.STATUS_CHOICES, required=False)
+    transfer_type = serializers.ChoiceField(choices=['internal', 'external'], required=False)
+    start_date = serializers.DateTimeField(required=False)
+    end_date = serializers.DateTimeField(required=False)
+    min_amount = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+    max_amount = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+    fields = serializers.CharField(required=False)
+
+    def validate_fields(self, value):
+        requested = [name.strip() for name in value.split(',') if name.strip()]
+        allowed = set(TransactionSerializer().fields)
+        unknown = [name for name in requested if name not in allowed]
+        if unknown:
+            raise serializers.ValidationError(f"Unknown fields: {', '.join(unknown)}")
+        return requested
+
+    def validate(self, data):
+        if data.get('start_date') and data.get('end_date') and data['start_date'] > data['end_date']:
+            raise serializers.ValidationError("start_date must be before end_date.")
+        if data.get('min_amount') is not None and data.get('max_amount') is not None and data['min_amount'] > data['max_amount']:
+            raise serializers.ValidationError("min_amount must not be greater than max_amount.")
+        return data
+
+# Serializer for Statement Export Parameters
+class StatementExportQuerySerializer(serializers.Serializer):
+    start_date = serializers.DateTimeField(required=False)
+    end_date = serializers.DateTimeField(required=False)
+    output = serializers.ChoiceField(choices=['csv', 'ndjson'], default='csv')
+    user_id = serializers.IntegerField(required=False)
+
+    def validate(self, data):
+        if data.get('start_date') and data.get('end_date') and data['start_date'] > data['end_date']:
+            raise serializers.ValidationError("start_date must be before end_date.")
+        return data
+
+# Serializer for Historical Balance Parameters
+class BalanceAtQuerySerializer(serializers.Serializer):
+    at = serializers.DateTimeField()
+    user_id = serializers.IntegerField(required=False)
+
+# Serializer for one leg of a Payout Batch
+class PayoutItemSerializer(serializers.Serializer):
+    recipient_account_number = serializers.CharField()
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    transfer_type = serializers.ChoiceField(choices=['internal', 'external'], default='internal')
+    description = serializers.CharField(required=False, allow_blank=True)
+    bank_name = serializers.CharField(required=False, allow_blank=True)
+
+    def validate(self, data):
+        if data['amount'] <= 10:
+            raise serializers.ValidationError("Amount must be greater than ten.")
+        if data['transfer_type'] == 'external' and not data.get('bank_name'):
+            raise serializers.ValidationError("Bank name is required for external transfers.")
+        return data
+
+# Serializer for Payout Batch
+class PayoutBatchSerializer(serializers.Serializer):
+    description = serializers.CharField(required=False, allow_blank=True)
+    items = PayoutItemSerializer(many=True, allow_empty=False, max_length=settings.PAYOUT_BATCH["MAX_ITEMS"])
@@ -0,0 +1,100 @@
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+from django.db.models import Sum
+from django.utils import timezone
+from auth_system.models import Wallet
+from .models import LedgerEntry, LedgerJournal, WalletBalanceSnapshot
+
+
+def day_end(day):
+    """The first instant after `day`; a snapshot for `day` covers entries before it."""
+    return timezone.make_aware(datetime.combine(day + timedelta(days=1), dt_time.min))
+
+
+_ledger_start = None
+
+
+def ledger_start():
+    """
+    When the ledger began. Balances before this cannot be answered from it. The
+    ledger is append-only, so the first journal never changes once posted and is
+    looked up by primary key once per process.
+    """
+    global _ledger_start
+    if _ledger_start is None:
+        _ledger_start = LedgerJournal.objects.order_by('pk').values_list('created_at', flat=True).first()
+    return _ledger_start
+
+
+def _sum(entries):
+    return entries.aggregate(total=Sum('amount'))['total'] or Decimal("0.00")
+
+
+def balance_at(wallet_id, at):
+    """
+    The wallet's balance as of `at`: the latest daily snapshot that ends by `at`,
+    plus the ledger entries after it. Costs one index lookup and one short range
+    scan however old the wallet is. Returns (balance, snapshot_date or None).
+    """
+    snapshot = (
+        WalletBalanceSnapshot.objects.filter(wallet_id=wallet_id, date__lte=(at - timedelta(days=1)).date())
+        .order_by('-date')
+        .values_list('date', 'balance')
+        .first()
+    )
+    entries = LedgerEntry.objects.filter(account='wallet', wallet_id=wallet_id, created_at__lte=at)
+    if snapshot is None:
+        return _sum(entries), None
+    date, balance = snapshot
+    return balance + _sum(entries.filter(created_at__gte=day_end(date))), date
+
+
+def snapshot_balances(day, batch_size=1000):
+    """
+    Writes every wallet's closing balance for `day`, batch_size wallets at a time.
+    Each wallet's previous-day snapshot plus that day's entries gives the new
+    balance; wallets without one are summed from the whole ledger. Re-running for a
+    day overwrites its snapshots. Returns the number written.
+    """
+    start, end = day_end(day - timedelta(days=1)), day_end(day)
+    written = 0
+    last_pk = 0
+    while True:
+        wallet_ids = list(
+            Wallet.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not wallet_ids:
+            return written
+        last_pk = wallet_ids[-1]
+
+        entries = LedgerEntry.objects.filter(account='wallet', wallet_id__in=wallet_ids, created_at__lt=end)
+        previous = dict(
+            WalletBalanceSnapshot.objects.filter(wallet_id__in=wallet_ids, date=day - timedelta(days=1))
+            .values_list('wallet_id', 'balance')
+        )
+        deltas = _totals(entries.filter(wallet_id__in=previous, created_at__gte=start))
+        missing = [wallet_id for wallet_id in wallet_ids if wallet_id not in previous]
+        full = _totals(entries.filter(wallet_id__in=missing)) if missing else {}
+
+        snapshots = [
+            WalletBalanceSnapshot(
+                wallet_id=wallet_id,
+                date=day,
+                balance=(
+                    previous[wallet_id] + deltas.get(wallet_id, Decimal("0.00"))
+                    if wallet_id in previous else full.get(wallet_id, Decimal("0.00"))
+                ),
+            )
+            for wallet_id in wallet_ids
+        ]
+        WalletBalanceSnapshot.objects.bulk_create(
+            snapshots,
+            update_conflicts=True,
+            unique_fields=['wallet', 'date'],
+            update_fields=['balance', 'created_at'],
+        )
+        written += len(snapshots)
+
+
+def _totals(entries):
+    return dict(entries.values('wallet_id').annotate(total=Sum('amount')).values_list('wallet_id', 'total'))
@@ -1,3 +1,1857 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+import redis as redis_py
+import requests
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction as db_transaction
+from django.db.models import F, Q, Sum
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from auth_system.models import User, Wallet
+from auth_system.provisioning import provision_pending
+from fintech_api.testing import QueryBudgetMixin
+from utilities.bank_directory import BankDirectory
+from utilities.beneficiary_cache import BeneficiaryCache
+from utilities.cloudinary_helper import upload_large_to_cloudinary
+from utilities.monnify_client import MonnifyClient
+from utilities.monnify_helper import RELEASE_LOCK_SCRIPT, MonnifyTokenManager, get_bank_code, monnify_request
+from . import limits, outbox, payouts, rollups, snapshots, webhooks
+from .ledger import UnbalancedJournal, post_journal, post_journals, rebuild_balances, system_entry, wallet_entry
+from .models import (
+    DailyLimitTracker, LedgerEntry, LedgerJournal, PayoutBatch, PayoutItem, TierUpgradeRequest, Transaction,
+    TransferOutbox, WebhookEvent, WalletBalanceSnapshot, PendingUpload, DailyVolumeRollup,
+)
+from .uploads import process_pending, spool_upload, upload
+from .snapshots import balance_at, day_end, snapshot_balances
+from .webhooks import record_event
+from .transfers import (
+    TransferError, complete_external_transfer, execute_internal_transfer, fail_external_transfer, lock_wallets,
+)
 
-# Create your tests here.
+
+class FakeMonnifyResponse:
+    def __init__(self, data, status_code=200):
+        self.status_code = status_code
+        self._data = data
+        self.text = str(data)
+
+    def json(self):
+        return self._data
+
+
+def reserved_account(user):
+    return {
+        "accountNumber": f"70{user.pk:08d}",
+        "bankName": "Moniepoint",
+        "customerName": f"{user.firstname} {user.lastname}",
+        "accountReference": f"test-{user.pk}",
+    }
+
+
+def create_user(email, phone_number, firstname="Ada", lastname="Obi"):
+    user = User.objects.create_user(
+        email=email, firstname=firstname, lastname=lastname, password="pass12345", phone_number=phone_number
+    )
+    with mock.patch("auth_system.provisioning.create_reserved_account", side_effect=reserved_account):
+        provision_pending()
+    return user
+
+
+def fund(user, amount):
+    """Gives the user's wallet an opening balance, posted to the ledger like a migrated one."""
+    wallet = Wallet.objects.get(user=user)
+    with db_transaction.atomic():
+        Wallet.objects.filter(pk=wallet.pk).update(balance=F('balance') + amount)
+        post_journal(f"opening_{wallet.pk}", 'opening', [system_entry('opening', -amount), wallet_entry(wallet.pk, amount)])
+
+
+def balance_of(user):
+    return Wallet.objects.get(user=user).balance
+
+
+@override_settings(MONNIFY_TOKEN_SHARED_CACHE=False, MONNIFY_TOKEN_REFRESH_MARGIN=120)
+class MonnifyTokenManagerTests(TestCase):
+    """The Monnify token is fetched once and refreshed ahead of expiry without blocking callers."""
+
+    def setUp(self):
+        self.manager = MonnifyTokenManager()
+        self.logins = 0
+
+        def login():
+            self.logins += 1
+            return f"token-{self.logins}", 3600
+        self.manager._login = login
+
+    def test_token_is_reused_until_the_refresh_margin(self):
+        self.assertEqual([self.manager.get_token() for _ in range(5)], ["token-1"] * 5)
+        self.assertEqual(self.logins, 1)
+
+    def test_one_background_refresh_inside_the_margin(self):
+        self.manager.get_token()
+        self.manager._expires_at = time.time() + 60
+        with mock.patch("utilities.monnify_helper.run_in_background") as background:
+            self.assertEqual([self.manager.get_token() for _ in range(3)], ["token-1"] * 3)
+        background.assert_called_once()
+
+        background.call_args.args[0]()
+        self.assertEqual(self.manager.get_token(), "token-2")
+        self.assertEqual(self.logins, 2)
+
+    def test_expired_token_is_fetched_before_returning(self):
+        self.manager.get_token()
+        self.manager._expires_at = time.time() - 1
+        with mock.patch("utilities.monnify_helper.run_in_background") as background:
+            self.assertEqual(self.manager.get_token(), "token-2")
+        background.assert_not_called()
+
+    def test_invalidate_forces_a_new_login(self):
+        self.manager.get_token()
+        self.manager.invalidate()
+        self.assertEqual(self.manager.get_token(), "token-2")
+
+
+class MonnifyClientTests(TestCase):
+    """Only idempotent Monnify calls are retried, so a disbursement is never sent twice."""
+
+    def setUp(self):
+        self.client = MonnifyClient()
+        self.client._session = mock.Mock()
+        patcher = mock.patch.object(self.client, "_sleep_before_retry")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_idempotent_call_is_retried(self):
+        self.client._session.request.side_effect = [
+            requests.ConnectionError("reset"), FakeMonnifyResponse({}, status_code=503), FakeMonnifyResponse({"ok": True}),
+        ]
+        response = self.client.get("api/v1/banks")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client._session.request.call_count, 3)
+        self.assertEqual(self.client.stats()["GET api/v1/banks"]["errors"], 2)
+
+    def test_transfer_is_sent_once(self):
+        self.client._session.request.return_value = FakeMonnifyResponse({}, status_code=503)
+        self.assertEqual(self.client.post("api/v2/disbursements/single").status_code, 503)
+        self.client._session.request.side_effect = requests.Timeout("read timeout")
+        with self.assertRaises(requests.Timeout):
+            self.client.post("api/v2/disbursements/single")
+        self.assertEqual(self.client._session.request.call_count, 2)
+
+    def test_revoked_token_is_replaced_once(self):
+        responses = [FakeMonnifyResponse({}, status_code=401), FakeMonnifyResponse({"ok": True})]
+        with mock.patch("utilities.monnify_helper.get_monnify_token", side_effect=["old", "new"]), \
+                mock.patch("utilities.monnify_helper.token_manager") as token_manager, \
+                mock.patch("utilities.monnify_helper.monnify.request", side_effect=responses) as request:
+            self.assertEqual(monnify_request("GET", "api/v1/banks").status_code, 200)
+        token_manager.invalidate.assert_called_once()
+        self.assertEqual(
+            [call.kwargs["headers"]["Authorization"] for call in request.call_args_list], ["Bearer old", "Bearer new"]
+        )
+
+
+BANKS = [
+    {"name": "Guaranty Trust Bank", "code": "058"},
+    {"name": "United Bank For Africa Plc", "code": "033"},
+    {"name": "Wema Bank", "code": "035"},
+    {"name": "Moniepoint Microfinance Bank", "code": "50515"},
+]
+
+
+class BankDirectoryTests(TestCase):
+    """Bank codes come from one cached download of the bank list, looked up by name, alias or code."""
+
+    def setUp(self):
+        self.directory = BankDirectory()
+        self.redis = mock.Mock(**{"get.return_value": None})
+        patcher = mock.patch("auth_system.redis_client.redis", self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("utilities.monnify_helper.monnify_request", return_value=FakeMonnifyResponse({
+            "responseBody": [{**bank, "ussdTemplate": None} for bank in BANKS]
+        }))
+        self.request = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_lookup_by_name_alias_and_code(self):
+        for query in ("Guaranty Trust Bank", "gtbank", "GTB", " guaranty trust ", "058"):
+            self.assertEqual(self.directory.lookup(query)["code"], "058", query)
+        self.assertEqual(self.directory.lookup("UBA")["code"], "033")
+        self.assertEqual(self.directory.lookup("united bank for africa")["code"], "033")
+        self.assertIsNone(self.directory.lookup("Bank of Atlantis"))
+        self.request.assert_called_once()
+
+    def test_stale_list_is_served_while_one_refresh_runs(self):
+        self.directory.lookup("gtbank")
+        self.directory._fetched_at = time.time() - settings.BANK_DIRECTORY["TTL"] - 1
+        with mock.patch("utilities.bank_directory.run_in_background") as background:
+            for _ in range(3):
+                self.assertEqual(self.directory.lookup("wema")["code"], "035")
+        background.assert_called_once()
+        self.request.assert_called_once()
+
+    def test_cold_cache_finds_nothing_while_monnify_is_down(self):
+        self.request.side_effect = requests.ConnectionError("Monnify is down")
+        with self.assertLogs("utilities.bank_directory", "WARNING"):
+            self.assertIsNone(self.directory.lookup("gtbank"))
+        with mock.patch("utilities.monnify_helper.bank_directory", self.directory), \
+                self.assertLogs("utilities.bank_directory", "WARNING"):
+            self.assertEqual(get_bank_code("gtbank", "0123456789"), (None, None, None))
+
+        self.request.side_effect = None
+        self.assertEqual(self.directory.lookup("gtbank")["code"], "058")
+
+    def test_shared_copy_is_used_before_monnify(self):
+        self.redis.get.return_value = json.dumps({"fetched_at": time.time(), "banks": BANKS[:1]})
+        self.assertEqual(self.directory.lookup("gtbank")["code"], "058")
+        self.assertIsNone(self.directory.lookup("wema"))
+        self.request.assert_not_called()
+
+
+class BeneficiaryCacheTests(TestCase):
+    """Account names are looked up once per destination; rejected accounts are remembered briefly."""
+
+    def setUp(self):
+        self.cache = BeneficiaryCache()
+        self.redis = mock.Mock(**{"get.return_value": None})
+        patcher = mock.patch("auth_system.redis_client.redis", self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def validate(self, *responses):
+        return mock.patch("utilities.monnify_helper.monnify_request", side_effect=responses)
+
+    def test_resolved_name_is_cached(self):
+        with self.validate(FakeMonnifyResponse({"responseBody": {"accountName": "JANE DOE"}})) as request:
+            self.assertEqual(self.cache.resolve("058", "0123456789"), "JANE DOE")
+            self.assertEqual(self.cache.resolve("058", "0123456789"), "JANE DOE")
+        request.assert_called_once()
+        self.redis.set.assert_called_once_with(
+            "beneficiary:058:0123456789", json.dumps({"account_name": "JANE DOE"}), ex=settings.BENEFICIARY_CACHE["TTL"]
+        )
+
+    def test_rejected_account_is_cached_briefly(self):
+        with self.validate(FakeMonnifyResponse({"responseMessage": "Invalid account"}, status_code=400)) as request:
+            self.assertIsNone(self.cache.resolve("058", "0000000000"))
+            self.assertIsNone(self.cache.resolve("058", "0000000000"))
+        request.assert_called_once()
+        self.assertEqual(self.redis.set.call_args.kwargs["ex"], settings.BENEFICIARY_CACHE["NEGATIVE_TTL"])
+
+    def test_upstream_errors_are_not_cached(self):
+        responses = [FakeMonnifyResponse({}, status_code=503), FakeMonnifyResponse({"responseBody": {"accountName": "JANE DOE"}})]
+        with self.validate(*responses) as request:
+            self.assertIsNone(self.cache.resolve("058", "0123456789"))
+            self.assertEqual(self.cache.resolve("058", "0123456789"), "JANE DOE")
+        self.assertEqual(request.call_count, 2)
+
+    def test_name_enquiry(self):
+        user = create_user("ada@example.com", "08000000001")
+        client = APIClient()
+        client.force_authenticate(user)
+        with mock.patch("operations.views.bank_directory.lookup", return_value={"name": "GTBank", "code": "058"}), \
+                mock.patch("operations.views.beneficiary_cache.resolve", side_effect=["JANE DOE", None]):
+            found = client.post(reverse("name-enquiry"), {"bank_name": "gtbank", "account_number": "0123456789"}, format="json")
+            missing = client.post(reverse("name-enquiry"), {"bank_name": "gtbank", "account_number": "0000000000"}, format="json")
+        self.assertEqual((found.status_code, found.data["account_name"]), (200, "JANE DOE"))
+        self.assertEqual(missing.status_code, 404)
+
+
+@override_settings(
+    LIMIT_COUNTERS={**settings.LIMIT_COUNTERS, "BACKEND": "database"},
+    TRANSFER_OUTBOX={**settings.TRANSFER_OUTBOX, "DISPATCH_ON_COMMIT": False},
+)
+class TransferOutboxTests(TestCase):
+    """External transfers are debited once, sent once and refunded if Monnify rejects them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender = create_user("sender@example.com", "08000000001")
+        fund(cls.sender, Decimal("1000.00"))
+
+    def setUp(self):
+        patcher = mock.patch("operations.views.get_bank_code", return_value=("058", "Guaranty Trust Bank", "JANE DOE"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def send(self, amount="200"):
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=self.sender.pk))
+        response = client.post(reverse("send-money"), {
+            "recipient_account_number": "0123456789", "amount": amount,
+            "transfer_type": "external", "bank_name": "gtbank"
+        }, format="json")
+        self.assertEqual(response.status_code, 202, response.data)
+        return Transaction.objects.get(transaction_reference=response.data["transaction_reference"])
+
+    def outflow(self):
+        return DailyLimitTracker.objects.get(user=self.sender).daily_outflow
+
+    def test_transfer_is_sent_once(self):
+        transaction = self.send()
+        self.assertEqual(balance_of(self.sender), Decimal("800.00"))
+
+        accepted = FakeMonnifyResponse({"requestSuccessful": True, "responseBody": {"status": "SUCCESS"}})
+        with mock.patch("operations.outbox.initiate_transfer", return_value=accepted) as initiate:
+            self.assertEqual(outbox.dispatch_pending(), 1)
+            self.assertEqual(outbox.dispatch_pending(), 0)
+        initiate.assert_called_once()
+        self.assertEqual(initiate.call_args.kwargs["reference"], transaction.transaction_reference)
+        self.assertEqual(TransferOutbox.objects.get().status, 'sent')
+        self.assertEqual(balance_of(self.sender), Decimal("800.00"))
+
+    def test_claim_is_leased_until_stale(self):
+        self.send()
+        ids = outbox.claim_batch(10)
+        self.assertEqual(len(ids), 1)
+        self.assertEqual(outbox.claim_batch(10), [])
+
+        stale = timezone.now() - timedelta(seconds=settings.TRANSFER_OUTBOX["STALE_AFTER"] + 1)
+        TransferOutbox.objects.update(updated_at=stale)
+        self.assertEqual(outbox.claim_batch(10), ids)
+        self.assertEqual(TransferOutbox.objects.get().attempts, 2)
+
+    def test_retry_asks_monnify_before_sending_again(self):
+        self.send()
+        with mock.patch("operations.outbox.initiate_transfer", side_effect=requests.Timeout("read timeout")):
+            outbox.dispatch_pending()
+        entry = TransferOutbox.objects.get()
+        self.assertEqual((entry.status, entry.attempts), ('pending', 1))
+        self.assertGreater(entry.next_attempt_at, timezone.now())
+
+        # The timed out request did reach Monnify, which now knows the reference
+        TransferOutbox.objects.update(next_attempt_at=timezone.now())
+        known = FakeMonnifyResponse({"requestSuccessful": True, "responseBody": {"status": "PENDING_AUTHORIZATION"}})
+        with mock.patch("operations.outbox.get_transfer_status", return_value=known), \
+                mock.patch("operations.outbox.initiate_transfer") as initiate:
+            outbox.dispatch_pending()
+        initiate.assert_not_called()
+        self.assertEqual(TransferOutbox.objects.get().status, 'awaiting_otp')
+        self.assertEqual(balance_of(self.sender), Decimal("800.00"))
+
+    def test_rejected_transfer_is_refunded(self):
+        transaction = self.send()
+        self.assertEqual(self.outflow(), Decimal("200.00"))
+
+        rejected = FakeMonnifyResponse({"requestSuccessful": False, "responseMessage": "Invalid account"}, status_code=400)
+        with mock.patch("operations.outbox.initiate_transfer", return_value=rejected):
+            outbox.dispatch_pending()
+        entry = TransferOutbox.objects.get()
+        self.assertEqual((entry.status, entry.last_error), ('failed', "Invalid account"))
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.status, 'failed')
+        self.assertEqual(balance_of(self.sender), Decimal("1000.00"))
+        self.assertEqual(self.outflow(), Decimal("0.00"))
+
+        # A failure webhook for the same transfer arriving afterwards changes nothing
+        self.assertFalse(fail_external_transfer(transaction))
+        self.assertEqual(balance_of(self.sender), Decimal("1000.00"))
+        self.assertEqual(
+            list(LedgerJournal.objects.filter(reference=transaction.transaction_reference).values_list('kind', flat=True)
+                 .order_by('kind')),
+            ['external_debit', 'external_refund'],
+        )
+        self.assertEqual(rebuild_balances(dry_run=True), [])
+
+    def test_gives_up_only_when_monnify_never_got_the_transfer(self):
+        self.send()
+        TransferOutbox.objects.update(attempts=settings.TRANSFER_OUTBOX["MAX_ATTEMPTS"] - 1)
+        unavailable = FakeMonnifyResponse({"requestSuccessful": False}, status_code=503)
+        unknown = FakeMonnifyResponse({"requestSuccessful": False, "responseMessage": "Not found"}, status_code=404)
+        with mock.patch("operations.outbox.initiate_transfer", return_value=unavailable), \
+                mock.patch("operations.outbox.get_transfer_status", return_value=unknown):
+            outbox.dispatch_pending()
+        self.assertEqual(TransferOutbox.objects.get().status, 'failed')
+        self.assertEqual(balance_of(self.sender), Decimal("1000.00"))
+        self.assertEqual(self.outflow(), Decimal("0.00"))
+
+
+    def test_unexpected_errors_count_towards_max_attempts(self):
+        self.send()
+        unknown = FakeMonnifyResponse({"requestSuccessful": False, "responseMessage": "Not found"}, status_code=404)
+        with mock.patch("operations.outbox.initiate_transfer", side_effect=ValueError("bad payload")), \
+                mock.patch("operations.outbox.get_transfer_status", return_value=unknown), \
+                self.assertLogs("operations.outbox", "ERROR"):
+            outbox.dispatch_pending()
+            entry = TransferOutbox.objects.get()
+            self.assertEqual((entry.status, entry.attempts, entry.last_error), ('pending', 1, "bad payload"))
+            for _ in range(settings.TRANSFER_OUTBOX["MAX_ATTEMPTS"] - 1):
+                TransferOutbox.objects.update(next_attempt_at=timezone.now())
+                outbox.dispatch_pending()
+        self.assertEqual(TransferOutbox.objects.get().status, 'failed')
+        self.assertEqual(balance_of(self.sender), Decimal("1000.00"))
+        self.assertEqual(self.outflow(), Decimal("0.00"))
+
+@override_settings(LIMIT_COUNTERS={**settings.LIMIT_COUNTERS, "BACKEND": "database"})
+class InternalTransferTests(TestCase):
+    """Internal transfers debit through conditional updates, so stale reads cannot overdraw a wallet."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender = create_user("sender@example.com", "08000000001")
+        cls.recipient = create_user("recipient@example.com", "08000000002", firstname="Bola", lastname="Eze")
+        fund(cls.sender, Decimal("1000.00"))
+
+    def transfer(self, amount, reference):
+        execute_internal_transfer(
+            sender=self.sender,
+            sender_wallet=Wallet.objects.get(user=self.sender),
+            recipient=self.recipient,
+            recipient_wallet=Wallet.objects.get(user=self.recipient),
+            amount=Decimal(amount),
+            description="",
+            reference=reference,
+        )
+
+    def test_transfer_moves_money_and_posts_a_balanced_journal(self):
+        self.transfer("250", "t1")
+        self.assertEqual((balance_of(self.sender), balance_of(self.recipient)), (Decimal("750.00"), Decimal("250.00")))
+        self.assertEqual(
+            set(Transaction.objects.values_list('transaction_reference', 'transaction_type')),
+            {("t1_debit", "Debit"), ("t1_credit", "Credit")},
+        )
+        self.assertEqual(DailyLimitTracker.objects.get(user=self.sender).daily_outflow, Decimal("250.00"))
+        self.assertEqual(DailyLimitTracker.objects.get(user=self.recipient).daily_inflow, Decimal("250.00"))
+        self.assertEqual(LedgerEntry.objects.filter(journal__reference="t1").aggregate(total=Sum('amount'))["total"], 0)
+        self.assertEqual(rebuild_balances(dry_run=True), [])
+
+    def test_wallet_cannot_be_debited_twice(self):
+        # Both requests passed the view's balance check before either debited the wallet
+        self.transfer("600", "t1")
+        with self.assertRaisesMessage(TransferError, "Insufficient funds."):
+            self.transfer("600", "t2")
+
+        self.assertEqual((balance_of(self.sender), balance_of(self.recipient)), (Decimal("400.00"), Decimal("600.00")))
+        self.assertFalse(Transaction.objects.filter(transaction_reference__startswith="t2").exists())
+        self.assertEqual(DailyLimitTracker.objects.get(user=self.sender).daily_outflow, Decimal("600.00"))
+
+    def test_failed_credit_rolls_back_the_debit(self):
+        Wallet.objects.filter(user=self.recipient).update(balance=Decimal(settings.TIER_RULES["tier 1"]["max_balance"]) - 100)
+        with self.assertRaisesMessage(TransferError, "Recipient's wallet balance limit exceeded."):
+            self.transfer("200", "t1")
+        self.assertEqual(balance_of(self.sender), Decimal("1000.00"))
+        self.assertFalse(Transaction.objects.exists())
+        self.assertFalse(LedgerJournal.objects.filter(reference="t1").exists())
+        self.assertFalse(DailyLimitTracker.objects.filter(user=self.sender, daily_outflow__gt=0).exists())
+
+    @override_settings(LIMIT_COUNTERS={**settings.LIMIT_COUNTERS, "BACKEND": "redis"})
+    def test_redis_limits_are_released_when_the_transfer_fails(self):
+        with mock.patch("auth_system.redis_client.redis", CounterRedis()):
+            with self.assertRaises(TransferError):
+                self.transfer("2000", "t1")
+            self.assertEqual(limits.current(self.sender.pk, "outflow"), Decimal("0.00"))
+            self.assertEqual(limits.current(self.recipient.pk, "inflow"), Decimal("0.00"))
+
+    def test_wallets_are_locked_in_primary_key_order(self):
+        sender_wallet, recipient_wallet = Wallet.objects.get(user=self.sender), Wallet.objects.get(user=self.recipient)
+        with CaptureQueriesContext(connection) as queries, db_transaction.atomic():
+            locked = lock_wallets(recipient_wallet.pk, sender_wallet.pk)
+        self.assertEqual(list(locked), sorted([sender_wallet.pk, recipient_wallet.pk]))
+        self.assertTrue([query for query in queries if 'auth_system_wallet' in query['sql'] and 'ORDER BY' in query['sql']])
+
+
+class CounterRedis:
+    """
+    The commands the daily limit counters and the Monnify token cache use, with the
+    limit Lua scripts run in Python.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.sets = {}
+        self.down = False
+
+    def _check(self):
+        if self.down:
+            raise redis_py.ConnectionError("Redis is down")
+
+    def get(self, key):
+        self._check()
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, ex=None, exat=None):
+        self._check()
+        if nx and key in self.data:
+            return None
+        self.data[key] = str(value)
+        return True
+
+    def delete(self, *keys):
+        self._check()
+        for key in keys:
+            self.data.pop(key, None)
+
+    def mget(self, *keys):
+        self._check()
+        return [self.data.get(key) for key in keys]
+
+    def spop(self, key, count):
+        self._check()
+        members = self.sets.pop(key, set())
+        return list(members) or None
+
+    def eval(self, script, keys=None, args=None):
+        self._check()
+        if script == RELEASE_LOCK_SCRIPT:
+            if self.data.get(keys[0]) != args[0]:
+                return 0
+            del self.data[keys[0]]
+            return 1
+        counter, dirty = keys
+        if script == limits.CONSUME_SCRIPT:
+            if counter not in self.data:
+                return -1
+            if int(self.data[counter]) + int(args[0]) > int(args[1]):
+                return -2
+            self.data[counter] = str(int(self.data[counter]) + int(args[0]))
+            self.sets.setdefault(dirty, set()).add(args[2])
+            return int(self.data[counter])
+        if counter not in self.data:
+            return 0
+        self.data[counter] = str(max(int(self.data[counter]) - int(args[0]), 0))
+        self.sets.setdefault(dirty, set()).add(args[1])
+        return 1
+
+
+@override_settings(LIMIT_COUNTERS={**settings.LIMIT_COUNTERS, "BACKEND": "redis"})
+class DailyLimitCounterTests(TestCase):
+    """Redis limit counters fail closed, so an outage can never lift a user's cap."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("ada@example.com", "08000000001")
+
+    def setUp(self):
+        self.redis = CounterRedis()
+        patcher = mock.patch("auth_system.redis_client.redis", self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tracked(self):
+        return DailyLimitTracker.objects.get(user=self.user).daily_outflow
+
+    def test_consume_stays_within_the_cap(self):
+        self.assertTrue(limits.consume(self.user.pk, "outflow", Decimal("800"), Decimal("1000")))
+        self.assertFalse(limits.consume(self.user.pk, "outflow", Decimal("300"), Decimal("1000")))
+        self.assertTrue(limits.consume(self.user.pk, "outflow", Decimal("200"), Decimal("1000")))
+        self.assertEqual(limits.current(self.user.pk, "outflow"), Decimal("1000.00"))
+
+    def test_counter_is_seeded_from_the_tracker(self):
+        DailyLimitTracker.objects.create(user=self.user, date=timezone.now().date(), daily_outflow=Decimal("900"))
+        self.assertFalse(limits.consume(self.user.pk, "outflow", Decimal("200"), Decimal("1000")))
+        self.assertTrue(limits.consume(self.user.pk, "outflow", Decimal("100"), Decimal("1000")))
+        self.assertEqual(limits.reconcile(), 1)
+        self.assertEqual(self.tracked(), Decimal("1000.00"))
+
+    def test_release_gives_the_amount_back(self):
+        limits.consume(self.user.pk, "outflow", Decimal("600"), Decimal("1000"))
+        limits.release(self.user.pk, "outflow", Decimal("600"))
+        self.assertEqual(limits.current(self.user.pk, "outflow"), Decimal("0.00"))
+        limits.reconcile()
+        self.assertEqual(self.tracked(), Decimal("0.00"))
+
+    def test_consume_is_rejected_during_an_outage(self):
+        self.assertTrue(limits.consume(self.user.pk, "outflow", Decimal("800"), Decimal("1000")))
+        limits.reconcile()
+
+        self.redis.down = True
+        with self.assertRaises(limits.LimitsUnavailable):
+            limits.consume(self.user.pk, "outflow", Decimal("800"), Decimal("1000"))
+        with self.assertRaises(limits.LimitsUnavailable):
+            limits.current(self.user.pk, "outflow")
+        self.assertEqual(self.tracked(), Decimal("800.00"))
+
+        self.redis.down = False
+        self.assertFalse(limits.consume(self.user.pk, "outflow", Decimal("800"), Decimal("1000")))
+
+    def test_transfers_are_refused_during_an_outage(self):
+        recipient = create_user("bola@example.com", "08000000002", firstname="Bola", lastname="Eze")
+        Wallet.objects.filter(user=recipient).update(monnify_account_number="7000000002")
+        Wallet.objects.filter(user=self.user).update(balance=Decimal("5000.00"))
+        self.redis.down = True
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=self.user.pk))
+        response = client.post(reverse("send-money"), {
+            "recipient_account_number": "7000000002", "amount": "100",
+            "transfer_type": "internal",
+        }, format="json")
+        self.assertEqual(response.status_code, 503, response.data)
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal("5000.00"))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_release_during_an_outage_leaves_the_tracker_alone(self):
+        limits.consume(self.user.pk, "outflow", Decimal("600"), Decimal("1000"))
+        limits.reconcile()
+
+        self.redis.down = True
+        limits.release(self.user.pk, "outflow", Decimal("600"))
+        self.assertEqual(self.tracked(), Decimal("600.00"))
+
+        # The amount stays counted rather than being given back twice
+        self.redis.down = False
+        self.assertEqual(limits.current(self.user.pk, "outflow"), Decimal("600.00"))
+        limits.release(self.user.pk, "outflow", Decimal("600"))
+        self.assertEqual(limits.current(self.user.pk, "outflow"), Decimal("0.00"))
+
+    def test_reconcile_keeps_amounts_counted_around_an_outage(self):
+        limits.consume(self.user.pk, "outflow", Decimal("300"), Decimal("1000"))
+        self.redis.down = True
+        with self.assertRaises(redis_py.ConnectionError):
+            limits.reconcile()
+        with self.assertRaises(limits.LimitsUnavailable):
+            limits.consume(self.user.pk, "outflow", Decimal("300"), Decimal("1000"))
+
+        self.redis.down = False
+        limits.consume(self.user.pk, "outflow", Decimal("200"), Decimal("1000"))
+        self.assertEqual(limits.reconcile(), 1)
+        self.assertEqual(self.tracked(), Decimal("500.00"))
+
+
+class TransactionHistoryTests(TestCase):
+    """History pages seek past the last (created_at, id) returned, so no row is skipped or repeated."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("ada@example.com", "08000000001")
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=cls.user, amount=Decimal(100 + i), transaction_reference=f"h{i}",
+                transaction_type="Credit" if i % 2 else "Debit", status='success',
+            )
+            for i in range(7)
+        ])
+        # Rows sharing a timestamp are still ordered by id
+        Transaction.objects.filter(transaction_reference__in=["h2", "h3", "h4"]).update(
+            created_at=timezone.now() - timedelta(hours=1)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_pages_cover_every_row_once(self):
+        seen, params = [], {"page_size": 3}
+        while True:
+            response = self.client.get(reverse("user-transactions"), params)
+            self.assertEqual(response.status_code, 200)
+            seen += [row["transaction_reference"] for row in response.data["results"]]
+            if not response.data["next_cursor"]:
+                break
+            params["cursor"] = response.data["next_cursor"]
+        expected = Transaction.objects.order_by('-created_at', '-id').values_list('transaction_reference', flat=True)
+        self.assertEqual(seen, list(expected))
+
+    def test_filters_and_fields(self):
+        response = self.client.get(reverse("user-transactions"), {
+            "transaction_type": "Credit", "min_amount": "103", "fields": "transaction_reference,amount",
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(row["transaction_reference"] for row in response.data["results"]), ["h3", "h5"]
+        )
+        self.assertEqual(set(response.data["results"][0]), {"transaction_reference", "amount"})
+
+    def test_bad_parameters_are_rejected(self):
+        self.assertEqual(self.client.get(reverse("user-transactions"), {"cursor": "not-a-cursor"}).status_code, 404)
+        self.assertEqual(self.client.get(reverse("user-transactions"), {"fields": "password"}).status_code, 400)
+
+
+class StatementExportTests(TestCase):
+    """Statements stream every row in the period between opening and closing balance lines."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("ada@example.com", "08000000001")
+        Wallet.objects.filter(user=cls.user).update(balance=Decimal("500.00"))
+        now = timezone.now()
+        for reference, kind, amount, days_ago in [("s1", "Deposit", "300", 2), ("s2", "Debit", "100", 1), ("s3", "Credit", "50", 0)]:
+            transaction = Transaction.objects.create(
+                user=cls.user, amount=Decimal(amount), transaction_reference=reference, transaction_type=kind, status='success'
+            )
+            Transaction.objects.filter(pk=transaction.pk).update(created_at=now - timedelta(days=days_ago))
+        cls.period = {
+            "start_date": (now - timedelta(days=2, hours=1)).isoformat(),
+            "end_date": (now - timedelta(hours=12)).isoformat(),
+        }
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+        # ledger_start() is cached per process; start from this test's ledger
+        patcher = mock.patch.object(snapshots, "_ledger_start", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def export(self, **params):
+        response = self.client.get(reverse("transaction-statement"), {**self.period, **params})
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode().splitlines()
+
+    def test_csv_statement(self):
+        lines = self.export()
+        self.assertEqual(lines[0], "Opening Balance,250.00")
+        self.assertEqual([line.split(",")[0] for line in lines[2:-1]], [
+            str(pk) for pk in Transaction.objects.filter(transaction_reference__in=["s1", "s2"]).order_by('created_at')
+            .values_list('pk', flat=True)
+        ])
+        self.assertEqual(lines[-1], "Closing Balance,450.00")
+
+    def test_ndjson_statement(self):
+        lines = [json.loads(line) for line in self.export(output="ndjson")]
+        self.assertEqual((lines[0]["type"], lines[0]["balance"]), ("opening_balance", "250.00"))
+        self.assertEqual([line["transaction_reference"] for line in lines[1:-1]], ["s1", "s2"])
+        self.assertEqual((lines[-1]["type"], lines[-1]["balance"]), ("closing_balance", "450.00"))
+
+    def test_only_admins_export_other_users(self):
+        other = create_user("bola@example.com", "08000000002", firstname="Bola", lastname="Eze")
+        response = self.client.get(reverse("transaction-statement"), {"user_id": other.pk})
+        self.assertEqual(response.status_code, 403)
+
+
+def funding_event(payment_reference, amount="500", status="PAID", event_type="SUCCESSFUL_TRANSACTION"):
+    return {
+        "eventType": event_type,
+        "eventData": {
+            "paymentReference": payment_reference, "transactionReference": f"MNFY|{payment_reference}",
+            "amountPaid": amount, "paymentStatus": status,
+        },
+    }
+
+
+@override_settings(WEBHOOK_INBOX={**settings.WEBHOOK_INBOX, "PROCESS_ON_COMMIT": False, "SETTLEMENT_MODE": "single"})
+class WebhookInboxTests(TestCase):
+    """Webhooks are stored once and applied once, however often Monnify delivers them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("ada@example.com", "08000000001")
+
+    def deposit(self, reference, amount="500"):
+        return Transaction.objects.create(
+            user=self.user, amount=Decimal(amount), status='pending', transaction_type='Deposit',
+            transfer_type='internal', transaction_reference=reference,
+        )
+
+    def deliver(self, payload, url="monnify-webhook"):
+        response = APIClient().post(reverse(url), payload, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_redelivered_funding_is_credited_once(self):
+        self.deposit("pay_1")
+        for _ in range(3):
+            self.deliver(funding_event("pay_1"))
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        self.assertEqual(webhooks.process_pending(), 1)
+        self.assertEqual(balance_of(self.user), Decimal("500.00"))
+
+        # Redelivered after it was applied: still one event, still one credit
+        self.deliver(funding_event("pay_1"))
+        self.assertEqual(webhooks.process_pending(), 0)
+        self.assertEqual(webhooks.apply_funding_event(funding_event("pay_1")), ('ignored', "Transaction not found."))
+        self.assertEqual(balance_of(self.user), Decimal("500.00"))
+        self.assertEqual(LedgerJournal.objects.filter(kind='funding').count(), 1)
+        self.assertEqual(rebuild_balances(dry_run=True), [])
+
+    def test_events_for_a_reference_in_flight_are_not_claimed(self):
+        self.deposit("pay_1")
+        self.deliver(funding_event("pay_1"))
+        self.deliver(funding_event("pay_1", event_type="REVERSED_TRANSACTION"))
+        self.deliver(funding_event("pay_2"))
+
+        first = webhooks.claim_events(1)
+        self.assertEqual([event.event_type for event in first], ["SUCCESSFUL_TRANSACTION"])
+        self.assertEqual([event.reference for event in webhooks.claim_events(10)], ["pay_2"])
+
+        # Once the claim goes stale the whole reference can be picked up again, in order
+        stale = timezone.now() - timedelta(seconds=settings.WEBHOOK_INBOX["STALE_AFTER"] + 1)
+        WebhookEvent.objects.filter(reference="pay_1").update(claimed_at=stale)
+        self.assertEqual(
+            [(event.event_type, event.attempts) for event in webhooks.claim_events(10)],
+            [("SUCCESSFUL_TRANSACTION", 2), ("REVERSED_TRANSACTION", 1)],
+        )
+
+    def test_events_behind_another_claimers_uncommitted_claim_are_not_claimed(self):
+        self.deposit("pay_1")
+        self.deliver(funding_event("pay_1"))
+        self.deliver(funding_event("pay_1", event_type="REVERSED_TRANSACTION"))
+        self.deliver(funding_event("pay_2"))
+        first, second, other = WebhookEvent.objects.order_by('id')
+
+        # Another claimer has locked the first event but not committed, so it is
+        # skipped here and still looks pending
+        self.assertEqual(webhooks._queue_heads([second, other]), [other])
+        self.assertEqual(webhooks._queue_heads([first, second, other]), [first, second, other])
+
+    def test_failing_event_is_retried_then_given_up(self):
+        self.deposit("pay_1")
+        self.deliver(funding_event("pay_1", amount="not a number"))
+        with self.assertLogs("operations.webhooks", "ERROR"):
+            for _ in range(settings.WEBHOOK_INBOX["MAX_ATTEMPTS"]):
+                webhooks.process_pending()
+        event = WebhookEvent.objects.get()
+        self.assertEqual((event.status, event.attempts), ('failed', settings.WEBHOOK_INBOX["MAX_ATTEMPTS"]))
+        self.assertEqual(balance_of(self.user), Decimal("0.00"))
+        self.assertEqual(Transaction.objects.get().status, 'pending')
+
+    def test_disbursement_is_settled_once(self):
+        transfer = Transaction.objects.create(
+            user=self.user, amount=Decimal("200"), status='pending', transaction_type='Debit',
+            transfer_type='external', transaction_reference="out_1",
+        )
+        success = {"eventType": "SUCCESSFUL_DISBURSEMENT", "eventData": {"reference": "out_1", "status": "SUCCESS", "fee": "10"}}
+        failure = {"eventType": "FAILED_DISBURSEMENT", "eventData": {"reference": "out_1", "status": "FAILED"}}
+        self.deliver(success, url="monnify-out-transfer-webhook")
+        self.deliver(failure, url="monnify-out-transfer-webhook")
+        webhooks.process_pending()
+
+        transfer.refresh_from_db()
+        self.assertEqual((transfer.status, transfer.fee), ('success', Decimal("10.00")))
+        self.assertEqual(
+            dict(WebhookEvent.objects.values_list('event_type', 'status')),
+            {"SUCCESSFUL_DISBURSEMENT": 'processed', "FAILED_DISBURSEMENT": 'ignored'},
+        )
+        # A late failure notice does not refund a transfer that already went through
+        self.assertEqual(balance_of(self.user), Decimal("0.00"))
+
+    def test_disbursement_without_reference_is_rejected(self):
+        for status in ("SUCCESS", "FAILED"):
+            response = APIClient().post(reverse("monnify-out-transfer-webhook"), {
+                "eventType": "SUCCESSFUL_DISBURSEMENT", "eventData": {"transactionReference": "MFDS1", "status": status}
+            }, format="json")
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+
+@skipUnless(connection.vendor == 'postgresql', "Row locks are only exercised on PostgreSQL")
+@override_settings(WEBHOOK_INBOX={**settings.WEBHOOK_INBOX, "PROCESS_ON_COMMIT": False})
+class InterleavedClaimTests(TransactionTestCase):
+    """Two workers claiming at once never split one reference's events between them."""
+
+    def test_second_claimer_waits_for_the_first_claimers_reference(self):
+        for event_type in ("SUCCESSFUL_TRANSACTION", "REVERSED_TRANSACTION"):
+            record_event('funding', event_type, "pay_1", funding_event("pay_1", event_type=event_type))
+        record_event('funding', "SUCCESSFUL_TRANSACTION", "pay_2", funding_event("pay_2"))
+        first = WebhookEvent.objects.order_by('id').first()
+
+        claimed = []
+
+        def claim():
+            try:
+                claimed.extend(webhooks.claim_events(10))
+            finally:
+                connection.close()
+
+        # The first claimer holds its row lock but has not committed the claim yet
+        with db_transaction.atomic():
+            list(WebhookEvent.objects.select_for_update().filter(pk=first.pk))
+            worker = threading.Thread(target=claim)
+            worker.start()
+            worker.join()
+        self.assertEqual([event.reference for event in claimed], ["pay_2"])
+
+
+@override_settings(WEBHOOK_INBOX={**settings.WEBHOOK_INBOX, "PROCESS_ON_COMMIT": False, "SETTLEMENT_MODE": "batch"})
+class FundingBatchSettlementTests(TestCase):
+    """Funding events claimed together are settled in one transaction, falling back to one at a time."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [create_user(f"user{i}@example.com", f"0800000000{i}") for i in range(2)]
+
+    def deposit(self, user, reference, amount="500", paid=None):
+        Transaction.objects.create(
+            user=user, amount=Decimal(amount), status='pending', transaction_type='Deposit',
+            transfer_type='internal', transaction_reference=reference,
+        )
+        record_event('funding', "SUCCESSFUL_TRANSACTION", reference, funding_event(reference, paid or amount))
+
+    def test_batch_credits_each_wallet_by_its_total(self):
+        first, second = self.users
+        self.deposit(first, "pay_1", "500")
+        self.deposit(first, "pay_2", "250")
+        self.deposit(second, "pay_3", "100")
+        record_event('funding', "SUCCESSFUL_TRANSACTION", "pay_9", funding_event("pay_9"))
+
+        self.assertEqual(webhooks.process_pending(), 4)
+        self.assertEqual((balance_of(first), balance_of(second)), (Decimal("750.00"), Decimal("100.00")))
+        self.assertEqual(
+            dict(WebhookEvent.objects.values_list('reference', 'status')),
+            {"pay_1": 'processed', "pay_2": 'processed', "pay_3": 'processed', "pay_9": 'ignored'},
+        )
+        self.assertEqual(set(Transaction.objects.values_list('status', flat=True)), {'success'})
+        self.assertEqual(LedgerJournal.objects.filter(kind='funding').count(), 3)
+        self.assertEqual(rebuild_balances(dry_run=True), [])
+
+    def test_replayed_batch_is_not_credited_again(self):
+        first, _ = self.users
+        self.deposit(first, "pay_1")
+        webhooks.process_pending()
+
+        event = WebhookEvent.objects.get()
+        WebhookEvent.objects.update(status='pending')
+        webhooks.settle_funding_batch([event])
+        self.assertEqual(balance_of(first), Decimal("500.00"))
+        self.assertEqual(WebhookEvent.objects.get().status, 'ignored')
+
+    def test_failed_batch_falls_back_to_one_event_at_a_time(self):
+        first, second = self.users
+        self.deposit(first, "pay_1", "500")
+        self.deposit(second, "pay_2", paid="not a number")
+        self.deposit(second, "pay_3", "100")
+
+        with self.assertLogs("operations.webhooks", "ERROR") as logs:
+            webhooks.process_pending()
+        self.assertIn("applying them one by one", logs.output[0])
+
+        # The bad event fails on its own and the others are settled individually
+        self.assertEqual((balance_of(first), balance_of(second)), (Decimal("500.00"), Decimal("100.00")))
+        self.assertEqual(
+            dict(WebhookEvent.objects.values_list('reference', 'status')),
+            {"pay_1": 'processed', "pay_2": 'pending', "pay_3": 'processed'},
+        )
+        self.assertEqual(rebuild_balances(dry_run=True), [])
+
+
+@override_settings(
+    LIMIT_COUNTERS={**settings.LIMIT_COUNTERS, "BACKEND": "database"},
+    TRANSFER_OUTBOX={**settings.TRANSFER_OUTBOX, "DISPATCH_ON_COMMIT": False},
+)
+class PayoutBatchTests(TestCase):
+    """A batch debits the sender once, credits internal legs at once and sends external legs together."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender = create_user("sender@example.com", "08000000001")
+        cls.recipient = create_user("recipient@example.com", "08000000002", firstname="Bola", lastname="Eze")
+        Wallet.objects.filter(user=cls.recipient).update(monnify_account_number="7000000002")
+        fund(cls.sender, Decimal("1000.00"))
+
+    def setUp(self):
+        patcher = mock.patch("operations.payouts.get_bank_code", return_value=("058", "Guaranty Trust Bank", "JANE DOE"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create(self, *items):
+        return payouts.create_payout_batch(User.objects.get(pk=self.sender.pk), [
+            {"transfer_type": transfer_type, "recipient_account_number": account, "bank_name": "gtbank", "amount": Decimal(amount)}
+            for transfer_type, account, amount in items
+        ])
+
+    def mixed_batch(self):
+        return self.create(
+            ("internal", "7000000002", "100"), ("internal", "7000000002", "50"), ("external", "0123456789", "200"),
+        )
+
+    def test_batch_is_debited_once_and_balances(self):
+        batch = self.mixed_batch()
+        self.assertEqual((batch.status, batch.item_count, batch.total_amount), ('pending', 3, Decimal("350.00")))
+        self.assertEqual((balance_of(self.sender), balance_of(self.recipient)), (Decimal("650.00"), Decimal("150.00")))
+        self.assertEqual(PayoutItem.objects.filter(batch=batch).count(), 3)
+        self.assertEqual(DailyLimitTracker.objects.get(user=self.sender).daily_outflow, Decimal("350.00"))
+        self.assertEqual(DailyLimitTracker.objects.get(user=self.recipient).daily_inflow, Decimal("150.00"))
+        self.assertEqual(
+            LedgerEntry.objects.filter(journal__reference=batch.reference, account='transit').get().amount, Decimal("200.00")
+        )
+        self.assertEqual(rebuild_balances(dry_run=True), [])
+
+    def test_invalid_leg_rejects_the_whole_batch(self):
+        with self.assertRaises(payouts.PayoutItemsError) as raised:
+            self.create(("internal", "7000000002", "100"), ("internal", "7999999999", "50"))
+        self.assertEqual(raised.exception.errors, {1: "Recipient account number not found."})
+        self.assertEqual((balance_of(self.sender), balance_of(self.recipient)), (Decimal("1000.00"), Decimal("0.00")))
+        self.assertFalse(PayoutBatch.objects.exists())
+        self.assertFalse(DailyLimitTracker.objects.filter(daily_outflow__gt=0).exists())
+
+    def test_external_legs_are_submitted_once(self):
+        batch = self.mixed_batch()
+        accepted = FakeMonnifyResponse({"requestSuccessful": True, "responseBody": {"batchStatus": "COMPLETED"}})
+        with mock.patch("operations.payouts.initiate_bulk_transfer", return_value=accepted) as initiate:
+            self.assertEqual(payouts.dispatch_pending_batches(), 1)
+            self.assertEqual(payouts.dispatch_pending_batches(), 0)
+        initiate.assert_called_once()
+        self.assertEqual([leg["amount"] for leg in initiate.call_args.kwargs["transfers"]], [Decimal("200.00")])
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'sent')
+
+    def test_retry_asks_monnify_before_submitting_again(self):
+        self.mixed_batch()
+        with mock.patch("operations.payouts.initiate_bulk_transfer", side_effect=requests.ConnectionError("reset")):
+            payouts.dispatch_pending_batches()
+        PayoutBatch.objects.update(next_attempt_at=timezone.now())
+        known = FakeMonnifyResponse({"requestSuccessful": True, "responseBody": {"batchStatus": "PENDING_AUTHORIZATION"}})
+        with mock.patch("operations.payouts.get_bulk_transfer_status", return_value=known), \
+                mock.patch("operations.payouts.initiate_bulk_transfer") as initiate:
+            payouts.dispatch_pending_batches()
+        initiate.assert_not_called()
+        self.assertEqual(PayoutBatch.objects.get().status, 'awaiting_otp')
+
+    def test_rejected_batch_refunds_external_legs_once(self):
+        batch = self.mixed_batch()
+        rejected = FakeMonnifyResponse({"requestSuccessful": False, "responseMessage": "Insufficient balance"}, status_code=400)
+        with mock.patch("operations.payouts.initiate_bulk_transfer", return_value=rejected):
+            payouts.dispatch_pending_batches()
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'failed')
+
+        # Internal legs stand; only the external leg and its outflow are given back
+        self.assertEqual((balance_of(self.sender), balance_of(self.recipient)), (Decimal("850.00"), Decimal("150.00")))
+        self.assertEqual(DailyLimitTracker.objects.get(user=self.sender).daily_outflow, Decimal("150.00"))
+        external = Transaction.objects.get(payout_item__batch=batch, transfer_type='external')
+        self.assertEqual(external.status, 'failed')
+        self.assertFalse(fail_external_transfer(external))
+        self.assertEqual(balance_of(self.sender), Decimal("850.00"))
+        self.assertEqual(rebuild_balances(dry_run=True), [])
+
+    def settle(self, transaction, status):
+        event_type = "SUCCESSFUL_DISBURSEMENT" if status == "SUCCESS" else "FAILED_DISBURSEMENT"
+        webhooks.apply_disbursement_event({
+            "eventType": event_type, "eventData": {"reference": transaction.transaction_reference, "status": status},
+        })
+
+    def submitted_batch(self):
+        batch = self.create(
+            ("internal", "7000000002", "100"), ("external", "0123456789", "200"), ("external", "0123456788", "50"),
+        )
+        accepted = FakeMonnifyResponse({"requestSuccessful": True, "responseBody": {"batchStatus": "COMPLETED"}})
+        with mock.patch("operations.payouts.initiate_bulk_transfer", return_value=accepted):
+            payouts.dispatch_pending_batches()
+        return batch, list(Transaction.objects.filter(payout_item__batch=batch, transfer_type='external').order_by('pk'))
+
+    def test_batch_completes_when_its_last_external_leg_settles(self):
+        batch, (first, second) = self.submitted_batch()
+        self.settle(first, "SUCCESS")
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'sent')
+        self.settle(second, "SUCCESS")
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'completed')
+
+    def test_batch_with_a_failed_leg_is_partially_failed(self):
+        batch, (first, second) = self.submitted_batch()
+        self.settle(first, "FAILED")
+        self.settle(second, "SUCCESS")
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'partially_failed')
+        self.assertEqual(balance_of(self.sender), Decimal("850.00"))
+
+    def test_bank_lookup_error_rejects_only_that_leg(self):
+        def get_bank_code(bank_name, account_number):
+            if account_number == "0123456788":
+                raise requests.ConnectionError("directory down")
+            return "058", "Guaranty Trust Bank", "JANE DOE"
+
+        with mock.patch("operations.payouts.get_bank_code", side_effect=get_bank_code), \
+                self.assertLogs("operations.payouts", "WARNING"), \
+                self.assertRaises(payouts.PayoutItemsError) as raised:
+            self.create(("external", "0123456789", "200"), ("external", "0123456788", "50"))
+        self.assertEqual(raised.exception.errors, {1: "Could not verify the recipient account. Please try again."})
+        self.assertFalse(PayoutBatch.objects.exists())
+
+    def test_unexpected_errors_count_towards_max_attempts(self):
+        batch = self.mixed_batch()
+        unknown = FakeMonnifyResponse({"requestSuccessful": False, "responseMessage": "Not found"}, status_code=404)
+        with mock.patch("operations.payouts.initiate_bulk_transfer", side_effect=ValueError("bad payload")), \
+                mock.patch("operations.payouts.get_bulk_transfer_status", return_value=unknown), \
+                self.assertLogs("operations.payouts", "ERROR"):
+            payouts.dispatch_pending_batches()
+            batch.refresh_from_db()
+            self.assertEqual((batch.status, batch.attempts, batch.last_error), ('pending', 1, "bad payload"))
+            for _ in range(settings.TRANSFER_OUTBOX["MAX_ATTEMPTS"] - 1):
+                PayoutBatch.objects.update(next_attempt_at=timezone.now())
+                payouts.dispatch_pending_batches()
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'failed')
+        self.assertEqual(balance_of(self.sender), Decimal("850.00"))
+
+    def test_external_legs_are_resolved_off_the_background_pool(self):
+        threads = []
+
+        def get_bank_code(bank_name, account_number):
+            threads.append(threading.current_thread().name)
+            return "058", "Guaranty Trust Bank", "JANE DOE"
+
+        items = [
+            {"transfer_type": "external", "bank_name": "gtbank", "recipient_account_number": f"012345678{i}", "amount": Decimal("100")}
+            for i in range(6)
+        ]
+        with mock.patch("operations.payouts.get_bank_code", side_effect=get_bank_code):
+            legs = payouts.resolve_items(self.sender, items)
+        self.assertEqual([leg["bank_code"] for leg in legs], ["058"] * 6)
+        self.assertTrue(all(name.startswith("payout-resolve") for name in threads), threads)
+
+
+class LedgerTests(TestCase):
+    """Every journal balances, and Wallet.balance can always be rebuilt from the ledger."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("ada@example.com", "08000000001")
+        cls.other = create_user("bola@example.com", "08000000002", firstname="Bola", lastname="Eze")
+
+    def test_unbalanced_journal_is_rejected_whole(self):
+        wallet_id = Wallet.objects.get(user=self.user).pk
+        with self.assertRaises(UnbalancedJournal):
+            post_journals([
+                ("ok", 'funding', [wallet_entry(wallet_id, Decimal("100")), system_entry('funding', Decimal("-100"))]),
+                ("bad", 'funding', [wallet_entry(wallet_id, Decimal("100")), system_entry('funding', Decimal("-99.99"))]),
+            ])
+        self.assertFalse(LedgerJournal.objects.exists())
+        self.assertFalse(LedgerEntry.objects.exists())
+
+    def test_movement_is_posted_once(self):
+        fund(self.user, Decimal("100.00"))
+        with self.assertRaises(IntegrityError), db_transaction.atomic():
+            fund(self.user, Decimal("100.00"))
+        self.assertEqual(balance_of(self.user), Decimal("100.00"))
+        self.assertEqual(LedgerJournal.objects.count(), 1)
+
+    def test_rebuild_corrects_drifted_balances(self):
+        fund(self.user, Decimal("300.00"))
+        fund(self.other, Decimal("50.00"))
+        user_wallet = Wallet.objects.get(user=self.user).pk
+        Wallet.objects.filter(pk=user_wallet).update(balance=Decimal("999.00"))
+
+        self.assertEqual(rebuild_balances(batch_size=1, dry_run=True), [(user_wallet, Decimal("999.00"), Decimal("300.00"))])
+        self.assertEqual(balance_of(self.user), Decimal("999.00"))
+        self.assertEqual(len(rebuild_balances(batch_size=1)), 1)
+        self.assertEqual((balance_of(self.user), balance_of(self.other)), (Decimal("300.00"), Decimal("50.00")))
+        self.assertEqual(rebuild_balances(), [])
+
+
+class BalanceAtTests(TestCase):
+    """Point-in-time balances read from snapshots agree with summing the whole ledger."""
+    counter_accounts = {"opening": "opening", "external_debit": "transit", "funding": "funding"}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("ada@example.com", "08000000001")
+        cls.wallet_id = Wallet.objects.get(user=cls.user).pk
+        cls.today = timezone.localdate()
+        cls.post(cls.today - timedelta(days=3), 10, "opening", Decimal("1000"))
+        cls.post(cls.today - timedelta(days=2), 12, "external_debit", Decimal("-200"))
+        cls.post(cls.today - timedelta(days=1), 9, "funding", Decimal("50"))
+
+    @classmethod
+    def post(cls, day, hour, kind, amount):
+        journal = post_journal(f"{kind}_{day}", kind, [
+            wallet_entry(cls.wallet_id, amount), system_entry(cls.counter_accounts[kind], -amount),
+        ])
+        at = cls.at(day, hour)
+        LedgerJournal.objects.filter(pk=journal.pk).update(created_at=at)
+        LedgerEntry.objects.filter(journal=journal).update(created_at=at)
+
+    def setUp(self):
+        patcher = mock.patch.object(snapshots, "_ledger_start", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def at(day, hour, minute=0):
+        return timezone.make_aware(datetime.combine(day, dt_time(hour, minute)))
+
+    def ledger_sum(self, at):
+        return LedgerEntry.objects.filter(
+            account='wallet', wallet_id=self.wallet_id, created_at__lte=at
+        ).aggregate(total=Sum('amount'))['total'] or Decimal("0.00")
+
+    def test_matches_the_ledger_with_and_without_snapshots(self):
+        instants = [
+            self.at(self.today - timedelta(days=3), 9),
+            self.at(self.today - timedelta(days=3), 10),
+            self.at(self.today - timedelta(days=2), 11, 59),
+            self.at(self.today - timedelta(days=2), 12),
+            day_end(self.today - timedelta(days=2)),
+            self.at(self.today - timedelta(days=1), 9),
+            timezone.now(),
+        ]
+        unsnapshotted = [balance_at(self.wallet_id, at) for at in instants]
+        self.assertEqual([snapshot for _, snapshot in unsnapshotted], [None] * len(instants))
+
+        for days_ago in (3, 2, 1):
+            snapshot_balances(self.today - timedelta(days=days_ago))
+        for at, (before, _) in zip(instants, unsnapshotted):
+            balance, _ = balance_at(self.wallet_id, at)
+            self.assertEqual(balance, self.ledger_sum(at), at)
+            self.assertEqual(balance, before, at)
+
+        self.assertEqual(
+            balance_at(self.wallet_id, self.at(self.today - timedelta(days=1), 10)),
+            (Decimal("850.00"), self.today - timedelta(days=2)),
+        )
+
+    def test_snapshot_is_rewritten_when_rerun(self):
+        day = self.today - timedelta(days=2)
+        snapshot_balances(day)
+        WalletBalanceSnapshot.objects.filter(wallet_id=self.wallet_id, date=day).update(balance=0)
+        snapshot_balances(day)
+        self.assertEqual(WalletBalanceSnapshot.objects.get(wallet_id=self.wallet_id, date=day).balance, Decimal("800.00"))
+
+    def test_times_before_the_ledger_are_refused(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        before = self.at(self.today - timedelta(days=4), 12)
+        response = client.get(reverse("wallet-balance-at"), {"at": before.isoformat()})
+        self.assertEqual(response.status_code, 400)
+
+        response = client.get(reverse("wallet-balance-at"), {"at": self.at(self.today - timedelta(days=2), 13).isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.data["balance"]), Decimal("800.00"))
+
+    def test_ledger_start_is_looked_up_once(self):
+        start = self.at(self.today - timedelta(days=3), 10)
+        self.assertEqual(snapshots.ledger_start(), start)
+        with self.assertNumQueries(0):
+            self.assertEqual(snapshots.ledger_start(), start)
+
+    def test_empty_ledger_is_not_cached(self):
+        LedgerEntry.objects.all().delete()
+        LedgerJournal.objects.all().delete()
+        self.assertIsNone(snapshots.ledger_start())
+        fund(self.user, Decimal("10"))
+        self.assertIsNotNone(snapshots.ledger_start())
+
+
+@skipUnless(connection.vendor == 'postgresql', "Query plans are only checked on PostgreSQL")
+class HotQueryPlanTests(TestCase):
+    """
+    Runs the hot queries through EXPLAIN with sequential scans disabled. If a query
+    still plans a Seq Scan, no index can serve it and it will degrade as tables grow.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create([
+            User(email=f"plan{i}@example.com", firstname="Plan", lastname=str(i), phone_number=f"0900000{i:04d}")
+            for i in range(50)
+        ])
+        cls.user = users[0]
+        cls.wallets = Wallet.objects.bulk_create([
+            Wallet(user=user, monnify_account_number=f"50{i:08d}", accountreference=f"plan-{i}")
+            for i, user in enumerate(users)
+        ])
+        now = timezone.now()
+        transactions = Transaction.objects.bulk_create([
+            Transaction(
+                user=users[i % 50],
+                amount=100,
+                transaction_type=['Deposit', 'Debit', 'Credit'][i % 3],
+                status='pending' if i % 20 == 0 else 'success',
+                transaction_reference=f"plan_{i}",
+            )
+            for i in range(2000)
+        ])
+        TransferOutbox.objects.bulk_create([
+            TransferOutbox(
+                transaction=txn, bank_code="058", bank_name="GTBank", destination_account_number="0123456789",
+                amount=100, status='pending' if i % 10 == 0 else 'sent',
+            )
+            for i, txn in enumerate(transactions[:500])
+        ])
+        WebhookEvent.objects.bulk_create([
+            WebhookEvent(source='funding', event_type='SUCCESSFUL_TRANSACTION', reference=f"plan_{i}", payload={},
+                         status='pending' if i % 10 == 0 else 'processed')
+            for i in range(500)
+        ])
+        TierUpgradeRequest.objects.bulk_create([
+            TierUpgradeRequest(user=user, current_tier='tier 1', requested_tier='tier 2', bvn=f"22{i:08d}")
+            for i, user in enumerate(users)
+        ])
+        journal = LedgerJournal.objects.create(reference="plan", kind='opening')
+        LedgerEntry.objects.bulk_create([
+            LedgerEntry(journal=journal, wallet=cls.wallets[i % 50], amount=1) for i in range(500)
+        ] + [LedgerEntry(journal=journal, account='opening', amount=-500)])
+        WalletBalanceSnapshot.objects.bulk_create([
+            WalletBalanceSnapshot(wallet=wallet, date=(now - timedelta(days=1)).date(), balance=10)
+            for wallet in cls.wallets
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET enable_seqscan = off")
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute("RESET enable_seqscan")
+
+    def assertUsesIndex(self, queryset):
+        plan = queryset.explain()
+        table = queryset.model._meta.db_table
+        self.assertNotIn(f"Seq Scan on {table}", plan, plan)
+
+    def test_transaction_history_page(self):
+        self.assertUsesIndex(Transaction.objects.filter(user=self.user).order_by('-created_at', '-id')[:21])
+
+    def test_transaction_history_by_type(self):
+        self.assertUsesIndex(
+            Transaction.objects.filter(user=self.user, transaction_type='Deposit').order_by('-created_at', '-id')[:21]
+        )
+
+    def test_transaction_by_reference(self):
+        self.assertUsesIndex(Transaction.objects.filter(transaction_reference="plan_10", transaction_type='Deposit'))
+
+    def test_pending_transactions_sweep(self):
+        self.assertUsesIndex(Transaction.objects.filter(status='pending', created_at__lt=timezone.now()))
+
+    def test_outbox_claim(self):
+        now = timezone.now()
+        self.assertUsesIndex(
+            TransferOutbox.objects.filter(
+                Q(status='pending', next_attempt_at__lte=now) | Q(status='dispatching', updated_at__lt=now)
+            ).order_by('next_attempt_at')[:20]
+        )
+
+    def test_payout_batch_claim(self):
+        now = timezone.now()
+        self.assertUsesIndex(
+            PayoutBatch.objects.filter(
+                Q(status='pending', next_attempt_at__lte=now) | Q(status='dispatching', updated_at__lt=now)
+            ).order_by('next_attempt_at')[:20]
+        )
+
+    def test_webhook_claim(self):
+        self.assertUsesIndex(WebhookEvent.objects.filter(status='pending').order_by('id')[:100])
+        self.assertUsesIndex(WebhookEvent.objects.filter(status='processing', claimed_at__gte=timezone.now()))
+
+    def test_tier_upgrade_lookups(self):
+        self.assertUsesIndex(TierUpgradeRequest.objects.filter(user=self.user, status='pending'))
+        self.assertUsesIndex(TierUpgradeRequest.objects.filter(bvn="2200000001"))
+
+    def test_wallet_by_account_number(self):
+        self.assertUsesIndex(Wallet.objects.filter(monnify_account_number="5000000001"))
+
+    def test_admin_changelists(self):
+        self.assertUsesIndex(Transaction.objects.order_by('-created_at', '-id')[:100])
+        self.assertUsesIndex(Transaction.objects.filter(status='failed').order_by('-created_at', '-id')[:100])
+        self.assertUsesIndex(TierUpgradeRequest.objects.filter(status='pending').order_by('-submitted_at')[:100])
+        self.assertUsesIndex(Wallet.objects.filter(tier='tier 2').order_by('-id')[:100])
+
+    def test_point_in_time_balance(self):
+        wallet = self.wallets[0]
+        self.assertUsesIndex(
+            WalletBalanceSnapshot.objects.filter(wallet=wallet, date__lte=timezone.now().date()).order_by('-date')[:1]
+        )
+        self.assertUsesIndex(
+            LedgerEntry.objects.filter(account='wallet', wallet=wallet, created_at__gte=timezone.now() - timedelta(days=1))
+        )
+
+
+@override_settings(
+    LIMIT_COUNTERS={**settings.LIMIT_COUNTERS, "BACKEND": "database"},
+    TRANSFER_OUTBOX={**settings.TRANSFER_OUTBOX, "DISPATCH_ON_COMMIT": False},
+    WEBHOOK_INBOX={**settings.WEBHOOK_INBOX, "PROCESS_ON_COMMIT": False},
+)
+class OperationsQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Each endpoint in operations/urls.py, held to its QUERY_BUDGETS entry."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender = User.objects.create_user(
+            email="sender@example.com", firstname="Ada", lastname="Obi", password="pass12345", phone_number="08000000001"
+        )
+        cls.recipient = User.objects.create_user(
+            email="recipient@example.com", firstname="Bola", lastname="Eze", password="pass12345", phone_number="08000000002"
+        )
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com", firstname="Admin", lastname="User", password="pass12345", phone_number="08000000003"
+        )
+        with mock.patch("auth_system.provisioning.create_reserved_account", side_effect=reserved_account):
+            provision_pending()
+        Wallet.objects.filter(user=cls.sender).update(balance=Decimal("40000.00"))
+
+    def setUp(self):
+        self.client = self.client_for(self.sender)
+        patcher = mock.patch("operations.views.monnify_request", return_value=FakeMonnifyResponse({
+            "requestSuccessful": True, "responseBody": {"checkoutUrl": "https://checkout.example.com"}
+        }))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for target in ("operations.views.get_bank_code", "operations.payouts.get_bank_code"):
+            patcher = mock.patch(target, return_value=("058", "Guaranty Trust Bank", "JANE DOE"))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        return client
+
+    def account_of(self, user):
+        return Wallet.objects.get(user=user).monnify_account_number
+
+    def external_transfer(self):
+        response = self.client.post(reverse("send-money"), {
+            "recipient_account_number": "0123456789", "amount": "200",
+            "transfer_type": "external", "bank_name": "gtbank"
+        }, format="json")
+        return response.data["transaction_reference"]
+
+    def payout_batch(self):
+        response = self.client.post(reverse("payout-batch"), {"items": [
+            {"recipient_account_number": self.account_of(self.recipient), "amount": "100"},
+            {"recipient_account_number": "0123456789", "amount": "150", "transfer_type": "external", "bank_name": "gtbank"},
+        ]}, format="json")
+        return response.data["batch_reference"]
+
+    def test_every_url_has_a_budget(self):
+        self.assertBudgetsCover("operations.urls")
+
+    def test_send_money_internal(self):
+        with self.assertQueryBudget("send-money"):
+            response = self.client.post(reverse("send-money"), {
+                "recipient_account_number": self.account_of(self.recipient), "amount": "100"
+            }, format="json")
+        self.assertEqual(response.status_code, 201)
+
+    def test_send_money_external(self):
+        with self.assertQueryBudget("send-money"):
+            response = self.client.post(reverse("send-money"), {
+                "recipient_account_number": "0123456789", "amount": "100",
+                "transfer_type": "external", "bank_name": "gtbank"
+            }, format="json")
+        self.assertEqual(response.status_code, 202)
+
+    def test_name_enquiry(self):
+        with mock.patch("operations.views.bank_directory.lookup", return_value={"name": "GTBank", "code": "058"}), \
+                mock.patch("operations.views.beneficiary_cache.resolve", return_value="JANE DOE"):
+            with self.assertQueryBudget("name-enquiry"):
+                response = self.client.post(reverse("name-enquiry"), {
+                    "bank_name": "gtbank", "account_number": "0123456789"
+                }, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_payout_batch(self):
+        with self.assertQueryBudget("payout-batch"):
+            self.payout_batch()
+
+    def test_payout_batch_status(self):
+        reference = self.payout_batch()
+        with self.assertQueryBudget("payout-batch-status"):
+            response = self.client.get(reverse("payout-batch-status", args=[reference]))
+        self.assertEqual(len(response.data["items"]), 2)
+
+    def test_payout_batch_otp(self):
+        reference = self.payout_batch()
+        with self.assertQueryBudget("payout-batch-otp"):
+            response = self.client.post(reverse("payout-batch-otp", args=[reference]), {"otp": "123456"}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_transfer_status(self):
+        reference = self.external_transfer()
+        with self.assertQueryBudget("transfer-status"):
+            response = self.client.get(reverse("transfer-status", args=[reference]))
+        self.assertEqual(response.data["dispatch_status"], "pending")
+
+    def test_request_tier_upgrade(self):
+        with self.assertQueryBudget("request-tier-upgrade"):
+            response = self.client.post(reverse("request-tier-upgrade"), {"bvn": "2212345678"}, format="json")
+        self.assertEqual(response.status_code, 201)
+
+    def test_review_tier_upgrade(self):
+        upgrade = TierUpgradeRequest.objects.create(
+            user=self.sender, current_tier="tier 1", requested_tier="tier 2", bvn="2212345678"
+        )
+        with self.assertQueryBudget("review-tier-upgrade"):
+            response = self.client_for(self.admin).patch(
+                reverse("review-tier-upgrade", args=[upgrade.pk]), {"action": "approve"}, format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_upgrade_requests(self):
+        TierUpgradeRequest.objects.bulk_create([
+            TierUpgradeRequest(user=user, current_tier="tier 1", requested_tier="tier 2")
+            for user in (self.sender, self.recipient)
+        ])
+        with self.assertQueryBudget("list-upgrade-requests"):
+            response = self.client_for(self.admin).get(reverse("list-upgrade-requests"))
+        self.assertEqual(len(response.data), 2)
+
+    def test_monnify_webhook(self):
+        with self.assertQueryBudget("monnify-webhook"):
+            response = APIClient().post(reverse("monnify-webhook"), {
+                "eventType": "SUCCESSFUL_TRANSACTION",
+                "eventData": {"paymentReference": "ref", "transactionReference": "MNFY", "amountPaid": "100", "paymentStatus": "PAID"}
+            }, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_fund_wallet(self):
+        with self.assertQueryBudget("fund-wallet"):
+            response = self.client.post(reverse("fund-wallet"), {"amount": "500"}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_monnify_out_transfer_webhook(self):
+        with self.assertQueryBudget("monnify-out-transfer-webhook"):
+            response = APIClient().post(reverse("monnify-out-transfer-webhook"), {
+                "eventType": "SUCCESSFUL_DISBURSEMENT", "eventData": {"reference": "ref", "status": "SUCCESS"}
+            }, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_transfer_otp(self):
+        reference = self.external_transfer()
+        with self.assertQueryBudget("otp-verification-for-external-transfer"):
+            response = self.client.post(
+                reverse("otp-verification-for-external-transfer", args=[reference]), {"otp": "123456"}, format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_user_transactions(self):
+        Transaction.objects.bulk_create([
+            Transaction(user=self.sender, amount=100, status="success", transaction_reference=f"budget_{i}")
+            for i in range(30)
+        ])
+        with self.assertQueryBudget("user-transactions"):
+            response = self.client.get(reverse("user-transactions"))
+        self.assertEqual(len(response.data["results"]), 20)
+
+    def test_transaction_statement(self):
+        Transaction.objects.bulk_create([
+            Transaction(user=self.sender, amount=100, status="success", transaction_reference=f"budget_{i}")
+            for i in range(30)
+        ])
+        with self.assertQueryBudget("transaction-statement"):
+            response = self.client.get(reverse("transaction-statement"))
+            rows = b"".join(response.streaming_content).splitlines()
+        self.assertEqual(len(rows), 33)
+
+    def test_wallet_balance_at(self):
+        with self.assertQueryBudget("wallet-balance-at"):
+            response = self.client.get(reverse("wallet-balance-at"), {"at": timezone.now().isoformat()})
+        self.assertEqual(response.status_code, 200)
+
+
+class UploadPipelineTests(TestCase):
+    """KYC documents are spooled during the request and uploaded afterwards."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="kyc@example.com", firstname="Ada", lastname="Obi", password="pass12345", phone_number="08000000001"
+        )
+        cls.user.wallet.tier = "tier 2"
+        cls.user.wallet.save(update_fields=['tier'])
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com", firstname="Admin", lastname="User", password="pass12345", phone_number="08000000003"
+        )
+
+    def setUp(self):
+        spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool_dir, ignore_errors=True)
+        settings_override = override_settings(UPLOAD_SPOOL={
+            **settings.UPLOAD_SPOOL, "DIR": spool_dir, "UPLOAD_ON_COMMIT": False, "MAX_ATTEMPTS": 2
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def request_tier_3(self):
+        response = self.client.post(reverse("request-tier-upgrade"), {
+            "id_type": "nin",
+            "id_document_file": SimpleUploadedFile("id.pdf", b"%PDF-1.4 id", content_type="application/pdf"),
+            "utility_bill_file": SimpleUploadedFile("bill.png", b"bill", content_type="image/png"),
+        }, format="multipart")
+        self.assertEqual(response.status_code, 201, response.data)
+        return TierUpgradeRequest.objects.get(pk=response.data["id"])
+
+    def test_documents_are_uploaded_after_the_request(self):
+        upgrade = self.request_tier_3()
+        self.assertIsNone(upgrade.id_document)
+        uploads = list(PendingUpload.objects.order_by('field'))
+        self.assertEqual([upload.field for upload in uploads], ["id_document", "utility_bill"])
+        self.assertTrue(all(os.path.exists(upload.path) for upload in uploads))
+
+        with mock.patch("operations.uploads.upload_large_to_cloudinary",
+                        side_effect=lambda path, folder_name, filename, chunk_size: f"https://cdn.example.com/{folder_name}/{filename}"):
+            self.assertEqual(process_pending(), 2)
+
+        upgrade.refresh_from_db()
+        self.assertEqual(upgrade.id_document, "https://cdn.example.com/tier3_ids/id.pdf")
+        self.assertEqual(upgrade.utility_bill, "https://cdn.example.com/tier3_utility_bills/bill.png")
+        self.assertFalse(any(os.path.exists(upload.path) for upload in uploads))
+
+    def test_failed_uploads_retry_then_give_up(self):
+        upgrade = self.request_tier_3()
+        with mock.patch("operations.uploads.upload_large_to_cloudinary", side_effect=Exception("timeout")):
+            process_pending()
+            self.assertEqual(set(PendingUpload.objects.values_list('status', flat=True)), {"pending"})
+
+            admin = APIClient()
+            admin.force_authenticate(self.admin)
+            response = admin.patch(reverse("review-tier-upgrade", args=[upgrade.pk]), {"action": "approve"}, format="json")
+            self.assertEqual(response.status_code, 409)
+
+            PendingUpload.objects.update(next_attempt_at=timezone.now())
+            process_pending()
+        self.assertEqual(set(PendingUpload.objects.values_list('status', flat=True)), {"failed"})
+        self.assertTrue(all(os.path.exists(path) for path in PendingUpload.objects.values_list('path', flat=True)))
+
+    def test_unexpected_errors_count_towards_max_attempts(self):
+        entry = spool_upload(SimpleUploadedFile("a.png", b"avatar", content_type="image/png"), 'user', self.user.pk, 'image', folder="avatars")
+        with mock.patch("operations.uploads.upload_large_to_cloudinary", return_value="https://cdn.example.com/a.png"), \
+                mock.patch("operations.uploads._superseded", side_effect=ValueError("lock lost")), \
+                self.assertLogs("operations.uploads", "ERROR"):
+            self.assertEqual(process_pending(), 1)
+            entry.refresh_from_db()
+            self.assertEqual((entry.status, entry.attempts, entry.last_error), ('pending', 1, "lock lost"))
+            PendingUpload.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(process_pending(), 1)
+        self.assertEqual(PendingUpload.objects.get().status, 'failed')
+
+    def test_error_after_the_upload_is_recorded_keeps_it_done(self):
+        spool_upload(SimpleUploadedFile("a.png", b"avatar", content_type="image/png"), 'user', self.user.pk, 'image', folder="avatars")
+        with mock.patch("operations.uploads.upload_large_to_cloudinary", return_value="https://cdn.example.com/a.png"), \
+                mock.patch("operations.uploads.os.remove", side_effect=PermissionError("busy")), \
+                self.assertLogs("operations.uploads", "ERROR"):
+            process_pending()
+        self.assertEqual(PendingUpload.objects.get().status, 'done')
+
+    def test_failed_processing_leaves_no_spool_file(self):
+        def processor(file, out):
+            out.write(b"partial")
+            raise ValueError("not an image")
+
+        with self.assertRaises(ValueError):
+            spool_upload(SimpleUploadedFile("a.png", b"avatar"), 'user', self.user.pk, 'image', folder="avatars", processor=processor)
+        self.assertEqual(os.listdir(settings.UPLOAD_SPOOL["DIR"]), [])
+        self.assertFalse(PendingUpload.objects.exists())
+
+    def test_middle_chunks_are_sent_in_parallel_between_the_first_and_last(self):
+        path = os.path.join(settings.UPLOAD_SPOOL["DIR"], "large.pdf")
+        with open(path, "wb") as file:
+            file.write(b"0123456789")
+        parts = []
+
+        def upload_large_part(file, http_headers, **options):
+            parts.append((http_headers["Content-Range"], file[1], options.get("public_id"), threading.current_thread().name))
+            return {"public_id": "kyc/large", "secure_url": "https://cdn.example.com/kyc/large.pdf"}
+
+        with mock.patch("cloudinary.uploader.upload_large_part", side_effect=upload_large_part):
+            url = upload_large_to_cloudinary(path, folder_name="kyc", filename="large.pdf", chunk_size=3)
+        self.assertEqual(url, "https://cdn.example.com/kyc/large.pdf")
+        self.assertEqual(parts[0][:3], ("bytes 0-2/10", b"012", None))
+        self.assertEqual(parts[-1][:3], ("bytes 9-9/10", b"9", "kyc/large"))
+        self.assertEqual(
+            sorted(part[:3] for part in parts[1:-1]),
+            [("bytes 3-5/10", b"345", "kyc/large"), ("bytes 6-8/10", b"678", "kyc/large")],
+        )
+        self.assertTrue(all(part[3].startswith("upload-chunks") for part in parts[1:-1]))
+
+    def test_older_file_finishing_last_does_not_overwrite_newer(self):
+        older, newer = [
+            spool_upload(SimpleUploadedFile(name, b"avatar", content_type="image/png"), 'user', self.user.pk, 'image', folder="avatars")
+            for name in ("old.png", "new.png")
+        ]
+        with mock.patch("operations.uploads.upload_large_to_cloudinary",
+                        side_effect=lambda path, folder_name, filename, chunk_size: f"https://cdn.example.com/{filename}"):
+            upload(newer.pk)
+            upload(older.pk)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.image, f"https://cdn.example.com/{newer.filename}")
+        self.assertEqual(set(PendingUpload.objects.values_list('status', flat=True)), {"done"})
+
+
+@override_settings(ADMIN_PAGINATION={"ESTIMATE_ABOVE": 100000, "MAX_COUNT": 30})
+class AdminChangelistTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email="ops@example.com", firstname="Ops", lastname="Staff", password="pass12345",
+            phone_number="08000000009", is_staff=True, is_admin=True, is_superuser=True,
+        )
+        users = User.objects.bulk_create([
+            User(email=f"list{i}@example.com", firstname="List", lastname=str(i), phone_number=f"0910000{i:04d}")
+            for i in range(40)
+        ])
+        Transaction.objects.bulk_create([
+            Transaction(user=user, amount=100, status='failed' if i % 2 else 'success', transaction_reference=f"list_{i}")
+            for i, user in enumerate(users)
+        ])
+        TierUpgradeRequest.objects.bulk_create([
+            TierUpgradeRequest(user=user, current_tier='tier 1', requested_tier='tier 2') for user in users
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_rows_do_not_query_their_users(self):
+        # Session, admin user, count and one joined query for the rows, however many there are
+        for name in ("admin:operations_transaction_changelist", "admin:operations_tierupgraderequest_changelist"):
+            with self.assertNumQueries(4):
+                response = self.client.get(reverse(name))
+            self.assertContains(response, "list39@example.com")
+
+    def test_filtered_counts_are_capped(self):
+        response = self.client.get(reverse("admin:operations_transaction_changelist"), {"status__exact": "failed"})
+        self.assertEqual(response.context["cl"].result_count, 20)
+        response = self.client.get(reverse("admin:operations_transaction_changelist"), {"q": "list_7"})
+        self.assertEqual(response.context["cl"].result_count, 1)
+
+        response = self.client.get(reverse("admin:operations_tierupgraderequest_changelist"), {"status__exact": "pending"})
+        self.assertEqual(response.context["cl"].result_count, 30)
+
+
+@override_settings(VOLUME_ROLLUPS={**settings.VOLUME_ROLLUPS, "SHARDS": 4})
+class DailyRollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email="ops@example.com", firstname="Ops", lastname="Staff", password="pass12345",
+            phone_number="08000000009", is_staff=True, is_admin=True, is_superuser=True,
+        )
+        cls.user = User.objects.create_user(
+            email="ada@example.com", firstname="Ada", lastname="Obi", password="pass12345", phone_number="08000000001"
+        )
+
+    def transaction(self, reference, status='pending', transaction_type='Debit', transfer_type='external', amount=100):
+        return Transaction.objects.create(
+            user=self.user, amount=amount, status=status, transaction_type=transaction_type,
+            transfer_type=transfer_type, transaction_reference=reference,
+        )
+
+    def totals(self):
+        return {
+            (row['transaction_type'], row['transfer_type'], row['status']): (row['count'], row['amount'], row['fees'])
+            for row in DailyVolumeRollup.objects.values('transaction_type', 'transfer_type', 'status')
+            .annotate(count=Sum('count'), amount=Sum('amount'), fees=Sum('fees'))
+        }
+
+    def test_settlements_are_added_to_the_day(self):
+        rollups.record([self.transaction("pending_1")])
+        self.assertFalse(DailyVolumeRollup.objects.exists())
+
+        for i in range(6):
+            complete_external_transfer(self.transaction(f"ext_{i}"), fee=Decimal("10.00"))
+        fail_external_transfer(self.transaction("ext_failed"))
+        rollups.record([
+            self.transaction(f"int_{i}", status='success', transfer_type='internal', amount=50) for i in range(3)
+        ])
+
+        self.assertEqual(self.totals(), {
+            ('Debit', 'external', 'success'): (6, Decimal("600.00"), Decimal("60.00")),
+            ('Debit', 'external', 'failed'): (1, Decimal("100.00"), Decimal("0.00")),
+            ('Debit', 'internal', 'success'): (3, Decimal("150.00"), Decimal("0.00")),
+        })
+
+        incremental = self.totals()
+        self.assertEqual(rollups.rebuild_day(timezone.now().date()), 3)
+        self.assertEqual(self.totals(), incremental)
+
+    def test_dashboard_reads_only_rollups(self):
+        rollups.record([
+            self.transaction("dep_1", status='success', transaction_type='Deposit', transfer_type='internal', amount=5000),
+            self.transaction("dep_2", status='failed', transaction_type='Deposit', transfer_type='internal'),
+        ])
+        Wallet.objects.filter(user=self.user).update(tier='tier 2', balance=250)
+        self.assertEqual(rollups.snapshot_tiers(), 2)
+
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("admin:operations_dailyvolumerollup_changelist"), {"days": 7})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries if 'operations_transaction' in query['sql']])
+        self.assertFalse([query for query in queries if 'auth_system_wallet' in query['sql']])
+
+        today = response.context["volumes"][0]
+        self.assertEqual((today["inflow"], today["success"], today["failed"]), (Decimal("5000.00"), 1, 1))
+        self.assertEqual(len(response.context["volumes"]), 7)
+        self.assertEqual(
+            [(tier["tier"], tier["wallets"]) for tier in response.context["tiers"]], [("tier 1", 1), ("tier 2", 1)]
+        )
+
+
+@override_settings(MONNIFY_TOKEN_SHARED_CACHE=True, MONNIFY_TOKEN_REFRESH_MARGIN=120)
+class MonnifyTokenRefreshTests(TestCase):
+    """Workers share one Monnify token through Redis and only one of them logs in per refresh."""
+
+    def setUp(self):
+        self.redis = CounterRedis()
+        patcher = mock.patch("auth_system.redis_client.redis", self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.logins = []
+
+    def worker(self):
+        manager = MonnifyTokenManager()
+        manager.lock_timeout = 0.5
+        manager.lock_poll_interval = 0.05
+
+        def login():
+            self.logins.append(manager)
+            return f"token-{len(self.logins)}", 3600
+        manager._login = login
+        return manager
+
+    def test_only_one_worker_logs_in_inside_the_refresh_margin(self):
+        first, second = self.worker(), self.worker()
+        self.assertEqual(first.get_token(), "token-1")
+        self.assertEqual(second.get_token(), "token-1")
+
+        # Both workers reach the refresh margin; the first one to take the lock logs in
+        for manager in (first, second):
+            manager._expires_at = time.time() + 60
+        shared = json.loads(self.redis.data[MonnifyTokenManager.cache_key])
+        self.redis.data[MonnifyTokenManager.cache_key] = json.dumps({**shared, "expires_at": time.time() + 60})
+        first._background_refresh()
+        second._background_refresh()
+
+        self.assertEqual(len(self.logins), 2)
+        self.assertEqual((first._token, second._token), ("token-2", "token-2"))
+        self.assertNotIn(MonnifyTokenManager.lock_key, self.redis.data)
+
+    def test_waits_for_the_worker_holding_the_lock(self):
+        self.redis.data[MonnifyTokenManager.lock_key] = "1"
+        manager = self.worker()
+        threading.Timer(0.1, lambda: self.redis.set(MonnifyTokenManager.cache_key, json.dumps({
+            "token": "from-other-worker", "expires_at": time.time() + 3600,
+        }))).start()
+        self.assertEqual(manager.get_token(), "from-other-worker")
+        self.assertEqual(self.logins, [])
+
+    def test_logs_in_when_the_lock_holder_never_shares_a_token(self):
+        self.redis.data[MonnifyTokenManager.lock_key] = "1"
+        self.assertEqual(self.worker().get_token(), "token-1")
+        # The lock was never this worker's, so it is left for its holder
+        self.assertEqual(self.redis.data[MonnifyTokenManager.lock_key], "1")
+
+    def test_lock_taken_over_by_another_worker_is_not_released(self):
+        manager = self.worker()
+
+        def slow_login():
+            # This worker's lock expires mid-login and another worker takes it
+            self.redis.data[MonnifyTokenManager.lock_key] = "other-worker"
+            return "token-1", 3600
+        manager._login = slow_login
+        self.assertEqual(manager.get_token(), "token-1")
+        self.assertEqual(self.redis.data[MonnifyTokenManager.lock_key], "other-worker")
+
+    def test_waiting_for_another_worker_does_not_block_this_process(self):
+        self.redis.data[MonnifyTokenManager.lock_key] = "1"
+        manager = self.worker()
+        manager.lock_timeout = 5
+        waiter = threading.Thread(target=manager.get_token)
+        waiter.start()
+        time.sleep(0.1)
+        self.assertTrue(manager._lock.acquire(timeout=0.1))
+        manager._lock.release()
+
+        self.redis.set(MonnifyTokenManager.cache_key, json.dumps({
+            "token": "from-other-worker", "expires_at": time.time() + 3600,
+        }))
+        waiter.join(timeout=2)
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(manager._token, "from-other-worker")
+        self.assertEqual(self.logins, [])
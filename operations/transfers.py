@@ -0,0 +1,150 @@
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import F
+from auth_system import read_models
+from auth_system.models import Wallet
+from . import limits, rollups
+from .ledger import post_journal, system_entry, wallet_entry, wallet_ids_for_users
+from .limits import LimitReservation
+from .models import Transaction
+
+
+class TransferError(Exception):
+    """Raised when a transfer cannot be applied. The message is safe to return to the client."""
+
+
+def lock_wallets(*wallet_ids):
+    """
+    Locks the given wallets in primary-key order and returns them keyed by id.
+    Every transfer locks in the same order, so two opposite transfers between
+    the same wallets queue behind each other instead of deadlocking.
+    """
+    wallets = Wallet.objects.select_for_update().filter(pk__in=wallet_ids).order_by('pk')
+    return {wallet.pk: wallet for wallet in wallets}
+
+
+def debit_wallet(wallet_id, amount):
+    updated = Wallet.objects.filter(pk=wallet_id, balance__gte=amount).update(balance=F('balance') - amount)
+    if not updated:
+        raise TransferError("Insufficient funds.")
+
+
+def credit_wallet(wallet_id, amount, max_balance=None):
+    wallets = Wallet.objects.filter(pk=wallet_id)
+    if max_balance is not None:
+        wallets = wallets.filter(balance__lte=Decimal(max_balance) - amount)
+    if not wallets.update(balance=F('balance') + amount):
+        raise TransferError("Recipient's wallet balance limit exceeded.")
+
+
+def execute_internal_transfer(sender, sender_wallet, recipient, recipient_wallet, amount, description, reference):
+    """
+    Moves amount between two wallets. Daily limits are consumed first, then in one
+    database transaction both wallets are locked, balances change through
+    conditional F() updates, and the debit/credit Transaction rows are written in
+    one insert. Limits counted in Redis are released again if anything fails.
+    """
+    rules = settings.TIER_RULES.get(sender_wallet.tier.lower())
+    recipient_rules = settings.TIER_RULES.get(recipient_wallet.tier.lower())
+    if not rules:
+        raise TransferError(f"No rules defined for tier '{sender_wallet.tier.lower()}'")
+    if not recipient_rules:
+        raise TransferError(f"No rules defined for tier '{recipient_wallet.tier.lower()}'")
+
+    reservation = LimitReservation()
+    try:
+        with db_transaction.atomic():
+            if not reservation.consume(sender.id, "outflow", amount, rules["daily_outflow"]):
+                raise TransferError("Daily outflow limit exceeded.")
+            if not reservation.consume(recipient.id, "inflow", amount, recipient_rules["daily_inflow"]):
+                raise TransferError("recipient's daily Inflow limit exceeded.")
+
+            lock_wallets(sender_wallet.pk, recipient_wallet.pk)
+            debit_wallet(sender_wallet.pk, amount)
+            credit_wallet(recipient_wallet.pk, amount, max_balance=recipient_rules["max_balance"])
+
+            sender_name = f"{sender.firstname} {sender.lastname}"
+            recipient_name = f"{recipient.firstname} {recipient.lastname}"
+            rows = Transaction.objects.bulk_create([
+                Transaction(
+                    user=sender,
+                    sender_name=sender_name,
+                    recipient_name=recipient_name,
+                    transfer_type='internal',
+                    amount=amount,
+                    status='success',
+                    bank_name="Monniepoint",
+                    description=description,
+                    transaction_reference=reference + "_debit",
+                    transaction_type="Debit"
+                ),
+                Transaction(
+                    user=recipient,
+                    sender_name=sender_name,
+                    recipient_name=recipient_name,
+                    transfer_type='internal',
+                    amount=amount,
+                    status='success',
+                    bank_name="Monniepoint",
+                    description=description,
+                    transaction_reference=reference + "_credit",
+                    transaction_type="Credit"
+                ),
+            ])
+            post_journal(reference, 'transfer', [
+                wallet_entry(sender_wallet.pk, -amount),
+                wallet_entry(recipient_wallet.pk, amount),
+            ])
+            rollups.record(rows)
+            read_models.invalidate(sender.id, recipient.id)
+    except Exception:
+        reservation.release_all()
+        raise
+
+
+def debit_external_transfer(wallet_id, amount, reference, user_id):
+    """Debits the sender for an external transfer; the amount is in transit until Monnify settles it."""
+    debit_wallet(wallet_id, amount)
+    read_models.invalidate(user_id)
+    post_journal(reference, 'external_debit', [
+        wallet_entry(wallet_id, -amount),
+        system_entry('transit', amount),
+    ])
+
+
+def complete_external_transfer(transaction, fee):
+    """Marks a pending external transfer successful. Repeated success notices are harmless."""
+    with db_transaction.atomic():
+        updated = Transaction.objects.filter(pk=transaction.pk, status='pending').update(status='success', fee=fee)
+        if updated:
+            post_journal(transaction.transaction_reference, 'external_settled', [
+                system_entry('transit', -transaction.amount),
+                system_entry('payout', transaction.amount),
+            ])
+            transaction.status, transaction.fee = 'success', fee
+            rollups.record([transaction])
+    return bool(updated)
+
+
+def fail_external_transfer(transaction):
+    """
+    Marks a pending external transfer failed, refunds the sender and gives back the
+    outflow it used. Does nothing if the transfer was already settled, so repeated
+    failure notices are harmless.
+    """
+    with db_transaction.atomic():
+        updated = Transaction.objects.filter(pk=transaction.pk, status='pending').update(status='failed')
+        if updated:
+            wallet_id = wallet_ids_for_users([transaction.user_id])[transaction.user_id]
+            Wallet.objects.filter(pk=wallet_id).update(balance=F('balance') + transaction.amount)
+            post_journal(transaction.transaction_reference, 'external_refund', [
+                system_entry('transit', -transaction.amount),
+                wallet_entry(wallet_id, transaction.amount),
+            ])
+            transaction.status = 'failed'
+            rollups.record([transaction])
+            read_models.invalidate(transaction.user_id)
+    if updated:
+        limits.release(transaction.user_id, "outflow", transaction.amount, day=transaction.created_at.date())
+    return bool(updated)
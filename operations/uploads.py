@@ -0,0 +1,211 @@
+import logging
+import os
+import random
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, transaction as db_transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from auth_system import read_models
+from auth_system.authentication import invalidate_principal
+from auth_system.models import User
+from utilities.background import run_in_background
+from utilities.cloudinary_helper import upload_large_to_cloudinary
+from .models import PendingUpload, TierUpgradeRequest
+
+logger = logging.getLogger(__name__)
+
+# Rows an upload may write its URL back to, and the fields it may set on them
+TARGETS = {
+    'user': (User, {'image'}),
+    'tier_upgrade': (TierUpgradeRequest, {'id_document', 'utility_bill'}),
+}
+
+
+def spool_upload(file, target, target_id, field, folder, processor=None):
+    """
+    Writes an uploaded file to the spool directory and queues it for Cloudinary.
+    Call it inside the atomic block that saves the target row, so the upload is
+    only queued if the row commits; files left behind by a rollback are removed
+    by purge_orphans.
+
+    `processor(file, out)`, when given, writes a transformed copy to `out` instead
+    of the original and returns the extension of what it wrote.
+    """
+    model, fields = TARGETS[target]
+    if field not in fields:
+        raise ValueError(f"{model.__name__}.{field} is not an upload field")
+
+    spool_dir = settings.UPLOAD_SPOOL["DIR"]
+    os.makedirs(spool_dir, exist_ok=True)
+    filename = os.path.basename(file.name or "upload")
+    stem, extension = os.path.splitext(filename)
+    spool_name = uuid.uuid4().hex
+    try:
+        with open(os.path.join(spool_dir, spool_name), "wb") as spooled:
+            if processor is not None:
+                extension = processor(file, spooled)
+                filename = f"{stem}{extension}"
+            else:
+                for chunk in file.chunks():
+                    spooled.write(chunk)
+        path = os.path.join(spool_dir, f"{spool_name}{extension}")
+        os.rename(os.path.join(spool_dir, spool_name), path)
+    except Exception:
+        # Nothing refers to a half-written file; do not leave it for purge_orphans
+        try:
+            os.remove(os.path.join(spool_dir, spool_name))
+        except FileNotFoundError:
+            pass
+        raise
+
+    entry = PendingUpload.objects.create(
+        target=target, target_id=target_id, field=field, folder=folder,
+        path=path, filename=filename, size=os.path.getsize(path),
+    )
+    if settings.UPLOAD_SPOOL["UPLOAD_ON_COMMIT"]:
+        db_transaction.on_commit(lambda: run_in_background(process_pending))
+    return entry
+
+
+def has_pending_uploads(target, target_id):
+    return PendingUpload.objects.filter(
+        target=target, target_id=target_id, status__in=['pending', 'uploading']
+    ).exists()
+
+
+def claim_uploads(limit):
+    """
+    Marks up to `limit` due uploads as uploading and returns their ids, with the same
+    SKIP LOCKED claiming and stale-entry recovery as the transfer outbox.
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=settings.UPLOAD_SPOOL["STALE_AFTER"])
+    with db_transaction.atomic():
+        ids = list(
+            PendingUpload.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status='pending', next_attempt_at__lte=now)
+                | Q(status='uploading', updated_at__lt=stale_before)
+            )
+            .order_by('next_attempt_at')
+            .values_list('id', flat=True)[:limit]
+        )
+        if ids:
+            PendingUpload.objects.filter(id__in=ids).update(
+                status='uploading', attempts=F('attempts') + 1, updated_at=now
+            )
+    return ids
+
+
+def process_pending(limit=None, pool=None):
+    """Claims a batch of due uploads and pushes them, on `pool` if one is given."""
+    ids = claim_uploads(limit or settings.UPLOAD_SPOOL["BATCH_SIZE"])
+    if pool is not None:
+        list(pool.map(upload, ids))
+    else:
+        for entry_id in ids:
+            upload(entry_id)
+    return len(ids)
+
+
+def upload(entry_id):
+    close_old_connections()
+    entry = None
+    try:
+        entry = PendingUpload.objects.get(pk=entry_id)
+        if not os.path.exists(entry.path):
+            _mark(entry, 'failed', last_error="Spooled file is missing.")
+            return
+        try:
+            url = upload_large_to_cloudinary(
+                entry.path, folder_name=entry.folder, filename=entry.filename,
+                chunk_size=settings.UPLOAD_SPOOL["CHUNK_SIZE"],
+            )
+        except Exception as e:
+            _retry_or_fail(entry, str(e))
+            return
+
+        model, _ = TARGETS[entry.target]
+        with db_transaction.atomic():
+            # Locking the target serializes uploads to it, so a retried older file that
+            # finishes after a newer one cannot overwrite the newer URL
+            target = model.objects.select_for_update().filter(pk=entry.target_id)
+            list(target.values_list('pk', flat=True))
+            if _superseded(entry):
+                logger.info(
+                    "Not writing upload %s: a newer file for %s.%s is already in place", entry.pk, entry.target, entry.field
+                )
+            else:
+                target.update(**{entry.field: url})
+            _mark(entry, 'done', url=url, last_error=None)
+            if entry.target == 'user':
+                read_models.invalidate(entry.target_id)
+                invalidate_principal(entry.target_id)
+        os.remove(entry.path)
+    except Exception as e:
+        logger.exception("Uploading spooled file %s failed", entry_id)
+        if entry is not None:
+            _retry_after_error(entry, str(e))
+    finally:
+        close_old_connections()
+
+
+def _superseded(entry):
+    """Whether a file spooled after this one for the same field has already been written."""
+    return PendingUpload.objects.filter(
+        target=entry.target, target_id=entry.target_id, field=entry.field, status='done', pk__gt=entry.pk
+    ).exists()
+
+
+def _mark(entry, status, **fields):
+    PendingUpload.objects.filter(pk=entry.pk).update(status=status, updated_at=timezone.now(), **fields)
+
+
+def _retry_or_fail(entry, error):
+    if entry.attempts >= settings.UPLOAD_SPOOL["MAX_ATTEMPTS"]:
+        # The spooled file is kept so the upload can be retried by hand
+        _mark(entry, 'failed', last_error=error)
+        return
+    _mark(entry, 'pending', last_error=error, next_attempt_at=backoff_until(entry.attempts))
+
+
+def _retry_after_error(entry, error):
+    """
+    Counts an unexpected error as a failed attempt, unless the upload was already
+    recorded as done before it; if recording the attempt fails too, stale recovery
+    claims the upload again.
+    """
+    if not PendingUpload.objects.filter(pk=entry.pk, status='uploading').exists():
+        return
+    try:
+        _retry_or_fail(entry, error)
+    except Exception:
+        logger.exception("Recording the failed upload of spooled file %s failed", entry.pk)
+
+
+def backoff_until(attempts):
+    config = settings.UPLOAD_SPOOL
+    delay = min(config["BACKOFF_MAX"], config["BACKOFF_BASE"] * (2 ** (attempts - 1)))
+    return timezone.now() + timedelta(seconds=delay + random.uniform(0, delay / 2))
+
+
+def purge_orphans():
+    """Deletes spooled files no upload row refers to, once they are older than STALE_AFTER. Returns how many."""
+    spool_dir = settings.UPLOAD_SPOOL["DIR"]
+    if not os.path.isdir(spool_dir):
+        return 0
+    cutoff = timezone.now().timestamp() - settings.UPLOAD_SPOOL["STALE_AFTER"]
+    candidates = {
+        entry.path for entry in os.scandir(spool_dir)
+        if entry.is_file() and entry.stat().st_mtime < cutoff
+    }
+    if not candidates:
+        return 0
+    known = set(
+        PendingUpload.objects.filter(path__in=candidates).exclude(status='done').values_list('path', flat=True)
+    )
+    for path in candidates - known:
+        os.remove(path)
+    return len(candidates - known)
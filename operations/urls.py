@@ -4,11 +4,18 @@ from .views import (
     ApproveTierUpgradeView, ListUpgradeRequestsView, 
     MonnifyWebhookView, GenerateMonnifyPaymentLink, 
     ApproveTransferOTPView, MonnifyOutTransferWebhook,
-    UserTransactionsView
+    UserTransactionsView, NameEnquiryView, TransferStatusView,
+    TransactionStatementView, PayoutBatchView, PayoutBatchStatusView,
+    ApprovePayoutBatchOTPView, WalletBalanceAtView
     )
 
 urlpatterns = [
     path('transfer/', SendMoneyView.as_view(), name='send-money'),
+    path('transfer/name-enquiry/', NameEnquiryView.as_view(), name='name-enquiry'),
+    path('transfer/batch/', PayoutBatchView.as_view(), name='payout-batch'),
+    path('transfer/batch/<str:reference>/', PayoutBatchStatusView.as_view(), name='payout-batch-status'),
+    path('transfer/batch/<str:reference>/otp/', ApprovePayoutBatchOTPView.as_view(), name='payout-batch-otp'),
+    path('transfer/<str:reference>/status/', TransferStatusView.as_view(), name='transfer-status'),
     path('kyc/upgrade/tier/', RequestTierUpgradeView.as_view(), name='request-tier-upgrade'),
     path('admin/upgrade/<int:pk>/review/', ApproveTierUpgradeView.as_view(), name='review-tier-upgrade'),
     path('admin/upgrade/requests/', ListUpgradeRequestsView.as_view(), name='list-upgrade-requests'),
@@ -17,4 +24,6 @@ urlpatterns = [
     path('transfer/webhook/', MonnifyOutTransferWebhook.as_view(), name='monnify-out-transfer-webhook'),
     path('otp/verify/<str:reference>/', ApproveTransferOTPView.as_view(), name="otp-verification-for-external-transfer"),
     path('transactions/', UserTransactionsView.as_view(), name='user-transactions'),
+    path('transactions/statement/', TransactionStatementView.as_view(), name='transaction-statement'),
+    path('wallet/balance/history/', WalletBalanceAtView.as_view(), name='wallet-balance-at'),
 ]
\ No newline at end of file
@@ -1,26 +1,42 @@
 from rest_framework.response import Response
-from .models import Transaction, DailyLimitTracker, TierUpgradeRequest
+from .models import Transaction, TierUpgradeRequest, TransferOutbox, PayoutBatch
 from rest_framework.views import APIView, status
 from django.db import transaction as db_transaction
 from .serializers import (
     TransferSerializer, TierUpgradeSerializer,
     TierApprovalActionSerializer, FundWalletSerializer, 
-    MonnifyFundWebhookSerializer, MonnifySendWebhookSerializer, OtpAuthorizeSerializer, TransactionSerializer)
+    MonnifyFundWebhookSerializer, MonnifySendWebhookSerializer, OtpAuthorizeSerializer, TransactionSerializer,
+    NameEnquirySerializer, TransactionHistoryQuerySerializer, StatementExportQuerySerializer,
+    PayoutBatchSerializer, BalanceAtQuerySerializer)
 import uuid
 from rest_framework import serializers, generics
 from django.utils import timezone
 from django.conf import settings
 from rest_framework.permissions import BasePermission, IsAuthenticated
-import requests
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
-from decimal import Decimal
-from utilities.monnify_helper import get_monnify_token, get_bank_code, initiate_transfer
-from utilities.services import handle_monnify_response
-from auth_system.models import Wallet
+from utilities.monnify_helper import monnify_request, get_bank_code
+from .outbox import enqueue_external_transfer
+from .payouts import PayoutItemsError, create_payout_batch
+from .webhooks import record_event
+from .uploads import has_pending_uploads
+from .pagination import TransactionCursorPagination
+from .statements import stream_csv, stream_ndjson
+from .snapshots import balance_at, ledger_start
+from auth_system.authentication import WalletJWTAuthentication
+from auth_system.models import User as CustomUser
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from .transfers import TransferError, execute_internal_transfer, debit_external_transfer
+from . import limits
+from .limits import LimitReservation, LimitsUnavailable
+from utilities.bank_directory import bank_directory
+from utilities.beneficiary_cache import beneficiary_cache
 from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiExample
 from drf_spectacular.types import OpenApiTypes
 
+LIMITS_UNAVAILABLE = "Daily limits cannot be checked right now. Please try again shortly."
+
 # Create your views here.
 ## Permissions 
 class IsAdmin(BasePermission):
@@ -36,41 +52,14 @@ class MonnifyOutTransferWebhook(APIView):
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
-        data = serializer.validated_data["eventData"]
-        event_type = serializer.validated_data["eventType"]
-
-        transaction_ref = data.get('reference')
-
-        try:
-            deposit = Transaction.objects.get(transaction_reference=transaction_ref)
-
-            # Webhook idempotency check
-            if deposit.status != "pending":
-                return Response({"message": "Already processed."}, status=200)
-
-            if event_type != "SUCCESSFUL_DISBURSEMENT":
-                sender = deposit.sender
-
-                sender_wallet = Wallet.objects.get(sender=sender)
-                sender_wallet.balance += deposit.amount
-                sender_wallet.save()
-                return Response({"message": "Not a successful transaction event"}, status=200)
-            tracker, _ = DailyLimitTracker.objects.get_or_create(user=deposit.user)
-            tracker.reset_if_new_day()
-            tracker.daily_outflow += Decimal(data["amount"])
-            tracker.save()
-            if data.get('status') == "SUCCESS":
-                with db_transaction.atomic():
-                    deposit.status = "success"
-                    deposit.fee = float(data["fee"])
-                    deposit.save()
-            else:
-                deposit.status = "failed"
-                deposit.save()
-
-            return Response({"message": "Processed"}, status=200)
-        except Transaction.DoesNotExist:
-            return Response({"error": "Transaction not found."}, status=404)
+        # Settlement happens in process_webhook_events; here we only store the event
+        record_event(
+            source='disbursement',
+            event_type=serializer.validated_data["eventType"],
+            reference=serializer.validated_data["eventData"]["reference"],
+            payload=serializer.validated_data,
+        )
+        return Response({"message": "Received"}, status=200)
 
 @extend_schema(
     summary="Approve transfer OTP",
@@ -108,21 +97,23 @@ class ApproveTransferOTPView(APIView):
         serializer.is_valid(raise_exception=True)
         otp = serializer.validated_data["otp"]
 
-        url = f"{settings.MONNIFY_BASE_URL}api/v2/disbursements/single/validate-otp"
-        access_token = get_monnify_token()
         headers = {
-            "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json"
-        }  
+        }
         payload = {
             "reference": reference,
             "authorizationCode": otp
             }
 
-        response = requests.post(url, json=payload, headers=headers)
+        response = monnify_request(
+            "POST", "api/v2/disbursements/single/validate-otp", json=payload, headers=headers
+        )
         data = response.json()
 
         if data.get("requestSuccessful"):
+            TransferOutbox.objects.filter(
+                transaction__transaction_reference=reference, status='awaiting_otp'
+            ).update(status='sent', updated_at=timezone.now())
             return Response({"message": "OTP approved. Await webhook for transaction update."}, status=200)
         return Response({"error": "OTP verification failed.", "monnify_response": data}, status=400)
 
@@ -142,6 +133,17 @@ class ApproveTransferOTPView(APIView):
                 request_only=False
             )]
         ),
+        202: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="External transfer queued.",
+            examples=[OpenApiExample(
+                "Queued",
+                value={"message": "Transfer queued for processing.", "transaction_reference": "12_ab12cd34ef", "status": "pending"},
+                summary="Queued",
+                response_only=True,
+                request_only=False
+            )]
+        ),
         400: OpenApiResponse(
             response=OpenApiTypes.OBJECT,
             description="Validation error.",
@@ -153,6 +155,15 @@ class ApproveTransferOTPView(APIView):
                 request_only=False
             )]
         ),
+        503: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Daily limit counters unavailable.",
+            examples=[OpenApiExample(
+                "Limits unavailable",
+                value={"error": "Daily limits cannot be checked right now. Please try again shortly."},
+                summary="Limits unavailable"
+            )]
+        ),
     },
 )
 
@@ -160,6 +171,7 @@ class ApproveTransferOTPView(APIView):
 class SendMoneyView(APIView):
     serializer_class = TransferSerializer
     permission_classes = [IsAuthenticated]
+    authentication_classes = [WalletJWTAuthentication]
 
     def post(self, request):
         serializer = self.serializer_class(data=request.data, context={'request': request})
@@ -176,67 +188,31 @@ class SendMoneyView(APIView):
         recipient = serializer.validated_data.get('recipient_user')
         destination_account_number = serializer.validated_data['destination_account_number']
 
-        tracker, _ = DailyLimitTracker.objects.get_or_create(user=sender)
-        tracker.reset_if_new_day()
-
         tier = sender_wallet.tier.lower()
         rules = settings.TIER_RULES.get(tier)
         if not rules:
             return Response({"error": f"No rules defined for tier '{tier}'"}, status=400)
 
-        if tracker.daily_outflow + amount > rules["daily_outflow"]:
-            return Response({"error": "Daily outflow limit exceeded."}, status=400)
-
         if sender_wallet.balance < amount:
             return Response({"error": "Insufficient funds."}, status=400)
 
         reference = f"{sender.id}_{uuid.uuid4().hex[:10]}"
 
         if transfer_type == "internal":
-            recipient_tier = recipient_wallet.tier.lower()
-            recipient_rules = settings.TIER_RULES.get(recipient_tier)
-            if recipient_wallet.balance + amount > recipient_rules["max_balance"]:
-                return Response({"error": "Recipient's wallet balance limit exceeded."}, status=400)
-            r_tracker, _ = DailyLimitTracker.objects.get_or_create(user=recipient)
-            r_tracker.reset_if_new_day()
-            if r_tracker.daily_inflow + amount > recipient_rules["daily_inflow"]:
-                return Response({"error": "recipient's daily Inflow limit exceeded."}, status=400)
-            r_tracker.daily_inflow += amount
-            r_tracker.save()
-            
-            with db_transaction.atomic():
-                sender_wallet.balance -= amount
-                recipient_wallet.balance += amount
-                sender_wallet.save()
-                recipient_wallet.save()
-
-                tracker.daily_outflow += amount
-                tracker.save()
-
-                Transaction.objects.create(
-                    user=sender,
-                    sender_name=f"{sender.firstname} {sender.lastname}",
-                    recipient_name=f"{recipient.firstname} {recipient.lastname}",
-                    transfer_type='internal',
-                    amount=amount,
-                    status='success',
-                    bank_name="Monniepoint",
-                    description=description,
-                    transaction_reference=reference + "_debit",
-                    transaction_type="Debit"
-                )
-                Transaction.objects.create(
-                    user=recipient,
-                    sender_name=f"{sender.firstname} {sender.lastname}",
-                    recipient_name=f"{recipient.firstname} {recipient.lastname}",
-                    transfer_type='internal',
+            try:
+                execute_internal_transfer(
+                    sender=sender,
+                    sender_wallet=sender_wallet,
+                    recipient=recipient,
+                    recipient_wallet=recipient_wallet,
                     amount=amount,
-                    status='success',
-                    bank_name="Monniepoint",
                     description=description,
-                    transaction_reference=reference + "_credit",
-                    transaction_type="Credit"
+                    reference=reference
                 )
+            except TransferError as e:
+                return Response({"error": str(e)}, status=400)
+            except LimitsUnavailable:
+                return Response({"error": LIMITS_UNAVAILABLE}, status=503)
 
             return Response({"message": "Transaction successful", "reference": reference}, status=201)
 
@@ -248,43 +224,319 @@ class SendMoneyView(APIView):
             if not bank_code:
                 return Response({"error": f"Bank code for '{bank_name}' not found."}, status=400)
 
-            with db_transaction.atomic():
-                sender_wallet.balance -= amount
-                sender_wallet.save()
+            # Outflow is reserved now and given back if the transfer fails
+            reservation = LimitReservation()
+            try:
+                if not reservation.consume(sender.id, "outflow", amount, rules["daily_outflow"]):
+                    return Response({"error": "Daily outflow limit exceeded."}, status=400)
+            except LimitsUnavailable:
+                return Response({"error": LIMITS_UNAVAILABLE}, status=503)
 
-                Transaction.objects.create(
-                    user=sender,
-                    sender_name=f"{sender.firstname} {sender.lastname}",
-                    recipient_name=recipient_name.title() if recipient_name else bank_title,
-                    transfer_type='external',
-                    amount=amount,
-                    status='pending',
-                    source_account_number=sender_wallet.monnify_account_number,
-                    destination_account_number=destination_account_number,
-                    bank_name=bank_title,
-                    description=description,
-                    transaction_reference=reference
-                )
+            try:
+                with db_transaction.atomic():
+                    debit_external_transfer(sender_wallet.pk, amount, reference, sender.id)
+
+                    transaction = Transaction.objects.create(
+                        user=sender,
+                        sender_name=f"{sender.firstname} {sender.lastname}",
+                        recipient_name=recipient_name.title() if recipient_name else bank_title,
+                        transfer_type='external',
+                        amount=amount,
+                        status='pending',
+                        source_account_number=sender_wallet.monnify_account_number,
+                        destination_account_number=destination_account_number,
+                        bank_name=bank_title,
+                        description=description,
+                        transaction_reference=reference
+                    )
+
+                    # Monnify is called by the outbox worker once this commits
+                    enqueue_external_transfer(
+                        transaction=transaction,
+                        bank_code=bank_code,
+                        bank_name=bank_name,
+                        destination=destination_account_number,
+                        narration=description
+                    )
+            except TransferError as e:
+                reservation.release_all()
+                return Response({"error": str(e)}, status=400)
+            except Exception:
+                reservation.release_all()
+                raise
 
-                response = initiate_transfer(
-                    amount=amount,
-                    reference=reference,
-                    bank_name=bank_name,
-                    description=description,
-                    destination=destination_account_number,
-                    bank_code=bank_code
-                )
+            return Response({
+                "message": "Transfer queued for processing.",
+                "transaction_reference": reference,
+                "status": "pending"
+            }, status=202)
 
-                return handle_monnify_response(
-                    response=response,
-                    reference=reference,
-                )
-            return Response({"error": "External transfers not supported in this version."}, status=400)
+@extend_schema(
+    summary="Resolve beneficiary account name",
+    description="Looks up the account name for an external bank account. Results are cached, so calling this before /transfer/ makes the transfer itself faster.",
+    request=NameEnquirySerializer,
+    responses={
+        200: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Account resolved.",
+            examples=[OpenApiExample(
+                "Resolved",
+                value={"bank_code": "058", "bank_name": "Guaranty Trust Bank", "account_number": "0123456789", "account_name": "JOHN DOE"},
+                summary="Resolved"
+            )]
+        ),
+        404: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Account could not be resolved.",
+            examples=[OpenApiExample(
+                "Not found",
+                value={"error": "Account name could not be resolved."},
+                summary="Not found"
+            )]
+        ),
+    },
+)
+
+# Beneficiary Name Enquiry Endpoint
+class NameEnquiryView(APIView):
+    serializer_class = NameEnquirySerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        bank_name = serializer.validated_data["bank_name"]
+        account_number = serializer.validated_data["account_number"]
+
+        bank = bank_directory.lookup(bank_name)
+        if not bank:
+            return Response({"error": f"Bank code for '{bank_name}' not found."}, status=400)
+
+        account_name = beneficiary_cache.resolve(bank["code"], account_number)
+        if not account_name:
+            return Response({"error": "Account name could not be resolved."}, status=404)
+
+        return Response({
+            "bank_code": bank["code"],
+            "bank_name": bank["name"],
+            "account_number": account_number,
+            "account_name": account_name
+        }, status=200)
+
+@extend_schema(
+    summary="Get transfer status",
+    description="Returns the status of a transfer and of its dispatch to Monnify. Poll this after an external transfer is queued; otp_required means the OTP must be submitted to /otp/verify/<reference>/.",
+    responses={
+        200: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Transfer status.",
+            examples=[OpenApiExample(
+                "Awaiting OTP",
+                value={"transaction_reference": "12_ab12cd34ef", "status": "pending", "dispatch_status": "awaiting_otp", "otp_required": True},
+                summary="Awaiting OTP"
+            )]
+        ),
+    },
+)
+
+# Transfer Status Endpoint
+class TransferStatusView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, reference):
+        transaction = Transaction.objects.filter(
+            user=request.user, transaction_reference=reference
+        ).select_related('outbox').first()
+        if transaction is None:
+            return Response({"error": "Transaction not found."}, status=404)
+
+        outbox = getattr(transaction, 'outbox', None)
+        return Response({
+            "transaction_reference": transaction.transaction_reference,
+            "status": transaction.status,
+            "dispatch_status": outbox.status if outbox else None,
+            "otp_required": bool(outbox and outbox.status == 'awaiting_otp')
+        }, status=200)
+
+@extend_schema(
+    summary="Send a batch of transfers",
+    description=(
+        "Sends money to up to PAYOUT_BATCH['MAX_ITEMS'] beneficiaries in one request. All items are validated "
+        "before anything is applied; internal items settle immediately and external items are sent to Monnify "
+        "as one bulk disbursement. Poll /transfer/batch/<reference>/ for per-item results."
+    ),
+    request=PayoutBatchSerializer,
+    responses={
+        202: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Batch accepted.",
+            examples=[OpenApiExample(
+                "Accepted",
+                value={"message": "Batch accepted.", "batch_reference": "12_b1a2b3c4d5", "status": "pending", "item_count": 2, "total_amount": "15000.00"},
+                summary="Accepted"
+            )]
+        ),
+        400: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Batch rejected.",
+            examples=[OpenApiExample(
+                "Invalid items",
+                value={"error": "Some payout items are invalid.", "items": {"1": "Recipient account number not found."}},
+                summary="Invalid items"
+            )]
+        ),
+        503: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Daily limit counters unavailable.",
+            examples=[OpenApiExample(
+                "Limits unavailable",
+                value={"error": "Daily limits cannot be checked right now. Please try again shortly."},
+                summary="Limits unavailable"
+            )]
+        ),
+    },
+)
+
+# Batch Transfer Endpoint
+class PayoutBatchView(APIView):
+    serializer_class = PayoutBatchSerializer
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [WalletJWTAuthentication]
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            batch = create_payout_batch(
+                sender=request.user,
+                items=serializer.validated_data["items"],
+                description=serializer.validated_data.get("description", "")
+            )
+        except PayoutItemsError as e:
+            return Response({"error": str(e), "items": e.errors}, status=400)
+        except TransferError as e:
+            return Response({"error": str(e)}, status=400)
+        except LimitsUnavailable:
+            return Response({"error": LIMITS_UNAVAILABLE}, status=503)
+
+        return Response({
+            "message": "Batch accepted.",
+            "batch_reference": batch.reference,
+            "status": batch.status,
+            "item_count": batch.item_count,
+            "total_amount": batch.total_amount
+        }, status=202)
+
+@extend_schema(
+    summary="Get batch transfer status",
+    description="Returns the dispatch status of a payout batch and the result of each item.",
+    responses={
+        200: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Batch status.",
+            examples=[OpenApiExample(
+                "Sent",
+                value={
+                    "batch_reference": "12_b1a2b3c4d5", "status": "sent", "otp_required": False,
+                    "total_amount": "15000.00", "item_count": 2,
+                    "summary": {"success": 1, "pending": 1},
+                    "items": [
+                        {"transaction_reference": "12_b1a2b3c4d5_0_debit", "transfer_type": "internal", "recipient_account_number": "5000000001", "amount": "5000.00", "status": "success"},
+                        {"transaction_reference": "12_b1a2b3c4d5_1", "transfer_type": "external", "recipient_account_number": "0123456789", "amount": "10000.00", "status": "pending"}
+                    ]
+                },
+                summary="Sent"
+            )]
+        ),
+    },
+)
+
+# Batch Transfer Status Endpoint
+class PayoutBatchStatusView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, reference):
+        batch = PayoutBatch.objects.filter(user=request.user, reference=reference).first()
+        if batch is None:
+            return Response({"error": "Batch not found."}, status=404)
+
+        items = (
+            Transaction.objects.filter(payout_item__batch=batch)
+            .order_by('payout_item__id')
+            .values('transaction_reference', 'transfer_type', 'destination_account_number', 'amount', 'status')
+        )
+        results, summary = [], {}
+        for item in items:
+            summary[item["status"]] = summary.get(item["status"], 0) + 1
+            results.append({
+                "transaction_reference": item["transaction_reference"],
+                "transfer_type": item["transfer_type"],
+                "recipient_account_number": item["destination_account_number"],
+                "amount": item["amount"],
+                "status": item["status"]
+            })
+
+        return Response({
+            "batch_reference": batch.reference,
+            "status": batch.status,
+            "otp_required": batch.status == 'awaiting_otp',
+            "total_amount": batch.total_amount,
+            "item_count": batch.item_count,
+            "summary": summary,
+            "items": results
+        }, status=200)
+
+@extend_schema(
+    summary="Approve batch transfer OTP",
+    description="Verifies the OTP authorizing the external items of a payout batch.",
+    request=OtpAuthorizeSerializer,
+    responses={
+        200: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="OTP approved.",
+            examples=[OpenApiExample(
+                "OTP approved",
+                value={"message": "OTP approved. Await webhook for transaction update."},
+                summary="OTP approved"
+            )]
+        ),
+    },
+)
+
+# Batch Transfer OTP Endpoint
+class ApprovePayoutBatchOTPView(APIView):
+    serializer_class = OtpAuthorizeSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, reference):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        batch = get_object_or_404(PayoutBatch, user=request.user, reference=reference)
+
+        headers = {
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "reference": batch.reference,
+            "authorizationCode": serializer.validated_data["otp"]
+            }
+
+        response = monnify_request(
+            "POST", "api/v2/disbursements/batch/validate-otp", json=payload, headers=headers
+        )
+        data = response.json()
+
+        if data.get("requestSuccessful"):
+            PayoutBatch.objects.filter(pk=batch.pk, status='awaiting_otp').update(status='sent', updated_at=timezone.now())
+            return Response({"message": "OTP approved. Await webhook for transaction update."}, status=200)
+        return Response({"error": "OTP verification failed.", "monnify_response": data}, status=400)
 
 # Request Tier Upgrade Endpoint
 class RequestTierUpgradeView(generics.CreateAPIView):
     serializer_class = TierUpgradeSerializer
     permission_classes = [IsAuthenticated]
+    authentication_classes = [WalletJWTAuthentication]
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -309,6 +561,8 @@ class ApproveTierUpgradeView(generics.UpdateAPIView):
             return Response({"error": "Request already processed."}, status=400)
 
         action = serializer.validated_data['action']
+        if action == 'approve' and has_pending_uploads('tier_upgrade', upgrade_request.pk):
+            return Response({"error": "Documents are still uploading."}, status=409)
         upgrade_request.status = 'approved' if action == 'approve' else 'rejected'
         upgrade_request.reviewed_at = timezone.now()
         upgrade_request.save()
@@ -359,6 +613,15 @@ class ListUpgradeRequestsView(generics.ListAPIView):
                 request_only=False
             )]
         ),
+        503: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Daily limit counters unavailable.",
+            examples=[OpenApiExample(
+                "Limits unavailable",
+                value={"error": "Daily limits cannot be checked right now. Please try again shortly."},
+                summary="Limits unavailable"
+            )]
+        ),
     },
 )
 
@@ -366,17 +629,20 @@ class ListUpgradeRequestsView(generics.ListAPIView):
 class GenerateMonnifyPaymentLink(APIView):
     serializer_class = FundWalletSerializer
     permission_classes = [IsAuthenticated]
+    authentication_classes = [WalletJWTAuthentication]
 
     def post(self, request):
         serializer = FundWalletSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         amount = serializer.validated_data['amount']
         user = request.user
-        tracker, _ = DailyLimitTracker.objects.get_or_create(user=user)
-        tracker.reset_if_new_day()
         tier = user.wallet.tier.lower()
         rules = settings.TIER_RULES.get(tier)
-        if tracker.daily_inflow + amount > rules["daily_inflow"]:
+        try:
+            inflow = limits.current(user.id, "inflow")
+        except LimitsUnavailable:
+            return Response({"error": LIMITS_UNAVAILABLE}, status=503)
+        if inflow + amount > rules["daily_inflow"]:
             return Response({"error": "Daily Inflow limit exceeded."}, status=400)
         if user.wallet.balance + amount > rules["max_balance"]:
             return Response({"error": "wallet balance limit exceeded."}, status=400)
@@ -403,14 +669,13 @@ class GenerateMonnifyPaymentLink(APIView):
             "currencyCode": "NGN",
             "contractCode": settings.MONNIFY_CONTRACT_CODE
         }
-        access_token = get_monnify_token()
         headers = {
-            "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json"
         }
 
-        response = requests.post(
-            f"{settings.MONNIFY_BASE_URL}api/v1/merchant/transactions/init-transaction",
+        response = monnify_request(
+            "POST",
+            "api/v1/merchant/transactions/init-transaction",
             json=payload,
             headers=headers
         )
@@ -434,76 +699,160 @@ class MonnifyWebhookView(APIView):
     def post(self, request):
         serializer = MonnifyFundWebhookSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        data = serializer.validated_data["eventData"]
-        event_type = serializer.validated_data["eventType"]
-
-        payment_ref = data.get('paymentReference')
-        transaction_ref = data.get('transactionReference')
-        amount_paid = data.get('amountPaid')
-        payment_status = data.get('paymentStatus')
-
-        try:
-            deposit = Transaction.objects.get(transaction_reference=payment_ref, transaction_type='Deposit')
-            deposit.transaction_reference = transaction_ref
-             
-            if deposit.status != "pending":
-                return Response({"message": "Already processed."}, status=200)
-
-            if event_type != "SUCCESSFUL_TRANSACTION":
-                return Response({"message": "Not a successful transaction event"}, status=200)
-
-            if payment_status == "PAID":
-                with db_transaction.atomic():
-                    deposit.status = "success"
-                    deposit.save()
-
-                    wallet = deposit.user.wallet
-                    wallet.balance += Decimal(str(amount_paid))
-                    wallet.save()
-
-
-            else:
-                deposit.status = "failed"
-                deposit.save()
-
-            return Response({"message": "Processed"}, status=200)
-
-        except Transaction.DoesNotExist:
-            return Response({"error": "Transaction not found."}, status=404)
+        # Settlement happens in process_webhook_events; here we only store the event
+        record_event(
+            source='funding',
+            event_type=serializer.validated_data["eventType"],
+            reference=serializer.validated_data["eventData"]["paymentReference"],
+            payload=serializer.validated_data,
+        )
+        return Response({"message": "Received"}, status=200)
 
 # User Transactions View
 class UserTransactionsView(APIView):
     permission_classes = [IsAuthenticated]
     serializer_class = TransactionSerializer
+    pagination_class = TransactionCursorPagination
 
     @extend_schema(
     summary="List user transactions",
-    description="Returns a list of transactions for the authenticated user.",
+    description=(
+        "Returns the authenticated user's transactions, newest first, one page at a time. "
+        "Follow `next` (or pass `next_cursor` as `cursor`) for the next page. "
+        "Use `fields` for a comma-separated subset of fields."
+    ),
+    parameters=[TransactionHistoryQuerySerializer],
     responses={
         200: OpenApiResponse(
             response=TransactionSerializer,
-            description="List of transactions.",
+            description="Page of transactions.",
             examples=[OpenApiExample(
                 "Transaction list",
-                value=[
-                    {
-                        "id": 1,
-                        "amount": "1000.00",
-                        "status": "success",
-                        "transaction_type": "Debit",
-                        "created_at": "2025-07-21T12:00:00Z"
-                    }
-                ],
+                value={
+                    "next": "https://api.example.com/api/transactions/?cursor=MjAyNS0wNy0yMVQxMjowMDowMCswMDowMHwx",
+                    "next_cursor": "MjAyNS0wNy0yMVQxMjowMDowMCswMDowMHwx",
+                    "results": [
+                        {
+                            "id": 1,
+                            "amount": "1000.00",
+                            "status": "success",
+                            "transaction_type": "Debit",
+                            "created_at": "2025-07-21T12:00:00Z"
+                        }
+                    ]
+                },
                 summary="Transactions"
             )]
         ),
     },
 )
     def get(self, request):
+        query = TransactionHistoryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        filters = query.validated_data
+
+        transactions = Transaction.objects.filter(user=request.user)
+        if filters.get('transaction_type'):
+            transactions = transactions.filter(transaction_type=filters['transaction_type'])
+        if filters.get('status'):
+            transactions = transactions.filter(status=filters['status'])
+        if filters.get('transfer_type'):
+            transactions = transactions.filter(transfer_type=filters['transfer_type'])
+        if filters.get('start_date'):
+            transactions = transactions.filter(created_at__gte=filters['start_date'])
+        if filters.get('end_date'):
+            transactions = transactions.filter(created_at__lte=filters['end_date'])
+        if filters.get('min_amount') is not None:
+            transactions = transactions.filter(amount__gte=filters['min_amount'])
+        if filters.get('max_amount') is not None:
+            transactions = transactions.filter(amount__lte=filters['max_amount'])
+
+        fields = filters.get('fields')
+        if fields:
+            # created_at and id are always loaded because the cursor is built from them
+            transactions = transactions.only(*set(fields) | {'id', 'created_at'})
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(transactions, request, view=self)
+        data = self.serializer_class(page, many=True, fields=fields).data
+        return paginator.get_paginated_response(data)
+
+# Transaction Statement Export View
+class TransactionStatementView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Export account statement",
+        description=(
+            "Streams the user's transactions for a date range as CSV or NDJSON, oldest first, "
+            "with opening and closing balance lines. Admins may pass user_id to export another user's statement."
+        ),
+        parameters=[StatementExportQuerySerializer],
+        responses={200: OpenApiResponse(response=OpenApiTypes.BINARY, description="Statement file.")},
+    )
+    def get(self, request):
+        query = StatementExportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
         user = request.user
-        sent_transactions = Transaction.objects.filter(user=user).order_by('-created_at')
-        sent_data = self.serializer_class(sent_transactions, many=True).data
-        return Response(
-            sent_data, status=status.HTTP_200_OK
-            )
+        if params.get('user_id') and params['user_id'] != user.id:
+            if not user.is_admin:
+                return Response({"error": "You can only export your own statement."}, status=403)
+            user = get_object_or_404(CustomUser.objects.select_related('wallet'), pk=params['user_id'])
+
+        start, end = params.get('start_date'), params.get('end_date')
+        if params['output'] == 'ndjson':
+            response = StreamingHttpResponse(stream_ndjson(user, start, end), content_type="application/x-ndjson")
+            extension = "ndjson"
+        else:
+            response = StreamingHttpResponse(stream_csv(user, start, end), content_type="text/csv")
+            extension = "csv"
+        response["Content-Disposition"] = f'attachment; filename="statement_{user.id}.{extension}"'
+        return response
+
+# Historical Balance View
+class WalletBalanceAtView(APIView):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [WalletJWTAuthentication]
 
+    @extend_schema(
+        summary="Get wallet balance at a point in time",
+        description=(
+            "Returns the wallet balance as of `at`, from the nearest daily snapshot plus the ledger entries after it. "
+            "Admins may pass user_id to query another user's wallet."
+        ),
+        parameters=[BalanceAtQuerySerializer],
+        responses={
+            200: OpenApiResponse(
+                response=OpenApiTypes.OBJECT,
+                description="Balance as of the given time.",
+                examples=[OpenApiExample(
+                    "Balance",
+                    value={"balance": "15250.00", "as_of": "2026-03-31T23:59:59Z", "snapshot_date": "2026-03-30"},
+                    summary="Balance"
+                )]
+            ),
+        },
+    )
+    def get(self, request):
+        query = BalanceAtQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        user = request.user
+        if params.get('user_id') and params['user_id'] != user.id:
+            if not user.is_admin:
+                return Response({"error": "You can only view your own balance."}, status=403)
+            user = get_object_or_404(CustomUser.objects.select_related('wallet'), pk=params['user_id'])
+
+        covered_from = ledger_start()
+        if covered_from and params['at'] < covered_from:
+            return Response({"error": f"Balances before {covered_from.isoformat()} are not available."}, status=400)
+
+        balance, snapshot_date = balance_at(user.wallet.pk, params['at'])
+        return Response({
+            "balance": balance,
+            "as_of": params['at'],
+            "snapshot_date": snapshot_date
+        }, status=200)
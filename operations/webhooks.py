@@ -0,0 +1,275 @@
+import logging
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import close_old_connections, transaction as db_transaction
+from django.db.models import Case, DecimalField, F, Q, Value, When
+from django.utils import timezone
+from auth_system import read_models
+from auth_system.models import Wallet
+from utilities.background import run_in_background
+from .models import Transaction, WebhookEvent
+from . import rollups
+from .ledger import post_journal, post_journals, system_entry, wallet_entry, wallet_ids_for_users
+from .payouts import leg_settled
+from .transfers import complete_external_transfer, fail_external_transfer
+
+logger = logging.getLogger(__name__)
+
+
+def record_event(source, event_type, reference, payload):
+    """
+    Stores a webhook in the inbox with a single INSERT ... ON CONFLICT DO NOTHING,
+    so redelivered events are dropped by the unique constraint.
+    """
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(source=source, event_type=event_type, reference=reference, payload=payload)],
+        ignore_conflicts=True,
+    )
+    if settings.WEBHOOK_INBOX["PROCESS_ON_COMMIT"]:
+        db_transaction.on_commit(lambda: run_in_background(process_pending))
+
+
+def claim_events(limit):
+    """
+    Claims up to `limit` pending events, oldest first. Events whose reference is
+    already being processed elsewhere are left alone, so the events for one
+    reference are always applied in the order they arrived.
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=settings.WEBHOOK_INBOX["STALE_AFTER"])
+    in_flight = WebhookEvent.objects.filter(status='processing', claimed_at__gte=stale_before).values('reference')
+    with db_transaction.atomic():
+        events = _queue_heads(
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='pending') | Q(status='processing', claimed_at__lt=stale_before))
+            .exclude(reference__in=in_flight)
+            .order_by('id')[:limit]
+        )
+        if events:
+            WebhookEvent.objects.filter(id__in=[event.id for event in events]).update(
+                status='processing', attempts=F('attempts') + 1, claimed_at=now
+            )
+    for event in events:
+        event.attempts += 1
+    return events
+
+
+def _queue_heads(candidates):
+    """
+    Keeps only the candidates at the head of their reference's queue. The in_flight
+    exclusion cannot see a claim another worker has not committed yet; its rows are
+    skipped as locked, so a later event for the same reference could otherwise be
+    claimed here and applied first. Any older unfinished event this claim does not
+    hold means the rest of that reference waits for the next round.
+    """
+    candidates = list(candidates)
+    if not candidates:
+        return candidates
+    claimed = {event.id for event in candidates}
+    unfinished = (
+        WebhookEvent.objects.filter(
+            source__in={event.source for event in candidates},
+            reference__in={event.reference for event in candidates},
+            status__in=['pending', 'processing'],
+        )
+        .order_by('id')
+        .values_list('id', 'source', 'reference')
+    )
+    blocked = set()
+    for event_id, source, reference in unfinished:
+        if event_id not in claimed:
+            blocked.add((source, reference))
+        elif (source, reference) in blocked:
+            claimed.discard(event_id)
+    return [event for event in candidates if event.id in claimed]
+
+
+def group_by_reference(events):
+    groups = {}
+    for event in events:
+        groups.setdefault((event.source, event.reference), []).append(event)
+    return list(groups.values())
+
+
+def process_pending(limit=None, pool=None):
+    """
+    Claims a batch of events and applies them, one reference per task on `pool` if
+    given. In "batch" settlement mode the funding events are settled together first.
+    """
+    events = claim_events(limit or settings.WEBHOOK_INBOX["BATCH_SIZE"])
+    remaining = events
+    if settings.WEBHOOK_INBOX["SETTLEMENT_MODE"] == "batch":
+        funding = [event for event in events if event.source == 'funding']
+        remaining = [event for event in events if event.source != 'funding']
+        if funding:
+            settle_funding_batch(funding)
+    groups = group_by_reference(remaining)
+    if pool is not None:
+        list(pool.map(apply_events, groups))
+    else:
+        for group in groups:
+            apply_events(group)
+    return len(events)
+
+
+def apply_events(events):
+    close_old_connections()
+    try:
+        for event in events:
+            apply_event(event)
+    finally:
+        close_old_connections()
+
+
+def apply_event(event):
+    try:
+        status, result = HANDLERS[event.source](event.payload)
+    except Exception as e:
+        logger.exception("Applying webhook event %s failed", event.id)
+        retry = event.attempts < settings.WEBHOOK_INBOX["MAX_ATTEMPTS"]
+        WebhookEvent.objects.filter(pk=event.pk).update(
+            status='pending' if retry else 'failed', result=str(e)[:255]
+        )
+        return
+    WebhookEvent.objects.filter(pk=event.pk).update(status=status, result=result, processed_at=timezone.now())
+
+
+def apply_funding_event(payload):
+    data = payload["eventData"]
+    event_type = payload["eventType"]
+    payment_ref = data.get('paymentReference')
+    transaction_ref = data.get('transactionReference')
+    amount_paid = data.get('amountPaid')
+    payment_status = data.get('paymentStatus')
+
+    with db_transaction.atomic():
+        deposit = Transaction.objects.select_for_update().filter(
+            transaction_reference=payment_ref, transaction_type='Deposit'
+        ).first()
+        if deposit is None:
+            return 'ignored', "Transaction not found."
+        if deposit.status != "pending":
+            return 'ignored', "Already processed."
+        if event_type != "SUCCESSFUL_TRANSACTION":
+            return 'ignored', "Not a successful transaction event"
+
+        deposit.transaction_reference = transaction_ref
+        if payment_status == "PAID":
+            deposit.status = "success"
+            deposit.save(update_fields=['status', 'transaction_reference'])
+            amount = Decimal(str(amount_paid))
+            wallet_id = wallet_ids_for_users([deposit.user_id])[deposit.user_id]
+            Wallet.objects.filter(pk=wallet_id).update(balance=F('balance') + amount)
+            post_journal(transaction_ref, 'funding', [
+                wallet_entry(wallet_id, amount),
+                system_entry('funding', -amount),
+            ])
+            read_models.invalidate(deposit.user_id)
+        else:
+            deposit.status = "failed"
+            deposit.save(update_fields=['status', 'transaction_reference'])
+        rollups.record([deposit])
+    return 'processed', "Processed"
+
+
+def settle_funding_batch(events):
+    """
+    Settles a batch of funding events in one database transaction: one IN query for
+    the deposits, one bulk_update for them, one UPDATE crediting every wallet by its
+    total for the batch, one ledger posting for all of them, and one bulk_update
+    recording the outcomes. If anything in
+    the batch fails, the events are applied one at a time instead so a single bad
+    event cannot hold back the rest.
+    """
+    close_old_connections()
+    try:
+        with db_transaction.atomic():
+            references = {event.payload["eventData"].get('paymentReference') for event in events}
+            deposits = {
+                deposit.transaction_reference: deposit
+                for deposit in Transaction.objects.select_for_update()
+                .filter(transaction_reference__in=references, transaction_type='Deposit')
+                .order_by('pk')
+            }
+            settled, fundings = [], []
+            now = timezone.now()
+            for event in events:
+                event.status, event.result = _settle_funding(event.payload, deposits, settled, fundings)
+                event.processed_at = now
+
+            Transaction.objects.bulk_update(settled, ['status', 'transaction_reference'])
+            if fundings:
+                wallet_ids = wallet_ids_for_users({deposit.user_id for deposit, _ in fundings})
+                credits = {}
+                for deposit, amount in fundings:
+                    wallet_id = wallet_ids[deposit.user_id]
+                    credits[wallet_id] = credits.get(wallet_id, Decimal("0.00")) + amount
+                # Lock in primary-key order, the same order transfers use
+                list(Wallet.objects.select_for_update().filter(pk__in=credits).order_by('pk').values_list('pk'))
+                Wallet.objects.filter(pk__in=credits).update(balance=F('balance') + Case(
+                    *[When(pk=wallet_id, then=Value(amount)) for wallet_id, amount in credits.items()],
+                    output_field=DecimalField(max_digits=12, decimal_places=2),
+                ))
+                post_journals([
+                    (deposit.transaction_reference, 'funding', [
+                        wallet_entry(wallet_ids[deposit.user_id], amount),
+                        system_entry('funding', -amount),
+                    ])
+                    for deposit, amount in fundings
+                ])
+                read_models.invalidate(*(deposit.user_id for deposit, _ in fundings))
+            rollups.record(settled)
+            WebhookEvent.objects.bulk_update(events, ['status', 'result', 'processed_at'])
+    except Exception:
+        logger.exception("Settling %s funding events as a batch failed, applying them one by one", len(events))
+        for group in group_by_reference(events):
+            apply_events(group)
+    finally:
+        close_old_connections()
+
+
+def _settle_funding(payload, deposits, settled, fundings):
+    """Batch counterpart of apply_funding_event, working on already locked deposits."""
+    data = payload["eventData"]
+    deposit = deposits.get(data.get('paymentReference'))
+    if deposit is None:
+        return 'ignored', "Transaction not found."
+    if deposit.status != "pending":
+        return 'ignored', "Already processed."
+    if payload["eventType"] != "SUCCESSFUL_TRANSACTION":
+        return 'ignored', "Not a successful transaction event"
+
+    deposit.transaction_reference = data.get('transactionReference')
+    if data.get('paymentStatus') == "PAID":
+        deposit.status = "success"
+        fundings.append((deposit, Decimal(str(data.get('amountPaid')))))
+    else:
+        deposit.status = "failed"
+    settled.append(deposit)
+    return 'processed', "Processed"
+
+
+def apply_disbursement_event(payload):
+    data = payload["eventData"]
+    event_type = payload["eventType"]
+
+    deposit = Transaction.objects.filter(transaction_reference=data.get('reference')).first()
+    if deposit is None:
+        return 'ignored', "Transaction not found."
+    if deposit.status != "pending":
+        return 'ignored', "Already processed."
+
+    # Outflow was reserved when the transfer was queued, so only failures touch the limits
+    if event_type != "SUCCESSFUL_DISBURSEMENT" or data.get('status') != "SUCCESS":
+        fail_external_transfer(deposit)
+    else:
+        complete_external_transfer(deposit, fee=Decimal(str(data.get("fee") or 0)))
+    leg_settled(deposit)
+    return 'processed', "Processed"
+
+
+HANDLERS = {
+    'funding': apply_funding_event,
+    'disbursement': apply_disbursement_event,
+}
@@ -1,12 +1,17 @@
 from django.contrib import admin
+from utilities.paginators import EstimatedCountPaginator
 
 # Register your models here.
 from .models import Address
 
 class AddressAdmin(admin.ModelAdmin):
     list_display = ('user', 'state', 'local_gov', 'area', 'landmark')
-    search_fields = ('user__email', 'state', 'local_gov', 'area')
+    list_select_related = ('user',)
+    search_fields = ('=user__email', 'state', 'local_gov', 'area')
     list_filter = ('state', 'local_gov')
-    ordering = ('user__email',)
+    ordering = ('-id',)
+    raw_id_fields = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 admin.site.register(Address, AddressAdmin)
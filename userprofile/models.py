@@ -10,3 +10,10 @@ class Address(models.Model):
     landmark = models.CharField(max_length=100, null=True, blank=True, verbose_name="Landmark")
     user_address = models.CharField(max_length=1000, null=True, blank=True, verbose_name="Address")
 
+    class Meta:
+        indexes = [
+            # Admin changelist filters; also serve the DISTINCT lookups that build the filter choices
+            models.Index(fields=['state', '-id'], name='address_state_id_idx'),
+            models.Index(fields=['local_gov', '-id'], name='address_lga_id_idx'),
+        ]
+
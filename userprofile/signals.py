@@ -1,8 +1,10 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from utilities.services import create_reserved_account
+from auth_system import read_models
+from auth_system.authentication import invalidate_principal
 from auth_system.models import Wallet
+from auth_system.provisioning import enqueue_provisioning
 from userprofile.models import Address
 
 User = get_user_model()
@@ -10,21 +12,32 @@ User = get_user_model()
 @receiver(post_save, sender=User)
 def create_wallet_and_monnify_account(sender, instance, created, **kwargs):
     """
-    Automatically creates a Wallet and assigns Monnify reserved account
-    when a new User is created.
+    Automatically creates a Wallet when a new User is created and queues its
+    Monnify reserved account, which is provisioned once the signup commits.
     """
     if not created:
         return
 
     wallet, _ = Wallet.objects.get_or_create(user=instance)
     Address.objects.get_or_create(user=instance)
+    enqueue_provisioning(wallet)
 
-    try:
-        details = create_reserved_account(instance)
-        wallet.monnify_account_number = details["accountNumber"]
-        wallet.monnify_bank_name = details["bankName"]
-        wallet.bank_user_name = details["customerName"]
-        wallet.accountreference = details["accountReference"]
-        wallet.save()
-    except Exception as e:
-        print(f"Error during Monnify setup: {e}")
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Wallet)
+def invalidate_read_models(sender, instance, created, **kwargs):
+    """
+    Drops the cached wallet/profile payloads when a user or wallet is saved, e.g. on
+    tier approval, profile updates or admin edits. Queryset updates that change
+    balances call read_models.invalidate themselves.
+    """
+    if created:
+        return
+    read_models.invalidate(instance.pk if sender is User else instance.user_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_principal(sender, instance, **kwargs):
+    """Makes the next request re-read the user, e.g. after a password reset or deactivation."""
+    invalidate_principal(instance.pk)
@@ -0,0 +1,27 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Shared, bounded thread pool for work that should not block a request
+executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "BACKGROUND_WORKERS", 4),
+    thread_name_prefix="fintech-bg",
+)
+
+
+def _run_logged(fn, *args, **kwargs):
+    try:
+        return fn(*args, **kwargs)
+    except Exception:
+        logger.exception("Background task %s failed", getattr(fn, "__name__", fn))
+        raise
+
+
+def run_in_background(fn, *args, **kwargs):
+    """
+    Submits fn to the shared pool and returns the Future.
+    Failures are logged, since nobody waits on most of these futures.
+    """
+    return executor.submit(_run_logged, fn, *args, **kwargs)
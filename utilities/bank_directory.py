@@ -0,0 +1,185 @@
+import json
+import logging
+import re
+import threading
+import time
+from django.conf import settings
+from utilities.background import run_in_background
+
+logger = logging.getLogger(__name__)
+
+# Common short names customers type, mapped to the normalized name Monnify lists
+BANK_ALIASES = {
+    "gtb": "guaranty trust bank",
+    "gtbank": "guaranty trust bank",
+    "gtco": "guaranty trust bank",
+    "uba": "united bank for africa",
+    "fbn": "first bank of nigeria",
+    "first bank": "first bank of nigeria",
+    "firstbank": "first bank of nigeria",
+    "fcmb": "first city monument bank",
+    "stanbic": "stanbic ibtc bank",
+    "stanbic ibtc": "stanbic ibtc bank",
+    "ecobank": "ecobank nigeria",
+    "union": "union bank of nigeria",
+    "union bank": "union bank of nigeria",
+    "alat": "wema bank",
+    "kuda": "kuda microfinance bank",
+    "kuda bank": "kuda microfinance bank",
+    "moniepoint": "moniepoint microfinance bank",
+    "opay": "opay digital services",
+    "palmpay": "palmpay",
+}
+
+_SUFFIXES = {"plc", "limited", "ltd"}
+
+
+def normalize_bank_name(name):
+    """Lowercases, drops punctuation and corporate suffixes, and collapses whitespace."""
+    name = name.lower().replace("&", " and ")
+    words = re.sub(r"[^a-z0-9 ]+", " ", name).split()
+    while words and words[-1] in _SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+
+def build_bank_index(banks):
+    """
+    Builds the normalized name -> bank index used by lookups: every bank under its
+    own name, under its name without the word "bank" when that is unambiguous, and
+    under the entries of BANK_ALIASES.
+    """
+    index = {}
+    short_names = {}
+    for bank in banks:
+        key = normalize_bank_name(bank["name"])
+        index.setdefault(key, bank)
+        short = " ".join(word for word in key.split() if word != "bank")
+        if short and short != key:
+            short_names.setdefault(short, []).append(bank)
+
+    for short, matches in short_names.items():
+        if len(matches) == 1:
+            index.setdefault(short, matches[0])
+
+    for alias, target in BANK_ALIASES.items():
+        if target in index:
+            index.setdefault(alias, index[target])
+    return index
+
+
+class BankDirectory:
+    """
+    Process-wide copy of Monnify's bank list with an O(1) name index.
+
+    The list is kept in process and in Redis. Within BANK_DIRECTORY["TTL"] it is
+    served as-is; after that, and up to BANK_DIRECTORY["STALE_TTL"], the stale copy
+    is still served while one background refresh fetches a new one.
+    """
+    cache_key = "monnify:banks"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = {}
+        self._codes = {}
+        self._fetched_at = 0.0
+        self._refreshing = False
+
+    def lookup(self, bank_name):
+        """Returns the {"name", "code"} entry for a bank name, alias or code, or None."""
+        index, codes = self._current()
+        query = bank_name.strip()
+        return index.get(normalize_bank_name(query)) or codes.get(query)
+
+    def refresh(self):
+        """Fetches the bank list from Monnify and stores it locally and in Redis."""
+        from utilities.monnify_helper import monnify_request
+
+        response = monnify_request("GET", "api/v1/banks")
+        if response.status_code != 200:
+            raise Exception("Failed to fetch bank list from Monnify: " + response.text)
+        banks = [
+            {"name": bank["name"], "code": bank["code"]}
+            for bank in response.json().get("responseBody") or []
+        ]
+        fetched_at = time.time()
+        self._install(banks, fetched_at)
+        self._write_shared(banks, fetched_at)
+        return banks
+
+    def _current(self):
+        age = time.time() - self._fetched_at
+        config = settings.BANK_DIRECTORY
+        if self._index and age < config["TTL"]:
+            return self._index, self._codes
+        if self._index and age < config["STALE_TTL"]:
+            self._refresh_in_background()
+            return self._index, self._codes
+
+        with self._lock:
+            if not self._index or time.time() - self._fetched_at >= config["STALE_TTL"]:
+                if not self._load_shared():
+                    try:
+                        self.refresh()
+                    except Exception:
+                        # Lookups find nothing rather than fail; the next one tries again
+                        logger.warning("Could not fetch bank directory", exc_info=True)
+                        return self._index, self._codes
+            if time.time() - self._fetched_at >= config["TTL"]:
+                self._refresh_in_background(locked=True)
+            return self._index, self._codes
+
+    def _refresh_in_background(self, locked=False):
+        if not locked:
+            with self._lock:
+                return self._refresh_in_background(locked=True)
+        if self._refreshing:
+            return
+        self._refreshing = True
+        run_in_background(self._background_refresh)
+
+    def _background_refresh(self):
+        try:
+            # Another worker may already have refreshed the shared copy
+            if self._load_shared(fresh_only=True):
+                return
+            self.refresh()
+        finally:
+            self._refreshing = False
+
+    def _install(self, banks, fetched_at):
+        self._index = build_bank_index(banks)
+        self._codes = {bank["code"]: bank for bank in banks}
+        self._fetched_at = fetched_at
+
+    def _load_shared(self, fresh_only=False):
+        try:
+            from auth_system.redis_client import redis
+            cached = redis.get(self.cache_key)
+        except Exception:
+            logger.warning("Could not read shared bank directory", exc_info=True)
+            return False
+        if not cached:
+            return False
+        data = json.loads(cached)
+        age = time.time() - data["fetched_at"]
+        config = settings.BANK_DIRECTORY
+        if age >= (config["TTL"] if fresh_only else config["STALE_TTL"]):
+            return False
+        if data["fetched_at"] > self._fetched_at:
+            self._install(data["banks"], data["fetched_at"])
+        return True
+
+    def _write_shared(self, banks, fetched_at):
+        try:
+            from auth_system.redis_client import redis
+            redis.set(
+                self.cache_key,
+                json.dumps({"fetched_at": fetched_at, "banks": banks}),
+                ex=int(settings.BANK_DIRECTORY["STALE_TTL"]),
+            )
+        except Exception:
+            logger.warning("Could not share bank directory", exc_info=True)
+
+
+bank_directory = BankDirectory()
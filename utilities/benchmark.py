@@ -0,0 +1,164 @@
+import math
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+# Drives the register -> fund -> transfer -> history flows against a running API
+# and records per-endpoint latency. Meant to run against the fake_monnify stand-in.
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class LatencyRecorder:
+    """Thread-safe latency samples per endpoint, with errors counted separately."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._errors = {}
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, name, seconds, ok=True):
+        with self._lock:
+            self._samples.setdefault(name, []).append(seconds)
+            if not ok:
+                self._errors[name] = self._errors.get(name, 0) + 1
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    def report(self):
+        """One row per endpoint: count, errors, p50/p95/p99/max in ms and requests per second."""
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        rows = []
+        with self._lock:
+            for name, samples in sorted(self._samples.items()):
+                ordered = sorted(samples)
+                rows.append({
+                    "endpoint": name,
+                    "count": len(ordered),
+                    "errors": self._errors.get(name, 0),
+                    "p50_ms": round(percentile(ordered, 0.50) * 1000, 1),
+                    "p95_ms": round(percentile(ordered, 0.95) * 1000, 1),
+                    "p99_ms": round(percentile(ordered, 0.99) * 1000, 1),
+                    "max_ms": round(ordered[-1] * 1000, 1),
+                    "rps": round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+                })
+        return {"elapsed_s": round(elapsed, 2), "endpoints": rows}
+
+
+class BenchUser:
+    def __init__(self, index, run_id):
+        self.email = f"bench-{run_id}-{index}@example.com"
+        self.phone_number = f"07{int(run_id, 16) % 10**5:05d}{index:04d}"
+        self.password = "bench-pass-123"
+        self.session = requests.Session()
+        self.account_number = None
+
+
+class FlowRunner:
+    """
+    Runs each flow as a phase across all virtual users, `concurrency` at a time:
+    register (and wait for the reserved account), fund and wait for the webhook to credit the
+    wallet, transfer to other bench users or to an external bank, and read history.
+    """
+
+    def __init__(self, base_url, users=20, concurrency=10, transfers=3, fund_amount=5000,
+                 transfer_amount=100, external_ratio=0.2, settle_timeout=30.0, recorder=None):
+        self.base_url = base_url.rstrip("/") + "/"
+        self.concurrency = concurrency
+        self.transfers = transfers
+        self.fund_amount = fund_amount
+        self.transfer_amount = transfer_amount
+        self.external_ratio = external_ratio
+        self.settle_timeout = settle_timeout
+        self.recorder = recorder or LatencyRecorder()
+        run_id = uuid.uuid4().hex[:6]
+        self.users = [BenchUser(i, run_id) for i in range(users)]
+
+    def run(self):
+        for phase in (self.register, self.fund, self.transfer, self.history):
+            self._each_user(phase)
+        self.recorder.stop()
+        return self.recorder.report()
+
+    def _each_user(self, phase):
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="bench") as pool:
+            list(pool.map(phase, self.users))
+
+    def call(self, user, name, method, path, ok_statuses=(200, 201, 202), **kwargs):
+        start = time.perf_counter()
+        try:
+            response = user.session.request(method, f"{self.base_url}{path}", timeout=30, **kwargs)
+        except requests.RequestException:
+            self.recorder.record(name, time.perf_counter() - start, ok=False)
+            return None
+        self.recorder.record(name, time.perf_counter() - start, ok=response.status_code in ok_statuses)
+        return response if response.status_code in ok_statuses else None
+
+    def register(self, user):
+        response = self.call(user, "register", "POST", "auth/register/", json={
+            "firstname": "Bench", "lastname": "User", "email": user.email, "password": user.password,
+            "phone_number": user.phone_number, "date_of_birth": "1990-01-01",
+        })
+        if response is None:
+            return
+        user.session.headers["Authorization"] = f"Bearer {response.json()['tokens']['access']}"
+        # The reserved account is provisioned in the background after signup
+        start = time.perf_counter()
+        deadline = start + self.settle_timeout
+        while time.perf_counter() < deadline:
+            wallet = self.call(user, "wallet-provisioning", "GET", "user/wallet/provisioning/")
+            if wallet is not None and wallet.json().get("status") in ("active", "failed"):
+                user.account_number = wallet.json().get("monnify_account_number")
+                break
+            time.sleep(0.2)
+        self.recorder.record("provisioning-settled", time.perf_counter() - start, ok=user.account_number is not None)
+
+    def fund(self, user):
+        if "Authorization" not in user.session.headers:
+            return
+        start = time.perf_counter()
+        if self.call(user, "fund-wallet", "POST", "fund/wallet/", json={"amount": self.fund_amount}) is None:
+            return
+        # Time until the funding webhook has credited the wallet
+        deadline = start + self.settle_timeout
+        while time.perf_counter() < deadline:
+            wallet = self.call(user, "wallet", "GET", "user/wallet/")
+            if wallet is not None and float(wallet.json().get("balance") or 0) >= self.fund_amount:
+                self.recorder.record("funding-settled", time.perf_counter() - start)
+                return
+            time.sleep(0.2)
+        self.recorder.record("funding-settled", time.perf_counter() - start, ok=False)
+
+    def transfer(self, user):
+        if "Authorization" not in user.session.headers:
+            return
+        recipients = [other.account_number for other in self.users if other is not user and other.account_number]
+        for _ in range(self.transfers):
+            if not recipients or random.random() < self.external_ratio:
+                body = {
+                    "recipient_account_number": f"{random.randrange(10**9, 10**10)}",
+                    "amount": self.transfer_amount, "transfer_type": "external", "bank_name": "gtbank",
+                }
+                self.call(user, "send-money:external", "POST", "transfer/", json=body)
+            else:
+                body = {"recipient_account_number": random.choice(recipients), "amount": self.transfer_amount}
+                self.call(user, "send-money:internal", "POST", "transfer/", json=body)
+
+    def history(self, user):
+        if "Authorization" not in user.session.headers:
+            return
+        self.call(user, "user-transactions", "GET", "transactions/")
+        self.call(user, "transaction-statement", "GET", "transactions/statement/")
+        self.call(user, "wallet", "GET", "user/wallet/")
@@ -0,0 +1,131 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_MISS = object()
+
+
+class LocalLRU:
+    """Small thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISS
+            value, expires_at = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                return _MISS
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class BeneficiaryCache:
+    """
+    Caches Monnify account-name lookups per (bank_code, account_number).
+
+    Resolved names are kept for BENEFICIARY_CACHE["TTL"] seconds. Accounts Monnify
+    rejects are cached as None for the shorter NEGATIVE_TTL; upstream errors are
+    not cached at all. Entries live in a local LRU in front of Redis.
+    """
+
+    def __init__(self):
+        self._local = LocalLRU(settings.BENEFICIARY_CACHE["LOCAL_MAX_ENTRIES"])
+
+    @staticmethod
+    def _key(bank_code, account_number):
+        return f"beneficiary:{bank_code}:{account_number}"
+
+    def resolve(self, bank_code, account_number, default_name=None):
+        """Returns the account name for the destination, or None if it cannot be resolved."""
+        cached = self.get(bank_code, account_number)
+        if cached is not _MISS:
+            return cached
+        return self._validate(bank_code, account_number, default_name)
+
+    def get(self, bank_code, account_number):
+        key = self._key(bank_code, account_number)
+        value = self._local.get(key)
+        if value is not _MISS:
+            return value
+        try:
+            from auth_system.redis_client import redis
+            cached = redis.get(key)
+        except Exception:
+            logger.warning("Could not read beneficiary cache", exc_info=True)
+            return _MISS
+        if cached is None:
+            return _MISS
+        value = json.loads(cached)["account_name"]
+        self._local.set(key, value, self._local_ttl(value))
+        return value
+
+    def set(self, bank_code, account_number, account_name):
+        key = self._key(bank_code, account_number)
+        config = settings.BENEFICIARY_CACHE
+        ttl = config["TTL"] if account_name else config["NEGATIVE_TTL"]
+        self._local.set(key, account_name, self._local_ttl(account_name))
+        try:
+            from auth_system.redis_client import redis
+            redis.set(key, json.dumps({"account_name": account_name}), ex=ttl)
+        except Exception:
+            logger.warning("Could not write beneficiary cache", exc_info=True)
+
+    def invalidate(self, bank_code, account_number):
+        key = self._key(bank_code, account_number)
+        self._local.delete(key)
+        try:
+            from auth_system.redis_client import redis
+            redis.delete(key)
+        except Exception:
+            logger.warning("Could not clear beneficiary cache", exc_info=True)
+
+    def _local_ttl(self, account_name):
+        config = settings.BENEFICIARY_CACHE
+        ttl = config["TTL"] if account_name else config["NEGATIVE_TTL"]
+        return min(ttl, config["LOCAL_TTL"])
+
+    def _validate(self, bank_code, account_number, default_name):
+        from utilities.monnify_helper import monnify_request
+
+        params = {
+            "accountNumber": account_number,
+            "bankCode": bank_code
+        }
+        response = monnify_request(
+            "GET", "api/v1/disbursements/account/validate", params=params, idempotent=True
+        )
+        if response.status_code == 200:
+            account_name = (response.json().get("responseBody") or {}).get("accountName")
+            if not account_name:
+                return default_name
+            self.set(bank_code, account_number, account_name)
+            return account_name
+        if 400 <= response.status_code < 500 and response.status_code not in (401, 429):
+            self.set(bank_code, account_number, None)
+        return None
+
+
+beneficiary_cache = BeneficiaryCache()
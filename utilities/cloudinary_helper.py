@@ -1,5 +1,16 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
 import cloudinary.uploader
 import cloudinary
+import cloudinary.utils
+from django.conf import settings
+
+# Middle chunks of a large file go up on their own bounded pool, so one big document
+# cannot take every thread of the upload worker
+chunk_uploader = ThreadPoolExecutor(
+    max_workers=settings.UPLOAD_SPOOL["CHUNK_CONCURRENCY"],
+    thread_name_prefix="upload-chunks",
+)
 
 # Utility function to upload files to Cloudinary
 def upload_to_cloudinary(file, folder_name="fintechapp_user_uploads"):
@@ -16,3 +27,44 @@ def upload_to_cloudinary(file, folder_name="fintechapp_user_uploads"):
         overwrite=False
     )
     return result["secure_url"]
+
+def upload_large_to_cloudinary(path, folder_name="fintechapp_user_uploads", filename=None, chunk_size=20_000_000):
+    """
+    Uploads a file from disk in `chunk_size` pieces, so a dropped connection only
+    costs one chunk and large documents never sit in memory. `filename` names the
+    asset instead of the file on disk. Returns the URL.
+
+    Cloudinary assembles the parts by their upload id and Content-Range and finishes
+    the asset when the last part arrives. The first part goes alone to fix the
+    public id, the middle parts go in parallel on chunk_uploader, and the last part
+    is sent once they are all in.
+    """
+    options = {
+        "folder": folder_name,
+        "filename_override": filename,
+        "resource_type": "auto",
+        "use_filename": True,
+        "unique_filename": True,
+        "overwrite": False,
+    }
+    upload_id = cloudinary.utils.random_public_id()
+    size = os.path.getsize(path)
+    name = filename or os.path.basename(path)
+
+    def send(start, **extra):
+        with open(path, "rb") as file:
+            file.seek(start)
+            chunk = file.read(chunk_size)
+        headers = {
+            "Content-Range": f"bytes {start}-{start + len(chunk) - 1}/{size}",
+            "X-Unique-Upload-Id": upload_id,
+        }
+        return cloudinary.uploader.upload_large_part((name, chunk), http_headers=headers, **options, **extra)
+
+    starts = list(range(0, size, chunk_size)) or [0]
+    result = send(starts[0])
+    if len(starts) > 1:
+        public_id = result.get("public_id")
+        list(chunk_uploader.map(lambda start: send(start, public_id=public_id), starts[1:-1]))
+        result = send(starts[-1], public_id=public_id)
+    return result["secure_url"]
@@ -0,0 +1,344 @@
+import heapq
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Local stand-in for the Monnify API, for load tests and benchmarks only.
+# Point MONNIFY_BASE_URL at it (e.g. http://127.0.0.1:8900/) and run `manage.py fake_monnify`.
+
+FAKE_BANKS = [
+    {"name": "Access Bank", "code": "044"},
+    {"name": "First Bank of Nigeria", "code": "011"},
+    {"name": "Guaranty Trust Bank", "code": "058"},
+    {"name": "Kuda Microfinance Bank", "code": "50211"},
+    {"name": "Moniepoint Microfinance Bank", "code": "50515"},
+    {"name": "United Bank For Africa", "code": "033"},
+    {"name": "Wema Bank", "code": "035"},
+    {"name": "Zenith Bank", "code": "057"},
+]
+
+RESERVED_ACCOUNTS_PATH = "api/v1/bank-transfer/reserved-accounts"
+FUNDING_WEBHOOK_PATH = "fund/webhook/"
+DISBURSEMENT_WEBHOOK_PATH = "transfer/webhook/"
+
+
+class WebhookSender:
+    """Delivers scheduled webhooks once they are due, retrying failed deliveries like Monnify does."""
+
+    def __init__(self, base_url, workers=4, max_attempts=3):
+        self.base_url = base_url
+        self.max_attempts = max_attempts
+        self._queue = []
+        self._condition = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fake-monnify-webhook")
+        self._session = requests.Session()
+        self._sequence = 0
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="fake-monnify-scheduler", daemon=True)
+        self._thread.start()
+
+    def schedule(self, path, payload, delay, attempt=1):
+        with self._condition:
+            self._sequence += 1
+            heapq.heappush(self._queue, (time.monotonic() + delay, self._sequence, path, payload, attempt))
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._pool.shutdown(wait=False)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped and (not self._queue or self._queue[0][0] > time.monotonic()):
+                    timeout = self._queue[0][0] - time.monotonic() if self._queue else None
+                    self._condition.wait(timeout)
+                if self._stopped:
+                    return
+                _, _, path, payload, attempt = heapq.heappop(self._queue)
+            self._pool.submit(self._deliver, path, payload, attempt)
+
+    def _deliver(self, path, payload, attempt):
+        try:
+            response = self._session.post(f"{self.base_url}{path}", json=payload, timeout=10)
+            if response.status_code == 200:
+                return
+            error = f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            error = str(e)
+        if attempt < self.max_attempts:
+            self.schedule(path, payload, delay=2 ** attempt, attempt=attempt + 1)
+        else:
+            logger.warning("Dropping %s webhook after %s attempts: %s", payload["eventType"], attempt, error)
+
+
+class FakeMonnify:
+    """
+    In-memory Monnify: reserved accounts, checkout links, name enquiry, and single
+    and batch disbursements with optional OTP authorization.
+
+    Each call sleeps for a normally distributed latency, and `failure_rate` of calls
+    answer 503 before doing anything. Checkouts are paid and disbursements settle by
+    webhook `webhook_delay` seconds later; `disbursement_failure_rate` of legs fail.
+    """
+
+    def __init__(self, latency=0.05, jitter=0.02, failure_rate=0.0, disbursement_failure_rate=0.0,
+                 webhook_url=None, webhook_delay=0.5, require_otp=False, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.disbursement_failure_rate = disbursement_failure_rate
+        self.webhook_delay = webhook_delay
+        self.require_otp = require_otp
+        self.webhooks = WebhookSender(webhook_url) if webhook_url else None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._account_numbers = 0
+        self._reserved = {}
+        self._transfers = {}
+        self._batches = {}
+        self.calls = {}
+
+        self.routes = {
+            ("POST", "api/v1/auth/login"): self.login,
+            ("GET", "api/v1/banks"): self.banks,
+            ("GET", "api/v1/disbursements/account/validate"): self.validate_account,
+            ("POST", RESERVED_ACCOUNTS_PATH): self.reserve_account,
+            ("POST", "api/v1/merchant/transactions/init-transaction"): self.init_transaction,
+            ("POST", "api/v2/disbursements/single"): self.single_transfer,
+            ("GET", "api/v2/disbursements/single/summary"): self.single_summary,
+            ("POST", "api/v2/disbursements/single/validate-otp"): self.single_otp,
+            ("POST", "api/v2/disbursements/batch"): self.batch_transfer,
+            ("GET", "api/v2/disbursements/batch/summary"): self.batch_summary,
+            ("POST", "api/v2/disbursements/batch/validate-otp"): self.batch_otp,
+        }
+
+    def handle(self, method, path, params, body):
+        """Returns (status_code, response dict) for one call."""
+        path = path.strip("/")
+        handler = self.routes.get((method, path))
+        if handler is None and method == "GET" and path.startswith(RESERVED_ACCOUNTS_PATH + "/"):
+            params = {**params, "accountReference": path.rsplit("/", 1)[-1]}
+            handler = self.get_reserved_account
+        if handler is None:
+            return 404, failure("Resource not found")
+        with self._lock:
+            self.calls[path] = self.calls.get(path, 0) + 1
+            delay = max(0.0, self._random.gauss(self.latency, self.jitter))
+            fail = self._random.random() < self.failure_rate
+        time.sleep(delay)
+        if fail:
+            return 503, failure("Injected failure")
+        return handler(params, body)
+
+    def close(self):
+        if self.webhooks:
+            self.webhooks.stop()
+
+    # Auth and lookups
+
+    def login(self, params, body):
+        return 200, success({"accessToken": uuid.uuid4().hex, "expiresIn": 3600})
+
+    def banks(self, params, body):
+        return 200, success(FAKE_BANKS)
+
+    def validate_account(self, params, body):
+        account_number = params.get("accountNumber", "")
+        if len(account_number) != 10 or not account_number.isdigit():
+            return 400, failure("Invalid account number")
+        return 200, success({
+            "accountNumber": account_number,
+            "accountName": f"FAKE ACCOUNT {account_number[-4:]}",
+            "bankCode": params.get("bankCode"),
+        })
+
+    def reserve_account(self, params, body):
+        reference = body.get("accountReference")
+        with self._lock:
+            if reference in self._reserved:
+                return 422, failure(f"There is an existing reserved account with reference {reference}")
+            self._account_numbers += 1
+            account = {
+                "accountReference": reference,
+                "accountName": body.get("accountName"),
+                "customerName": body.get("customerName"),
+                "accountNumber": f"9{self._account_numbers:09d}",
+                "bankName": "Moniepoint Microfinance Bank",
+                "status": "ACTIVE",
+            }
+            self._reserved[reference] = account
+        return 200, success(account)
+
+    def get_reserved_account(self, params, body):
+        account = self._reserved.get(params["accountReference"])
+        if account is None:
+            return 404, failure("Reserved account not found")
+        return 200, success(account)
+
+    # Wallet funding
+
+    def init_transaction(self, params, body):
+        payment_reference = body.get("paymentReference")
+        transaction_reference = f"MNFY|FAKE|{uuid.uuid4().hex[:12].upper()}"
+        if self.webhooks:
+            self.webhooks.schedule(FUNDING_WEBHOOK_PATH, {
+                "eventType": "SUCCESSFUL_TRANSACTION",
+                "eventData": {
+                    "paymentReference": payment_reference,
+                    "transactionReference": transaction_reference,
+                    "amountPaid": str(body.get("amount")),
+                    "paymentStatus": "PAID",
+                },
+            }, self.webhook_delay)
+        return 200, success({
+            "transactionReference": transaction_reference,
+            "paymentReference": payment_reference,
+            "checkoutUrl": f"https://sandbox.sdk.monnify.com/checkout/{transaction_reference}",
+        })
+
+    # Disbursements
+
+    def single_transfer(self, params, body):
+        reference = body.get("reference")
+        with self._lock:
+            if reference in self._transfers:
+                return 400, failure(f"Duplicate reference {reference}")
+            transfer = self._new_transfer(body)
+            self._transfers[reference] = transfer
+        if transfer["status"] != "PENDING_AUTHORIZATION":
+            self._settle(transfer)
+        return 200, success(dict(transfer))
+
+    def single_summary(self, params, body):
+        transfer = self._transfers.get(params.get("reference"))
+        if transfer is None:
+            return 404, failure("Transfer not found")
+        return 200, success(dict(transfer))
+
+    def single_otp(self, params, body):
+        with self._lock:
+            transfer = self._transfers.get(body.get("reference"))
+            if transfer is None or transfer["status"] != "PENDING_AUTHORIZATION":
+                return 400, failure("No transfer awaiting authorization")
+            transfer["status"] = "PENDING"
+        self._settle(transfer)
+        return 200, success(dict(transfer))
+
+    def batch_transfer(self, params, body):
+        reference = body.get("batchReference")
+        with self._lock:
+            if reference in self._batches:
+                return 400, failure(f"Duplicate batch reference {reference}")
+            legs = [self._new_transfer(leg) for leg in body.get("transactionList") or []]
+            status = "PENDING_AUTHORIZATION" if self.require_otp else "IN_PROGRESS"
+            batch = {"batchReference": reference, "batchStatus": status, "legs": legs}
+            self._batches[reference] = batch
+        if status != "PENDING_AUTHORIZATION":
+            for leg in legs:
+                self._settle(leg)
+        return 200, success(self._batch_body(batch))
+
+    def batch_summary(self, params, body):
+        batch = self._batches.get(params.get("reference"))
+        if batch is None:
+            return 404, failure("Batch not found")
+        return 200, success(self._batch_body(batch))
+
+    def batch_otp(self, params, body):
+        with self._lock:
+            batch = self._batches.get(body.get("reference"))
+            if batch is None or batch["batchStatus"] != "PENDING_AUTHORIZATION":
+                return 400, failure("No batch awaiting authorization")
+            batch["batchStatus"] = "IN_PROGRESS"
+        for leg in batch["legs"]:
+            self._settle(leg)
+        return 200, success(self._batch_body(batch))
+
+    def _new_transfer(self, body):
+        return {
+            "amount": body.get("amount"),
+            "reference": body.get("reference"),
+            "status": "PENDING_AUTHORIZATION" if self.require_otp else "PENDING",
+            "totalFee": 10,
+            "destinationAccountNumber": body.get("destinationAccountNumber"),
+            "destinationBankCode": body.get("destinationBankCode"),
+        }
+
+    def _settle(self, transfer):
+        with self._lock:
+            failed = self._random.random() < self.disbursement_failure_rate
+            transfer["status"] = "FAILED" if failed else "SUCCESS"
+        if self.webhooks:
+            self.webhooks.schedule(DISBURSEMENT_WEBHOOK_PATH, {
+                "eventType": "FAILED_DISBURSEMENT" if failed else "SUCCESSFUL_DISBURSEMENT",
+                "eventData": {
+                    "reference": transfer["reference"],
+                    "amount": transfer["amount"],
+                    "fee": transfer["totalFee"],
+                    "destinationAccountNumber": transfer["destinationAccountNumber"],
+                    "status": transfer["status"],
+                },
+            }, self.webhook_delay)
+
+    def _batch_body(self, batch):
+        return {
+            "batchReference": batch["batchReference"],
+            "batchStatus": batch["batchStatus"],
+            "totalTransactionsCount": len(batch["legs"]),
+        }
+
+
+def success(body):
+    return {"requestSuccessful": True, "responseMessage": "success", "responseCode": "0", "responseBody": body}
+
+
+def failure(message):
+    return {"requestSuccessful": False, "responseMessage": message, "responseCode": "99"}
+
+
+class FakeMonnifyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            body = {}
+        status, data = self.server.monnify.handle(method, url.path, params, body)
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def make_server(monnify, host="127.0.0.1", port=8900):
+    server = ThreadingHTTPServer((host, port), FakeMonnifyHandler)
+    server.daemon_threads = True
+    server.monnify = monnify
+    return server
@@ -0,0 +1,58 @@
+from django.conf import settings
+from PIL import Image, ImageOps, features
+
+# Formats avatars may be re-encoded to, with the extension their files get
+OUTPUT_FORMATS = {
+    "WEBP": ".webp",
+    "JPEG": ".jpg",
+}
+
+
+def output_format():
+    """The configured output format, falling back to JPEG when Pillow was built without WebP."""
+    image_format = settings.IMAGE_PROCESSING["FORMAT"].upper()
+    if image_format == "WEBP" and not features.check("webp"):
+        return "JPEG"
+    return image_format
+
+
+def preprocess_image(file, out):
+    """
+    Downscales an uploaded image to fit IMAGE_PROCESSING["MAX_DIMENSION"], applies and
+    then drops its EXIF data (orientation included), and re-encodes it into `out` at
+    IMAGE_PROCESSING["QUALITY"]. Returns the extension for the output format.
+
+    The image is decoded straight from the upload. For JPEGs, draft() lets the decoder
+    scale down while decoding, so a full-resolution bitmap is never held in memory.
+    """
+    config = settings.IMAGE_PROCESSING
+    size = (config["MAX_DIMENSION"], config["MAX_DIMENSION"])
+    image_format = output_format()
+
+    file.seek(0)
+    with Image.open(file) as image:
+        image.draft("RGB", size)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(size, Image.Resampling.LANCZOS)
+
+        if image_format == "JPEG" and image.mode != "RGB":
+            image = _flatten(image)
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+
+        # Nothing from the original's metadata is passed to save(), so EXIF and GPS data are dropped
+        options = {"quality": config["QUALITY"]}
+        if image_format == "JPEG":
+            options.update(optimize=True, progressive=True)
+        else:
+            options.update(method=4)
+        image.save(out, format=image_format, **options)
+    return OUTPUT_FORMATS[image_format]
+
+
+def _flatten(image):
+    """Composites transparent pixels onto white, since JPEG has no alpha channel."""
+    image = image.convert("RGBA")
+    background = Image.new("RGB", image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel("A"))
+    return background
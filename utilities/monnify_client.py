@@ -0,0 +1,105 @@
+import logging
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+
+class MonnifyClient:
+    """
+    Shared HTTP client for every Monnify call.
+
+    Connections are pooled and kept alive on a single requests.Session, every call
+    gets connect/read timeouts, idempotent calls are retried with jittered backoff,
+    and per-endpoint latency is recorded for stats().
+    """
+
+    def __init__(self):
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=settings.MONNIFY_HTTP["POOL_CONNECTIONS"],
+                        pool_maxsize=settings.MONNIFY_HTTP["POOL_MAXSIZE"],
+                    )
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    def get(self, path, **kwargs):
+        kwargs.setdefault("idempotent", True)
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def request(self, method, path, idempotent=False, **kwargs):
+        """
+        Sends a request to MONNIFY_BASE_URL + path. Only idempotent calls are
+        retried, so a disbursement is never sent twice by the client itself.
+        """
+        config = settings.MONNIFY_HTTP
+        url = f"{settings.MONNIFY_BASE_URL}{path}"
+        kwargs.setdefault("timeout", (config["CONNECT_TIMEOUT"], config["READ_TIMEOUT"]))
+        attempts = config["MAX_RETRIES"] + 1 if idempotent else 1
+
+        for attempt in range(attempts):
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._record(method, path, started, error=True)
+                if attempt + 1 >= attempts:
+                    raise
+            else:
+                failed = response.status_code >= 500
+                self._record(method, path, started, error=failed)
+                if response.status_code not in RETRY_STATUS_CODES or attempt + 1 >= attempts:
+                    return response
+            self._sleep_before_retry(attempt)
+
+    def _sleep_before_retry(self, attempt):
+        config = settings.MONNIFY_HTTP
+        ceiling = min(config["BACKOFF_MAX"], config["BACKOFF_BASE"] * (2 ** attempt))
+        time.sleep(random.uniform(0, ceiling))
+
+    def _record(self, method, path, started, error=False):
+        elapsed_ms = (time.monotonic() - started) * 1000
+        key = f"{method} {path}"
+        with self._stats_lock:
+            entry = self._stats.setdefault(key, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["count"] += 1
+            entry["errors"] += int(error)
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+        logger.debug("Monnify %s took %.1fms", key, elapsed_ms)
+
+    def stats(self):
+        """Returns a copy of the per-endpoint latency counters."""
+        with self._stats_lock:
+            return {
+                key: {**entry, "avg_ms": entry["total_ms"] / entry["count"] if entry["count"] else 0.0}
+                for key, entry in self._stats.items()
+            }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats = {}
+
+
+monnify = MonnifyClient()
@@ -1,48 +1,241 @@
-import requests
 import base64
+import json
+import logging
+import threading
+import time
+import uuid
 from django.conf import settings
+from utilities.background import run_in_background
+from utilities.monnify_client import monnify
+from utilities.bank_directory import bank_directory
+from utilities.beneficiary_cache import beneficiary_cache
+
+logger = logging.getLogger(__name__)
+
 # Utility functions for Monnify API interactions
 
+# Deletes the login lock only while it still holds the value this process set, so a
+# worker whose lock expired cannot remove the lock another worker has since taken
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class MonnifyTokenManager:
+    """
+    Keeps the Monnify bearer token for the life of the process.
+
+    The token is reused until it is within MONNIFY_TOKEN_REFRESH_MARGIN seconds of
+    expiring; inside that window callers keep getting the still-valid token while a
+    single background refresh fetches the next one. When MONNIFY_TOKEN_SHARED_CACHE
+    is on, the token is also shared with other workers through Redis, and a Redis
+    lock lets only one of them log in per refresh.
+    """
+    cache_key = "monnify:access_token"
+    # Held by the one worker logging in; it expires on its own if that worker dies
+    lock_key = "monnify:access_token:lock"
+    lock_timeout = 15
+    lock_poll_interval = 0.2
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0.0
+        self._refreshing = False
+
+    @property
+    def _margin(self):
+        return getattr(settings, "MONNIFY_TOKEN_REFRESH_MARGIN", 120)
+
+    def get_token(self):
+        now = time.time()
+        token, expires_at = self._token, self._expires_at
+        if token and now < expires_at - self._margin:
+            return token
+        if token and now < expires_at:
+            self._refresh_in_background()
+            return token
+
+        return self._refresh()
+
+    def invalidate(self):
+        with self._lock:
+            self._token = None
+            self._expires_at = 0.0
+        if self._shared_cache_enabled():
+            try:
+                from auth_system.redis_client import redis
+                redis.delete(self.cache_key)
+            except Exception:
+                logger.warning("Could not clear shared Monnify token", exc_info=True)
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        run_in_background(self._background_refresh)
+
+    def _background_refresh(self):
+        try:
+            self._refresh()
+        finally:
+            self._refreshing = False
+
+    def _refresh(self):
+        """
+        Adopts the shared token unless it is also inside the refresh margin; otherwise
+        logs in. With the shared cache on, only the process holding the Redis lock logs
+        in and the others keep using the current token, or wait for the new one.
+        """
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self._token and time.time() < self._expires_at - self._margin:
+                return self._token
+            shared = self._read_shared()
+            if shared and time.time() < shared[1] - self._margin:
+                return self._adopt(shared)
+            owner = uuid.uuid4().hex
+            if self._acquire_login_lock(owner):
+                try:
+                    return self._login_and_share()
+                finally:
+                    self._release_login_lock(owner)
+            if shared:
+                return self._adopt(shared)
+
+        # Another worker is logging in. Its token is awaited without holding self._lock,
+        # so the wait does not hold up the other threads of this process.
+        shared = self._wait_for_shared()
+        with self._lock:
+            if self._token and time.time() < self._expires_at - self._margin:
+                return self._token
+            if shared:
+                return self._adopt(shared)
+            # The lock holder never shared a token, so log in without the lock
+            return self._login_and_share()
+
+    def _login_and_share(self):
+        token, expires_in = self._login()
+        self._token = token
+        self._expires_at = time.time() + expires_in
+        self._write_shared(token, self._expires_at)
+        return token
+
+    def _adopt(self, shared):
+        self._token, self._expires_at = shared
+        return self._token
+
+    def _login(self):
+        api_key = settings.MONNIFY_API_KEY
+        secret_key = settings.MONNIFY_SECRET_KEY
+        auth_str = f"{api_key}:{secret_key}".encode()
+        encoded = base64.b64encode(auth_str).decode()
+
+        headers = {"Authorization": f"Basic {encoded}"}
+        res = monnify.post("api/v1/auth/login", headers=headers, idempotent=True)
+
+        if res.status_code == 200:
+            body = res.json()['responseBody']
+            return body['accessToken'], int(body.get('expiresIn') or 0)
+        else:
+            raise Exception("Failed to authenticate with Monnify: " + res.text)
+
+    def _shared_cache_enabled(self):
+        return getattr(settings, "MONNIFY_TOKEN_SHARED_CACHE", False)
+
+    def _read_shared(self):
+        """The shared token and its expiry while it is still valid, even inside the margin."""
+        if not self._shared_cache_enabled():
+            return None
+        try:
+            from auth_system.redis_client import redis
+            cached = redis.get(self.cache_key)
+        except Exception:
+            logger.warning("Could not read shared Monnify token", exc_info=True)
+            return None
+        if not cached:
+            return None
+        data = json.loads(cached)
+        if time.time() >= data["expires_at"]:
+            return None
+        return data["token"], data["expires_at"]
+
+    def _write_shared(self, token, expires_at):
+        # Kept until the token expires, so other workers can use it through the refresh window
+        ttl = int(expires_at - time.time())
+        if not self._shared_cache_enabled() or ttl <= 0:
+            return
+        try:
+            from auth_system.redis_client import redis
+            redis.set(self.cache_key, json.dumps({"token": token, "expires_at": expires_at}), ex=ttl)
+        except Exception:
+            logger.warning("Could not share Monnify token", exc_info=True)
+
+    def _acquire_login_lock(self, owner):
+        """
+        True when this process should log in. The lock holds `owner`, so only this
+        process can release it. Without the shared cache or Redis, it always should.
+        """
+        if not self._shared_cache_enabled():
+            return True
+        try:
+            from auth_system.redis_client import redis
+            return bool(redis.set(self.lock_key, owner, nx=True, ex=self.lock_timeout))
+        except Exception:
+            logger.warning("Could not take the Monnify login lock", exc_info=True)
+            return True
+
+    def _release_login_lock(self, owner):
+        if not self._shared_cache_enabled():
+            return
+        try:
+            from auth_system.redis_client import redis
+            redis.eval(RELEASE_LOCK_SCRIPT, keys=[self.lock_key], args=[owner])
+        except Exception:
+            # The lock expires after lock_timeout seconds
+            logger.warning("Could not release the Monnify login lock", exc_info=True)
+
+    def _wait_for_shared(self):
+        """Polls for the token another worker is fetching, for up to lock_timeout seconds."""
+        deadline = time.time() + self.lock_timeout
+        while time.time() < deadline:
+            time.sleep(self.lock_poll_interval)
+            shared = self._read_shared()
+            if shared and time.time() < shared[1] - self._margin:
+                return shared
+        return None
+
+
+token_manager = MonnifyTokenManager()
+
+
 def get_monnify_token():
-    api_key = settings.MONNIFY_API_KEY
-    secret_key = settings.MONNIFY_SECRET_KEY
-    auth_str = f"{api_key}:{secret_key}".encode()
-    encoded = base64.b64encode(auth_str).decode()
+    return token_manager.get_token()
 
-    headers = {"Authorization": f"Basic {encoded}"}
-    res = requests.post(f"{settings.MONNIFY_BASE_URL}api/v1/auth/login", headers=headers)
 
-    if res.status_code == 200:
-        return res.json()['responseBody']['accessToken']
-    else:
-        raise Exception("Failed to authenticate with Monnify: " + res.text)
+def monnify_request(method, path, headers=None, **kwargs):
+    """
+    Sends an authenticated request through the shared Monnify client.
+    A 401 means the cached token was revoked early, so it is dropped and the call retried once.
+    """
+    for attempt in range(2):
+        auth_headers = {"Authorization": f"Bearer {get_monnify_token()}", **(headers or {})}
+        response = monnify.request(method, path, headers=auth_headers, **kwargs)
+        if response.status_code != 401 or attempt:
+            return response
+        token_manager.invalidate()
 
 
 def get_bank_code(bank_name, account_no):
-    access_token = get_monnify_token()
-    if not access_token:
+    bank = bank_directory.lookup(bank_name)
+    if not bank:
         return None, None, None
 
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
-
-
-    response = requests.get(f"{settings.MONNIFY_BASE_URL}api/v1/banks", headers=headers)
-    if response.status_code == 200:
-        for bank in response.json().get("responseBody", []):
-            if bank_name.lower() == bank["name"].lower():
-                params = {
-                "accountNumber": account_no,
-                "bankCode": bank["code"]
-                }
-                response_bank_name = requests.get(f"{settings.MONNIFY_BASE_URL}api/v1/disbursements/account/validate", headers=headers,params=params)
-                recipient_name = response_bank_name.json().get("responseBody", {}).get("accountName", bank_name)
-                if response_bank_name.status_code == 200:
-                    return bank["code"], bank_name.title(), recipient_name
-                else:
-                    return bank["code"], bank_name.title(), None
-    return None, None, None
+    recipient_name = beneficiary_cache.resolve(bank["code"], account_no, default_name=bank_name)
+    return bank["code"], bank_name.title(), recipient_name
 
 def initiate_transfer(amount, reference, bank_name, description, destination, bank_code):
     payload = {
@@ -56,16 +249,64 @@ def initiate_transfer(amount, reference, bank_name, description, destination, ba
         "destinationAccountName": bank_name
     }
 
-    access_token = get_monnify_token()
+    headers = {
+        "Content-Type": "application/json"
+    }
+
+    response = monnify_request(
+        "POST",
+        "api/v2/disbursements/single",
+        json=payload,
+        headers=headers
+    )
+    return response
+
+def get_transfer_status(reference):
+    return monnify_request(
+        "GET",
+        "api/v2/disbursements/single/summary",
+        params={"reference": reference}
+    )
+
+def initiate_bulk_transfer(reference, title, narration, transfers):
+    """
+    Submits many transfers in one call. `transfers` is a list of dicts with amount,
+    reference, narration, bank_code and destination.
+    """
+    payload = {
+        "title": title,
+        "batchReference": reference,
+        "narration": narration,
+        "sourceAccountNumber": '5576981465',
+        "onValidationFailure": "CONTINUE",
+        "notificationInterval": 25,
+        "transactionList": [
+            {
+                "amount": float(transfer["amount"]),
+                "reference": transfer["reference"],
+                "narration": transfer["narration"],
+                "destinationBankCode": transfer["bank_code"],
+                "destinationAccountNumber": transfer["destination"],
+                "currency": "NGN",
+            }
+            for transfer in transfers
+        ],
+    }
 
     headers = {
-        "Authorization": f"Bearer {access_token}",
         "Content-Type": "application/json"
     }
 
-    response = requests.post(
-        f"{settings.MONNIFY_BASE_URL}api/v2/disbursements/single",
+    return monnify_request(
+        "POST",
+        "api/v2/disbursements/batch",
         json=payload,
         headers=headers
     )
-    return response
\ No newline at end of file
+
+def get_bulk_transfer_status(reference):
+    return monnify_request(
+        "GET",
+        "api/v2/disbursements/batch/summary",
+        params={"reference": reference}
+    )
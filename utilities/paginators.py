@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for admin changelists over tables too large to COUNT(*) on every page.
+
+    An unfiltered list takes its count from the Postgres planner's row estimate once
+    the table has more than ADMIN_PAGINATION["ESTIMATE_ABOVE"] rows. Filtered and
+    searched lists are counted exactly, but only up to ADMIN_PAGINATION["MAX_COUNT"]
+    rows, so pages beyond that are reached by narrowing the filters instead.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        config = settings.ADMIN_PAGINATION
+        if not queryset.query.where:
+            estimate = self._estimate(queryset)
+            if estimate is not None and estimate > config["ESTIMATE_ABOVE"]:
+                return estimate
+            return queryset.count()
+        return queryset[:config["MAX_COUNT"]].count()
+
+    def _estimate(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        # reltuples is -1 for tables that were never vacuumed or analyzed
+        if row is None or row[0] < 0:
+            return None
+        return row[0]
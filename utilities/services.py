@@ -6,9 +6,8 @@ from rest_framework import status
 from django.conf import settings
 from django.shortcuts import get_object_or_404
 from auth_system.redis_client import redis
-from utilities.monnify_helper import get_monnify_token
-import requests
-from operations.models import DailyLimitTracker
+from utilities.monnify_helper import monnify_request
+from operations import limits
 
 # Utility functions for user operations
 
@@ -63,9 +62,7 @@ def password_reset_confirm(email, code, new_password):
         return "not_found"
 
 def create_reserved_account(user):
-    token = get_monnify_token()
     headers = {
-        "Authorization": f"Bearer {token}",
         "Content-Type": "application/json"
     }
     data = {
@@ -76,33 +73,32 @@ def create_reserved_account(user):
         "customerEmail": user.email,
         "customerName": f"{user.firstname} {user.lastname}"
     }
-    res = requests.post(
-        f"{settings.MONNIFY_BASE_URL}api/v1/bank-transfer/reserved-accounts",
+    res = monnify_request(
+        "POST",
+        "api/v1/bank-transfer/reserved-accounts",
         json=data,
         headers=headers
     )
     if res.status_code == 200:
           return res.json()['responseBody']
-    print("Monnify Error Response:", res.text)
-    raise Exception("Monnify account creation failed")
+    raise Exception(f"Monnify account creation failed: {res.text}")
+
+def get_reserved_account(user):
+    """Returns the user's reserved account if Monnify already has one, otherwise None."""
+    res = monnify_request(
+        "GET",
+        f"api/v1/bank-transfer/reserved-accounts/user_{user.id}",
+        idempotent=True
+    )
+    if res.status_code == 200:
+        return res.json().get('responseBody')
+    if 400 <= res.status_code < 500 and res.status_code != 429:
+        return None
+    raise Exception(f"Monnify account lookup failed: {res.text}")
 
 def enforce_tier_rules(sender, amount):
-    tracker, _ = DailyLimitTracker.objects.get_or_create(user=sender)
-    tracker.reset_if_new_day()
     tier = sender.wallet.tier.lower()
     rules = settings.TIER_RULES.get(tier)
-    if not rules or tracker.daily_outflow + amount > rules["daily_outflow"]:
+    if not rules:
         return False
-    tracker.daily_outflow += amount
-    tracker.save()
-    return True
-
-def handle_monnify_response(response, reference):
-    if response.status_code == 200 and response.json().get("requestSuccessful") and response.json().get("responseBody")["status"] == "PENDING_AUTHORIZATION":
-        return Response({
-        "message": "OTP required. Please check your registered email.",
-        "transaction_reference": reference,
-        "status": "pending_authorization"
-        }, status=response.status_code)
-    
-
+    return limits.consume(sender.id, "outflow", amount, rules["daily_outflow"])